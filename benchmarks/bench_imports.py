@@ -0,0 +1,79 @@
+"""
+Benchmark of import time of Duventchezmoi entry points.
+
+Each module is imported in a fresh interpreter, several times, and the best time is reported as
+JSON, along with the heavy third party modules it loaded.
+"""
+
+# standard library
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ENTRY_POINTS = [
+    "duventchezmoi.main",
+    "duventchezmoi.plot_archive",
+    "duventchezmoi.gmail_utils",
+]
+HEAVY_MODULES = ["matplotlib", "pygrib", "googleapiclient", "google.oauth2"]
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+duration = time.perf_counter() - start
+print(json.dumps({{"seconds": duration, "loaded": [m for m in {heavy} if m in sys.modules]}}))
+"""
+
+
+def measure_import_time(module, repeat=5):
+    """Measure time to import given module in a fresh interpreter.
+
+    Parameters
+    ----------
+    module : str
+    repeat : int
+
+    Returns
+    -------
+    dict
+        {"module": str, "seconds": float (best of all repeats), "loaded": [str, ...]}
+    """
+
+    project_path = Path(__file__).resolve().parents[1]
+    script = SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+
+    measures = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=project_path,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        measures.append(json.loads(output))
+
+    return {
+        "module": module,
+        "seconds": min(measure["seconds"] for measure in measures),
+        "loaded": measures[0]["loaded"],
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output", help="JSON output file, printed if not given")
+    args = parser.parse_args()
+
+    results = [measure_import_time(module, args.repeat) for module in ENTRY_POINTS]
+
+    if args.output is None:
+        print(json.dumps(results, indent=2))
+    else:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,308 @@
+"""
+Benchmark of Duventchezmoi pipelines, run against a local NOMADS stand-in server.
+
+Three benchmarks are run, and their timings reported as JSON:
+- end_to_end: duventchezmoi() main function, from download to report, emails not being sent
+- replot: plot_archive() over a synthetic archive, with an empty index, a filled index and
+  compact stores
+- mail_encoding: encoding of report emails, in memory and streamed to disk
+"""
+
+# standard library
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+# local folder
+from nomads_server import create_grib2
+from nomads_server import start_server
+
+SITE = (45.2, 5.7)  # monitoring site of benchmarks, as lat and lon
+EXTENT = [5.5, 45.25, 5.75, 45.0]  # extent covering the site, as W, N, E, S
+
+
+def write_config(config_file, data_path, base_url, max_workers=8, threshold=20.0, request_rate=0.0):
+    """Write a config file for benchmarks.
+
+    Parameters
+    ----------
+    config_file : Path
+    data_path : Path
+    base_url : str
+    max_workers : int
+    threshold : float
+        in km/h
+    request_rate : float
+        requests per second, 0 for no limit
+    """
+
+    config_file.write_text(
+        "\n".join(
+            [
+                "[main]",
+                "lat = {}".format(SITE[0]),
+                "lon = {}".format(SITE[1]),
+                "threshold = {}".format(threshold),
+                "data_path = {}".format(data_path),
+                "cleaning = false",
+                "units = km/h",
+                "[download]",
+                "max_workers = {}".format(max_workers),
+                "incremental = true",
+                "base_url = {}".format(base_url),
+                "request_rate = {}".format(request_rate),
+                "[mail]",
+                "sender = sender@example.com",
+                "recipients = recipient@example.com",
+            ]
+        )
+    )
+
+
+def measure(function, repeat=1, setup=None):
+    """Measure execution time of given function.
+
+    Parameters
+    ----------
+    function : callable
+    repeat : int
+    setup : callable or None
+        called before each measure, not timed
+
+    Returns
+    -------
+    float
+        best time of all repeats, in seconds
+    """
+
+    durations = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            function()
+        durations.append(time.perf_counter() - start_time)
+
+    return min(durations)
+
+
+def bench_end_to_end(
+    temp_path, latency=0.05, bandwidth=None, error_rate=0.0, max_workers=8, request_rate=0.0
+):
+    """Benchmark duventchezmoi main function, downloading a whole run from a local server.
+
+    Parameters
+    ----------
+    temp_path : Path
+    latency : float
+        in seconds
+    bandwidth : float or None
+        in bytes/s
+    error_rate : float
+    max_workers : int
+    request_rate : float
+        requests per second, 0 for no limit
+
+    Returns
+    -------
+    results : [dict, ...]
+    """
+
+    # current project
+    from duventchezmoi.main import duventchezmoi
+
+    server = start_server(latency=latency, bandwidth=bandwidth, error_rate=error_rate)
+    data_path = temp_path / "end_to_end"
+    config_file = temp_path / "end_to_end.ini"
+    write_config(
+        config_file, data_path, server.base_url, max_workers=max_workers, request_rate=request_rate
+    )
+
+    results = []
+    try:
+        with patch("duventchezmoi.main.send_reports"):
+            for case in ["cold", "incremental"]:
+                stats = dict(server.stats)
+                seconds = measure(lambda: duventchezmoi(config_file))
+                results.append(
+                    {
+                        "benchmark": "end_to_end",
+                        "case": case,
+                        "seconds": seconds,
+                        "requests": server.stats["requests"] - stats["requests"],
+                        "errors": server.stats["errors"] - stats["errors"],
+                        "bytes": server.stats["bytes"] - stats["bytes"],
+                        "latency": latency,
+                        "bandwidth": bandwidth,
+                        "error_rate": error_rate,
+                        "max_workers": max_workers,
+                        "request_rate": request_rate,
+                    }
+                )
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return results
+
+
+def create_archive(data_path, days):
+    """Create a synthetic archive of hourly GRIB2 files, one directory per day.
+
+    Parameters
+    ----------
+    data_path : Path
+    days : int
+    """
+
+    start_date = datetime.datetime(2024, 1, 1)
+    for day in range(days):
+        run_date = start_date + datetime.timedelta(days=day)
+        date_path = data_path / run_date.strftime("%Y%m%d")
+        date_path.mkdir(parents=True)
+        run = (run_date.strftime("%Y%m%d"), "00")
+        for forecast_hours in range(24):
+            forecast_date = run_date + datetime.timedelta(hours=forecast_hours)
+            grib2_file = date_path / "{}.grib2".format(forecast_date.strftime("%Y%m%d_%H%M"))
+            grib2_file.write_bytes(create_grib2(run, forecast_hours, EXTENT))
+
+
+def bench_replot(temp_path, days=30, workers=1):
+    """Benchmark plotting of an archive of hourly GRIB2 files.
+
+    Parameters
+    ----------
+    temp_path : Path
+    days : int
+        archive length
+    workers : int
+        number of decoding processes
+
+    Returns
+    -------
+    results : [dict, ...]
+    """
+
+    # current project
+    from duventchezmoi.archive_store import compact_archive
+    from duventchezmoi.plot_archive import plot_archive
+
+    data_path = temp_path / "replot"
+    config_file = temp_path / "replot.ini"
+    write_config(config_file, data_path, "")
+    with open(config_file, "a") as f:
+        f.write("\n[processing]\nworkers = {}\n".format(workers))
+    create_archive(data_path, days)
+    report_file = temp_path / "archive.pdf"
+
+    results = []
+    for case in ["empty_index", "filled_index", "compact_stores"]:
+        if case == "compact_stores":
+            compact_archive(data_path, remove=True)
+        seconds = measure(lambda: plot_archive(report_file, config_file))
+        results.append(
+            {
+                "benchmark": "replot",
+                "case": case,
+                "seconds": seconds,
+                "files": days * 24,
+                "workers": workers,
+                "report_bytes": report_file.stat().st_size,
+            }
+        )
+
+    return results
+
+
+def bench_mail_encoding(temp_path, sizes=(1000000, 20000000), repeat=3):
+    """Benchmark encoding of report emails.
+
+    Small reports are encoded in memory, as sent in batch requests, and all reports are also
+    streamed to disk, as sent with a resumable upload.
+
+    Parameters
+    ----------
+    temp_path : Path
+    sizes : [int, ...]
+        report sizes, in bytes
+    repeat : int
+
+    Returns
+    -------
+    results : [dict, ...]
+    """
+
+    # current project
+    from duventchezmoi.gmail_utils import MAX_ATTACHMENT_SIZE
+    from duventchezmoi.gmail_utils import create_message
+    from duventchezmoi.gmail_utils import write_message
+
+    results = []
+    for size in sizes:
+
+        report_file = temp_path / "report_{}.pdf".format(size)
+        report_file.write_bytes(os.urandom(size))
+        message_file = temp_path / "message_{}.eml".format(size)
+        arguments = ("Subject", "Contents", ["recipient@example.com"])
+
+        cases = {
+            "streamed": lambda: write_message(message_file, *arguments, attachments=[report_file])
+        }
+        if size <= MAX_ATTACHMENT_SIZE:
+            cases["in_memory"] = lambda: create_message(*arguments, attachments=[report_file])
+
+        for case, function in cases.items():
+            seconds = measure(function, repeat)
+            results.append(
+                {
+                    "benchmark": "mail_encoding",
+                    "case": case,
+                    "seconds": seconds,
+                    "bytes": size,
+                    "throughput": size / seconds,
+                }
+            )
+
+    return results
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05, help="server latency, in seconds")
+    parser.add_argument("--bandwidth", type=float, help="server bandwidth, in bytes/s")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="server error rate")
+    parser.add_argument("--max_workers", type=int, default=8)
+    parser.add_argument("--request_rate", type=float, default=0.0, help="0 for no limit")
+    parser.add_argument("--days", type=int, default=30, help="length of the replotted archive")
+    parser.add_argument("--workers", type=int, default=1, help="number of decoding processes")
+    parser.add_argument("--quick", help="small benchmarks, for CI", action="store_true")
+    parser.add_argument("-o", "--output", help="JSON output file, printed if not given")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir)
+        results = bench_end_to_end(
+            temp_path,
+            args.latency,
+            args.bandwidth,
+            args.error_rate,
+            args.max_workers,
+            args.request_rate,
+        )
+        results += bench_replot(temp_path, 2 if args.quick else args.days, args.workers)
+        results += bench_mail_encoding(temp_path, (1000000,) if args.quick else (1000000, 20000000))
+
+    if args.output is None:
+        print(json.dumps(results, indent=2))
+    else:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
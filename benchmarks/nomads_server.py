@@ -0,0 +1,265 @@
+"""
+Local stand-in for the NOMADS GFS server, to benchmark Duventchezmoi without network access.
+
+Requests to the filter_gfs_0p25.pl script are answered with synthetic GRIB2 subsets holding U and V
+wind components over the requested extent, built from the sample file of the tests. Inventory files
+answer HEAD requests so that every run looks published. Latency, bandwidth and error rate of the
+server can be set to mimic NOMADS.
+"""
+
+# standard library
+import argparse
+import http.server
+import random
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+
+# third party
+import numpy as np
+
+GRID_RESOLUTION = 0.25  # GFS grid resolution, in decimal degrees
+TEMPLATE_FILE = Path(__file__).resolve().parents[1] / "tests" / "20240330_0000.grib2"
+WRITE_CHUNK_SIZE = 16 * 1024  # size of chunks sent to clients, in bytes
+
+
+def create_grib2(run, forecast_hours, extent, seed=0, template_file=TEMPLATE_FILE):
+    """Create a synthetic GRIB2 file holding U and V wind components over given extent.
+
+    Parameters
+    ----------
+    run : (str, str)
+        run date (format YYYYmmdd) and cycle
+    forecast_hours : int
+    extent : [float, float, float, float]
+        W, N, E, S, at 0.25 deg precision
+    seed : int
+    template_file : Path
+        GRIB2 file whose first messages are U and V components
+
+    Returns
+    -------
+    bytes
+    """
+
+    # third party
+    import pygrib
+
+    west, north, east, south = extent
+    n_lons = int(round((east - west) / GRID_RESOLUTION)) + 1
+    n_lats = int(round((north - south) / GRID_RESOLUTION)) + 1
+
+    # wind components vary smoothly with forecast hours, around 10 m/s
+    rng = np.random.default_rng([seed, int(run[0]), int(run[1]), forecast_hours])
+    amplitude = 10.0 * (1.0 + np.sin(forecast_hours / 12.0 * np.pi))
+
+    messages = []
+    with pygrib.open(str(template_file)) as grbs:
+        for number in (1, 2):
+            grb = grbs.message(number)
+            grb["Ni"] = n_lons
+            grb["Nj"] = n_lats
+            grb["latitudeOfFirstGridPointInDegrees"] = south
+            grb["latitudeOfLastGridPointInDegrees"] = north
+            grb["longitudeOfFirstGridPointInDegrees"] = west % 360
+            grb["longitudeOfLastGridPointInDegrees"] = east % 360
+            grb["dataDate"] = int(run[0])
+            grb["dataTime"] = int(run[1]) * 100
+            grb["forecastTime"] = forecast_hours
+            grb.values = amplitude * rng.uniform(0.0, 1.0, (n_lats, n_lons))
+            messages.append(grb.tostring())
+
+    return b"".join(messages)
+
+
+def parse_filter_query(query):
+    """Parse query of a filter_gfs_0p25.pl request.
+
+    Parameters
+    ----------
+    query : str
+
+    Returns
+    -------
+    run : (str, str)
+    forecast_hours : int
+    extent : [float, float, float, float]
+    """
+
+    parameters = urllib.parse.parse_qs(query)
+
+    # file name as gfs.tHHz.pgrb2.0p25.fFFF
+    forecast_hours = int(parameters["file"][0].rsplit(".f", 1)[1])
+
+    # directory as /gfs.YYYYmmdd/HH/atmos
+    run_date, step = parameters["dir"][0].strip("/").split("/")[:2]
+    run = (run_date.split(".")[1], step)
+
+    extent = [
+        float(parameters["leftlon"][0]),
+        float(parameters["toplat"][0]),
+        float(parameters["rightlon"][0]),
+        float(parameters["bottomlat"][0]),
+    ]
+
+    return run, forecast_hours, extent
+
+
+class NomadsRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Handle GFS requests, with latency, bandwidth and error rate set on the server."""
+
+    protocol_version = "HTTP/1.1"  # keep connections alive, as NOMADS does
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_error(self):
+        self.server.count("errors")
+        self.send_response(503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _should_fail(self):
+        with self.server.lock:
+            return self.server.random.random() < self.server.error_rate
+
+    def do_HEAD(self):
+
+        self.server.count("requests")
+        time.sleep(self.server.latency)
+
+        if self._should_fail():
+            self._send_error()
+            return
+
+        # every run is published
+        if not self.path.endswith(".idx"):
+            self.send_response(404)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+
+        self.server.count("requests")
+        time.sleep(self.server.latency)
+
+        parts = urllib.parse.urlsplit(self.path)
+        if parts.path != "/cgi-bin/filter_gfs_0p25.pl":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if self._should_fail():
+            self._send_error()
+            return
+
+        run, forecast_hours, extent = parse_filter_query(parts.query)
+        body = create_grib2(run, forecast_hours, extent, seed=self.server.seed)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        # send body in chunks, throttled to the server bandwidth
+        for start in range(0, len(body), WRITE_CHUNK_SIZE):
+            end = start + WRITE_CHUNK_SIZE
+            self.wfile.write(body[start:end])
+            if self.server.bandwidth:
+                time.sleep(len(body[start:end]) / self.server.bandwidth)
+        self.server.count("bytes", len(body))
+
+
+class NomadsServer(http.server.ThreadingHTTPServer):
+    """Local NOMADS stand-in server.
+
+    Parameters
+    ----------
+    address : (str, int)
+        host and port, port 0 picks a free port
+    latency : float
+        delay before each response, in seconds
+    bandwidth : float or None
+        per connection, in bytes/s, unlimited if None
+    error_rate : float
+        probability of answering a request with a 503 error
+    seed : int
+        seed of synthetic data and errors
+    verbose : boolean
+        if True, log requests
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 0),
+        latency=0.0,
+        bandwidth=None,
+        error_rate=0.0,
+        seed=0,
+        verbose=False,
+    ):
+        super().__init__(address, NomadsRequestHandler)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.seed = seed
+        self.verbose = verbose
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "bytes": 0}
+
+    @property
+    def base_url(self):
+        return "http://{}:{}".format(*self.server_address[:2])
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.stats[name] += value
+
+
+def start_server(**kwargs):
+    """Start a NOMADS stand-in server in a background thread.
+
+    Parameters
+    ----------
+    **kwargs
+        see NomadsServer
+
+    Returns
+    -------
+    server : NomadsServer
+        to be stopped with server.shutdown() and server.server_close()
+    """
+
+    server = NomadsServer(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="in seconds")
+    parser.add_argument("--bandwidth", type=float, help="per connection, in bytes/s")
+    parser.add_argument("--error_rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = NomadsServer(
+        (args.host, args.port), args.latency, args.bandwidth, args.error_rate, args.seed, True
+    )
+    print("Serving GFS data on {}".format(server.base_url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
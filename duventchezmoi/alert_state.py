@@ -0,0 +1,151 @@
+"""
+Alert state module for Duventchezmoi.
+
+The last alert notified for each site and rule is recorded in the state file as a fingerprint of
+its exceedance windows and peak, so that reports are only rendered and sent again when the alert
+materially changes.
+"""
+
+# third party
+import numpy as np
+
+# current project
+from duventchezmoi.state import read_state
+from duventchezmoi.state import write_state
+
+PEAK_TOLERANCE = 5.0  # change of peak wind speed notified again, in the units of the config
+PEAK_HOURS = 6.0  # shift of peak date notified again, in hours
+
+
+def compute_fingerprint(dates, values, alerts):
+    """Compute fingerprint of an alert.
+
+    Parameters
+    ----------
+    dates : np.ndarray
+        datetime64, sorted
+    values : np.ndarray
+        wind speed
+    alerts : np.ndarray
+        boolean, True at the dates triggering the alert
+
+    Returns
+    -------
+    fingerprint : dict
+        {"windows": [[str, str], ...], "peak": float or None, "peak_date": str or None}, windows
+        being the first and last dates of each run of consecutive alerts, and peak the maximum
+        wind speed during alerts, dates as ISO strings
+    """
+
+    # bounds of runs of consecutive alerts
+    edges = np.diff(np.concatenate([[0], alerts.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+
+    if len(starts) == 0:
+        return {"windows": [], "peak": None, "peak_date": None}
+
+    dates = dates.astype("datetime64[m]")
+    i_peak = np.flatnonzero(alerts)[np.argmax(values[alerts])]
+
+    return {
+        "windows": [[str(dates[start]), str(dates[end])] for start, end in zip(starts, ends)],
+        "peak": float(values[i_peak]),
+        "peak_date": str(dates[i_peak]),
+    }
+
+
+def compare_fingerprints(previous, current, peak_tolerance=PEAK_TOLERANCE, peak_hours=PEAK_HOURS):
+    """Compare alert to the one previously notified.
+
+    Parameters
+    ----------
+    previous : dict or None
+        fingerprint of the alert previously notified, None if there was none
+    current : dict
+        see compute_fingerprint
+    peak_tolerance : float
+        change of peak wind speed considered material
+    peak_hours : float
+        shift of peak date considered material, in hours
+
+    Returns
+    -------
+    change : str or None
+        "new" for an alert not notified yet or a new exceedance window, "changed" for a peak
+        shifted beyond tolerance, "all_clear" for a notified alert no longer triggered, None if the
+        alert did not materially change
+    """
+
+    has_alert = len(current["windows"]) > 0
+    had_alert = previous is not None and len(previous["windows"]) > 0
+    if not has_alert:
+        return "all_clear" if had_alert else None
+    if not had_alert:
+        return "new"
+
+    # exceedance windows overlapping none of the previous windows
+    for start, end in current["windows"]:
+        if not any(start <= e and s <= end for s, e in previous["windows"]):
+            return "new"
+
+    # peak value or date shift
+    shift = np.datetime64(current["peak_date"]) - np.datetime64(previous["peak_date"])
+    if (
+        abs(current["peak"] - previous["peak"]) > peak_tolerance
+        or abs(shift / np.timedelta64(1, "h")) > peak_hours  # noqa W503
+    ):
+        return "changed"
+
+    return None
+
+
+def is_notified(previous, date):
+    """Check whether given date is within the alert previously notified.
+
+    Parameters
+    ----------
+    previous : dict or None
+        fingerprint of the alert previously notified, None if there was none
+    date : np.datetime64
+
+    Returns
+    -------
+    boolean
+        True if the date is in one of its exceedance windows
+    """
+
+    if previous is None:
+        return False
+
+    date = str(date.astype("datetime64[m]"))
+    return any(start <= date <= end for start, end in previous["windows"])
+
+
+def read_alert_state(state_file):
+    """Read fingerprints of the alerts previously notified.
+
+    Parameters
+    ----------
+    state_file : Path
+
+    Returns
+    -------
+    alerts : {str: dict, ...}
+        fingerprint of each alert, see compute_fingerprint
+    """
+
+    return read_state(state_file, "alerts", {})
+
+
+def write_alert_state(state_file, alerts):
+    """Record fingerprints of the alerts notified, keeping other contents of the state file.
+
+    Parameters
+    ----------
+    state_file : Path
+    alerts : {str: dict, ...}
+        fingerprint of each alert, see compute_fingerprint
+    """
+
+    write_state(state_file, "alerts", alerts)
@@ -0,0 +1,134 @@
+"""
+Persistent index of wind speed values computed from archived GFS products.
+
+Values are stored in m/s in a SQLite database, keyed by file path and statistic name, along with
+the file size and modification time so that only new or changed files are decoded again.
+"""
+
+# standard library
+import contextlib
+import sqlite3
+
+# third party
+import numpy as np
+
+INDEX_FILENAME = "index.sqlite"
+
+
+def site_key(site, statistic=None):
+    """Get index key of the wind speed over a monitoring site.
+
+    Parameters
+    ----------
+    site : dict
+    statistic : dict or None
+        see sites.read_statistic, mean over the grid cell if None
+
+    Returns
+    -------
+    str
+    """
+
+    key = "site:{:.6f},{:.6f}".format(site["lat"], site["lon"])
+
+    # mean over the grid cell keeps the key of previous versions
+    if statistic is None or (statistic["name"] == "mean" and statistic["margin"] == 0):
+        return key
+    return "{}:{}:{:g}:{}".format(
+        key, statistic["name"], statistic["percentile"], statistic["margin"]
+    )
+
+
+def open_index(index_file):
+    """Open index database, creating it if needed.
+
+    Parameters
+    ----------
+    index_file : Path
+
+    Returns
+    -------
+    sqlite3.Connection
+    """
+
+    connection = sqlite3.connect(str(index_file), timeout=60)
+    with connection:
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS wind_speed (
+                path TEXT NOT NULL,
+                key TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                date TEXT NOT NULL,
+                wind_speed REAL NOT NULL,
+                PRIMARY KEY (path, key)
+            )
+            """)
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS wind_speed_key_date ON wind_speed (key, date)"
+        )
+
+    return connection
+
+
+def get_wind_speed(index_file, grib2_files, keys, compute_function):
+    """Get wind speed values from index, computing only values of new or changed files.
+
+    Parameters
+    ----------
+    index_file : Path
+    grib2_files : [Path, ...]
+        named after forecast date, as YYYYmmdd_HHMM.grib2
+    keys : [str, ...]
+    compute_function : callable
+        takes a list of files, returns wind speed values in m/s, shape (file, key)
+
+    Returns
+    -------
+    np.ndarray
+        wind speed values in m/s, shape (file, key)
+    """
+
+    grib2_files = list(grib2_files)
+    values = np.full((len(grib2_files), len(keys)), np.nan)
+    stats = [f.stat() for f in grib2_files]
+
+    with contextlib.closing(open_index(index_file)) as connection:
+
+        # read up-to-date values from index
+        for j, key in enumerate(keys):
+            indexed = {
+                path: (size, mtime_ns, wind_speed)
+                for path, size, mtime_ns, wind_speed in connection.execute(
+                    "SELECT path, size, mtime_ns, wind_speed FROM wind_speed WHERE key = ?", (key,)
+                )
+            }
+            for i, (grib2_file, stat) in enumerate(zip(grib2_files, stats)):
+                row = indexed.get(str(grib2_file))
+                if row is not None and row[:2] == (stat.st_size, stat.st_mtime_ns):
+                    values[i, j] = row[2]
+
+        # compute missing values
+        missing = np.flatnonzero(np.isnan(values).any(axis=1))
+        if len(missing) > 0:
+            values[missing] = compute_function([grib2_files[i] for i in missing])
+
+            # store them in index
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO wind_speed VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            str(grib2_files[i]),
+                            key,
+                            stats[i].st_size,
+                            stats[i].st_mtime_ns,
+                            grib2_files[i].stem,
+                            float(values[i, j]),
+                        )
+                        for i in missing
+                        for j, key in enumerate(keys)
+                    ],
+                )
+
+    return values
@@ -0,0 +1,348 @@
+"""
+Time-range queries over the wind speed archive of Duventchezmoi.
+
+Wind speed values computed over monitoring sites are read from the archive index, whose
+(key, date) index gives time-sorted series of a time range without scanning or decoding the
+archive, so that statistics, exceedance durations and windows of strongest wind are answered in
+milliseconds, for example to be polled by dashboards.
+
+Examples
+--------
+Hours above 50 km/h in March 2024, and strongest 6 hour windows:
+    duventchezmoi-query --start 2024-03 --end 2024-03 --threshold 50 --top 3 --window 6
+"""
+
+# standard library
+import argparse
+import configparser
+import contextlib
+import json
+from pathlib import Path
+
+# third party
+import numpy as np
+
+# current project
+from duventchezmoi.archive_index import INDEX_FILENAME
+from duventchezmoi.archive_index import open_index
+from duventchezmoi.archive_index import site_key
+from duventchezmoi.forecast_series import compute_time_weights
+from duventchezmoi.forecast_series import parse_dates
+from duventchezmoi.grib_utils import convert_units
+from duventchezmoi.sites import read_sites
+from duventchezmoi.sites import read_statistic
+
+DATE_FORMAT = "%Y%m%d_%H%M"  # format of dates in the index, as GRIB2 file names
+WINDOW_HOURS = 6  # default duration of windows of strongest wind
+
+
+def parse_time_range(start=None, end=None):
+    """Parse time range given as ISO dates, the end being included at its own precision.
+
+    For example, start "2024-03" and end "2024-03" select the whole month of March 2024, and end
+    "2024-03-30" includes the whole day.
+
+    Parameters
+    ----------
+    start : str or None
+    end : str or None
+
+    Returns
+    -------
+    start : np.datetime64 or None
+        datetime64[m], included
+    stop : np.datetime64 or None
+        datetime64[m], excluded
+    """
+
+    if start is not None:
+        start = np.datetime64(start).astype("datetime64[m]")
+    if end is not None:
+        end = np.datetime64(end)
+        end = (end + np.timedelta64(1, np.datetime_data(end.dtype)[0])).astype("datetime64[m]")
+
+    return start, end
+
+
+def to_index_date(date):
+    """Format date as stored in the index.
+
+    Parameters
+    ----------
+    date : np.datetime64
+
+    Returns
+    -------
+    str
+    """
+    return date.astype("datetime64[m]").item().strftime(DATE_FORMAT)
+
+
+def read_series(index_file, key, start=None, stop=None):
+    """Read time-sorted wind speed series of given key from the archive index.
+
+    Dates forecast by several runs take the value of the latest run, whose download directory
+    sorts last.
+
+    Parameters
+    ----------
+    index_file : Path
+    key : str
+        see archive_index.site_key
+    start : np.datetime64 or None
+        included
+    stop : np.datetime64 or None
+        excluded
+
+    Returns
+    -------
+    dates : np.ndarray
+        datetime64[m], sorted
+    values : np.ndarray
+        wind speed in m/s
+    """
+
+    # range scan of the (key, date) index, the bare wind_speed column of a MAX() aggregate
+    # being taken from the row holding the maximum in SQLite
+    query = "SELECT date, wind_speed, MAX(path) FROM wind_speed WHERE key = ?"
+    parameters = [key]
+    if start is not None:
+        query += " AND date >= ?"
+        parameters.append(to_index_date(start))
+    if stop is not None:
+        query += " AND date < ?"
+        parameters.append(to_index_date(stop))
+    query += " GROUP BY date ORDER BY date"
+
+    with contextlib.closing(open_index(index_file)) as connection:
+        rows = connection.execute(query, parameters).fetchall()
+
+    dates = parse_dates([date for date, _, _ in rows])
+    values = np.array([wind_speed for _, wind_speed, _ in rows], dtype=float)
+
+    return dates, values
+
+
+def _format_date(date):
+    return str(date.astype("datetime64[m]"))
+
+
+def compute_statistics(dates, values):
+    """Compute statistics of a wind speed series.
+
+    Parameters
+    ----------
+    dates : np.ndarray
+        datetime64, sorted
+    values : np.ndarray
+
+    Returns
+    -------
+    dict
+        {"count": int, "hours": float, "first_date": str, "last_date": str, "min": float,
+        "max": float, "max_date": str, "mean": float}, the mean being weighted by the time each
+        value stands for, dates and values being None for empty series
+    """
+
+    if len(values) == 0:
+        return {
+            "count": 0,
+            "hours": 0.0,
+            "first_date": None,
+            "last_date": None,
+            "min": None,
+            "max": None,
+            "max_date": None,
+            "mean": None,
+        }
+
+    weights = compute_time_weights(dates)
+    i_max = int(np.argmax(values))
+
+    return {
+        "count": len(values),
+        "hours": float(weights.sum()),
+        "first_date": _format_date(dates[0]),
+        "last_date": _format_date(dates[-1]),
+        "min": float(values.min()),
+        "max": float(values[i_max]),
+        "max_date": _format_date(dates[i_max]),
+        "mean": float(np.average(values, weights=weights) if weights.sum() > 0 else values.mean()),
+    }
+
+
+def compute_exceedance(dates, values, threshold):
+    """Compute how long a wind speed series exceeds given threshold.
+
+    Parameters
+    ----------
+    dates : np.ndarray
+        datetime64, sorted
+    values : np.ndarray
+    threshold : float
+
+    Returns
+    -------
+    dict
+        {"threshold": float, "count": int, "hours": float, "first_date": str or None,
+        "last_date": str or None}, hours being the time the values above threshold stand for
+    """
+
+    above = values > threshold
+    indices = np.flatnonzero(above)
+    hours = compute_time_weights(dates)[above].sum() if len(values) > 0 else 0.0
+
+    return {
+        "threshold": float(threshold),
+        "count": len(indices),
+        "hours": float(hours),
+        "first_date": _format_date(dates[indices[0]]) if len(indices) > 0 else None,
+        "last_date": _format_date(dates[indices[-1]]) if len(indices) > 0 else None,
+    }
+
+
+def find_top_windows(dates, values, window_hours=WINDOW_HOURS, top=3):
+    """Find windows of strongest mean wind speed, without overlap.
+
+    Window means are computed for windows starting at every date, from cumulative sums and
+    binary searches of window ends in the sorted dates.
+
+    Parameters
+    ----------
+    dates : np.ndarray
+        datetime64, sorted
+    values : np.ndarray
+    window_hours : float
+    top : int
+        maximum number of windows
+
+    Returns
+    -------
+    windows : [dict, ...]
+        {"start": str, "end": str, "mean": float, "max": float}, by decreasing mean, end being the
+        last date of the window
+    """
+
+    if len(values) == 0 or top <= 0:
+        return []
+
+    # mean of values in each window [date, date + window_hours)
+    window = np.timedelta64(int(round(window_hours * 60)), "m")
+    starts = np.arange(len(values))
+    ends = np.searchsorted(dates, dates + window, side="left")
+    sums = np.concatenate([[0.0], np.cumsum(values)])
+    means = (sums[ends] - sums[starts]) / (ends - starts)
+
+    # pick strongest windows, skipping the ones overlapping already picked windows
+    windows = []
+    picked = np.zeros(len(values), dtype=bool)
+    for i in np.argsort(-means, kind="stable"):
+        end = ends[i]
+        if picked[i:end].any():
+            continue
+        picked[i:end] = True
+        windows.append(
+            {
+                "start": _format_date(dates[i]),
+                "end": _format_date(dates[end - 1]),
+                "mean": float(means[i]),
+                "max": float(values[i:end].max()),
+            }
+        )
+        if len(windows) == top:
+            break
+
+    return windows
+
+
+def query_archive(
+    config_path,
+    site_names=None,
+    start=None,
+    end=None,
+    threshold=None,
+    top=0,
+    window_hours=WINDOW_HOURS,
+):
+    """Query wind speed archive of given config over a time range.
+
+    Parameters
+    ----------
+    config_path : Path
+    site_names : [str, ...] or None
+        names of the sites to query, if None all sites are queried
+    start : str or None
+        ISO date, see parse_time_range
+    end : str or None
+        ISO date, included at its own precision, see parse_time_range
+    threshold : float or None
+        in the units of the config, if None the threshold of each site
+    top : int
+        number of windows of strongest wind to find
+    window_hours : float
+
+    Returns
+    -------
+    results : {str: dict, ...}
+        for each site name, {"statistics": dict, "exceedance": dict, "windows": [dict, ...]}, see
+        compute_statistics, compute_exceedance and find_top_windows, in the units of the config
+    """
+
+    # read config
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    data_path = Path(config["main"]["data_path"]).resolve()
+    units = config["main"]["units"]
+    sites = read_sites(config)
+    statistic = read_statistic(config)
+    if site_names is not None:
+        sites = [site for site in sites if site["name"] in site_names]
+
+    start, stop = parse_time_range(start, end)
+
+    results = {}
+    for site in sites:
+        dates, values = read_series(
+            data_path / INDEX_FILENAME, site_key(site, statistic), start, stop
+        )
+        values = convert_units(values, units)
+        results[site["name"]] = {
+            "statistics": compute_statistics(dates, values),
+            "exceedance": compute_exceedance(
+                dates, values, site["threshold"] if threshold is None else threshold
+            ),
+            "windows": find_top_windows(dates, values, window_hours, top),
+        }
+
+    return results
+
+
+def main():
+    """Command line entry point, printing query results as JSON."""
+
+    project_path = Path(__file__).resolve().parents[1]
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-c",
+        "--config",
+        help="config file",
+        default=project_path / "config" / "config.ini",
+        type=Path,
+    )
+    parser.add_argument("-s", "--site", help="site to query, all sites if not given", nargs="*")
+    parser.add_argument("--start", help="first date, as YYYY-mm[-dd[THH:MM]]")
+    parser.add_argument("--end", help="last date, included, as YYYY-mm[-dd[THH:MM]]")
+    parser.add_argument("--threshold", help="threshold of the sites if not given", type=float)
+    parser.add_argument("--top", help="number of windows of strongest wind", type=int, default=0)
+    parser.add_argument("--window", help="window duration, in hours", type=float, default=6)
+    args = parser.parse_args()
+
+    results = query_archive(
+        args.config, args.site, args.start, args.end, args.threshold, args.top, args.window
+    )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Compact archive store for Duventchezmoi.
+
+Each finished day directory of hourly GRIB2 files can be compacted into a single compressed array
+file, named after the directory (for example data_path/20240330.npz), holding forecast dates, grid
+coordinates, and U and V wind components split in chunks along time. Reading the store only
+decompresses the arrays and chunks that are requested.
+"""
+
+# standard library
+import argparse
+import configparser
+import shutil
+from pathlib import Path
+
+# third party
+import numpy as np
+
+# current project
+from duventchezmoi.file_utils import open_atomically
+from duventchezmoi.grib_utils import load_wind_cube
+
+STORE_SUFFIX = ".npz"
+CHUNK_SIZE = 24  # number of forecast hours per chunk
+
+
+def get_store_file(date_path):
+    """Get compact store file of given day directory.
+
+    Parameters
+    ----------
+    date_path : Path
+
+    Returns
+    -------
+    Path
+    """
+    return date_path.with_name(date_path.name + STORE_SUFFIX)
+
+
+def compact_day(date_path, remove=False, chunk_size=CHUNK_SIZE):
+    """Compact hourly GRIB2 files of given day directory into a single store file.
+
+    Parameters
+    ----------
+    date_path : Path
+    remove : boolean
+        if True, remove day directory once compacted
+    chunk_size : int
+        number of forecast hours per chunk
+
+    Returns
+    -------
+    store_file : Path or None
+        None if there were no GRIB2 files to compact
+    """
+
+    grib2_files = sorted(date_path.glob("*.grib2"))
+    if len(grib2_files) == 0:
+        return None
+
+    # decode all files
+    dates, u, v, lats, lons = load_wind_cube(grib2_files)
+
+    # prepare arrays, wind components being split in chunks along time
+    arrays = {
+        "dates": np.array(dates, dtype="datetime64[m]"),
+        "lats": lats,
+        "lons": lons,
+        "chunk_size": np.array(chunk_size),
+    }
+    for i, start in enumerate(range(0, len(dates), chunk_size)):
+        end = start + chunk_size
+        arrays["u_{}".format(i)] = u[start:end].astype(np.float32)
+        arrays["v_{}".format(i)] = v[start:end].astype(np.float32)
+
+    store_file = get_store_file(date_path)
+    with open_atomically(store_file, "wb") as f:
+        np.savez_compressed(f, **arrays)
+
+    if remove:
+        shutil.rmtree(date_path)
+
+    return store_file
+
+
+def read_store(store_file, start=None, end=None):
+    """Read wind components from a compact store file.
+
+    Only chunks overlapping the requested time range are decompressed.
+
+    Parameters
+    ----------
+    store_file : Path
+    start : np.datetime64 or datetime object or None
+    end : np.datetime64 or datetime object or None
+        included
+
+    Returns
+    -------
+    dates : np.ndarray
+        datetime64[m]
+    u : np.ndarray
+        shape (time, lat, lon)
+    v : np.ndarray
+        shape (time, lat, lon)
+    lats : np.ndarray
+    lons : np.ndarray
+    """
+
+    with np.load(store_file) as store:
+
+        dates = store["dates"]
+        chunk_size = int(store["chunk_size"])
+
+        # select dates in time range
+        selected = np.ones(len(dates), dtype=bool)
+        if start is not None:
+            selected &= dates >= np.datetime64(start, "m")
+        if end is not None:
+            selected &= dates <= np.datetime64(end, "m")
+        indices = np.flatnonzero(selected)
+
+        # read overlapping chunks only
+        chunks = np.unique(indices // chunk_size)
+        if len(chunks) > 0:
+            u = np.concatenate([store["u_{}".format(i)] for i in chunks])
+            v = np.concatenate([store["v_{}".format(i)] for i in chunks])
+            offsets = indices - chunks[0] * chunk_size
+            u, v = u[offsets], v[offsets]
+        else:
+            shape = (0, len(store["lats"]), len(store["lons"]))
+            u, v = np.empty(shape, dtype=np.float32), np.empty(shape, dtype=np.float32)
+
+        return dates[indices], u, v, store["lats"], store["lons"]
+
+
+def compact_archive(data_path, remove=False, exclude=()):
+    """Compact all day directories of given data path.
+
+    Parameters
+    ----------
+    data_path : Path
+    remove : boolean
+        if True, remove day directories once compacted
+    exclude : [str, ...]
+        names of day directories to leave untouched, such as the current day
+
+    Returns
+    -------
+    store_files : [Path, ...]
+    """
+
+    store_files = []
+    for date_path in sorted(d for d in data_path.iterdir() if d.is_dir()):
+        if date_path.name in exclude:
+            continue
+        store_file = compact_day(date_path, remove=remove)
+        if store_file is not None:
+            store_files.append(store_file)
+
+    return store_files
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--remove", help="remove day directories once compacted", action="store_true"
+    )
+    args = parser.parse_args()
+
+    # read config
+    project_path = Path(__file__).resolve().parents[1]
+    config = configparser.ConfigParser()
+    config.read(project_path / "config" / "config.ini")
+    data_path = Path(config["main"]["data_path"])
+
+    for store_file in compact_archive(data_path, remove=args.remove):
+        print("Compacted: {}".format(store_file))
@@ -0,0 +1,371 @@
+"""
+Shared download cache for Duventchezmoi.
+
+GFS subsets are stored once per request in a cache directory shared by all configurations of a
+host, named after a hash of the normalized request (run, forecast hour, extent and variables), so
+that concurrent or successive runs requesting the same subset reuse each other's downloads. Each
+request has its own lock file, held while the request is fetched and recording its last use.
+
+Cached files are linked into run directories, which keep them as history. The copies of each file
+are recorded, so that evicting least recently used files also removes their copies, and the cache
+and the history it holds stay within a size budget.
+"""
+
+# standard library
+import contextlib
+import fcntl
+import hashlib
+import os
+import shutil
+import time
+import urllib.parse
+from pathlib import Path
+
+# current project
+from duventchezmoi.file_utils import write_atomically
+
+CACHE_SUFFIX = ".grib2"
+LOCK_SUFFIX = ".lock"
+LINKS_SUFFIX = ".links"
+
+
+def normalize_request(url):
+    """Normalize GFS request, so that equivalent requests get the same cache key.
+
+    The server is ignored, query parameters are sorted, and numbers are formatted consistently.
+
+    Parameters
+    ----------
+    url : str
+
+    Returns
+    -------
+    str
+    """
+
+    parts = urllib.parse.urlsplit(url)
+
+    parameters = []
+    for name, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True):
+        try:
+            value = "{:g}".format(float(value))
+        except ValueError:
+            pass
+        parameters.append((name, value))
+
+    return "{}?{}".format(parts.path, urllib.parse.urlencode(sorted(parameters)))
+
+
+def cache_key(url):
+    """Get cache key of a GFS request.
+
+    Parameters
+    ----------
+    url : str
+
+    Returns
+    -------
+    str
+        hexadecimal hash of the normalized request
+    """
+    return hashlib.sha256(normalize_request(url).encode("utf-8")).hexdigest()
+
+
+class DownloadCache:
+    """Cache of downloaded files shared across runs and processes.
+
+    Parameters
+    ----------
+    path : Path
+        cache directory
+    max_bytes : int or None
+        size budget of the cache, including the copies of cached files, unbounded if None
+    """
+
+    def __init__(self, path, max_bytes=None):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def get_file(self, url):
+        """Get cache file of given request.
+
+        Parameters
+        ----------
+        url : str
+
+        Returns
+        -------
+        Path
+        """
+        key = cache_key(url)
+        return self.path / key[:2] / (key + CACHE_SUFFIX)
+
+    @staticmethod
+    def get_lock_file(cache_file):
+        """Get lock file of given cache file, whose modification time records its last use.
+
+        Cache files are hard-linked into run directories, so their own times are left untouched.
+
+        Parameters
+        ----------
+        cache_file : Path
+
+        Returns
+        -------
+        Path
+        """
+        return cache_file.with_suffix(LOCK_SUFFIX)
+
+    @staticmethod
+    def get_links_file(cache_file):
+        """Get file recording the copies of given cache file, one per line.
+
+        Parameters
+        ----------
+        cache_file : Path
+
+        Returns
+        -------
+        Path
+        """
+        return cache_file.with_suffix(LINKS_SUFFIX)
+
+    def read_links(self, cache_file):
+        """Read copies of given cache file that still hold its data.
+
+        Copies removed or replaced since they were recorded, such as by cleaning, are left out.
+
+        Parameters
+        ----------
+        cache_file : Path
+
+        Returns
+        -------
+        links : [(Path, os.stat_result), ...]
+            path and status of each copy, hard links sharing the inode of the cache file
+        """
+
+        try:
+            lines = self.get_links_file(cache_file).read_text().splitlines()
+        except FileNotFoundError:
+            return []
+
+        links = {}
+        for line in lines:
+            fields = line.split(" ", 2)
+            if len(fields) < 3:
+                continue
+            dev, ino, path = fields
+            with contextlib.suppress(FileNotFoundError):
+                stat = os.stat(path)
+                if (stat.st_dev, stat.st_ino) == (int(dev), int(ino)):
+                    links[Path(path)] = stat
+
+        return list(links.items())
+
+    @contextlib.contextmanager
+    def lock(self, cache_file, blocking=True):
+        """Lock given cache file across threads and processes.
+
+        Parameters
+        ----------
+        cache_file : Path
+        blocking : boolean
+            if False, yield False immediately if the lock is held elsewhere
+
+        Yields
+        ------
+        boolean
+            True if the lock was acquired
+        """
+
+        lock_file = self.get_lock_file(cache_file)
+        while True:
+            with open(lock_file, "a") as f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    yield False
+                    return
+
+                # lock again if the lock file was removed by evict while waiting for it
+                try:
+                    is_current = os.stat(lock_file).st_ino == os.fstat(f.fileno()).st_ino
+                except FileNotFoundError:
+                    is_current = False
+                if not is_current:
+                    continue
+
+                try:
+                    yield True
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                return
+
+    def fetch(self, url, output_file, download_function):
+        """Get file of given request from cache, downloading it only if not cached yet.
+
+        Parameters
+        ----------
+        url : str
+        output_file : Path
+            linked to the cache file, or copied if the cache is on another file system, and removed
+            along with the cache file when evicted
+        download_function : callable
+            called with the URL and the cache file, returns a result dict with a "success" key,
+            such as download_gfs.download_forecast_hour
+
+        Returns
+        -------
+        result : dict
+            as returned by download_function, with a "cached" key set to True if the file was
+            found in cache
+        """
+
+        start_time = time.perf_counter()
+        cache_file = self.get_file(url)
+        cache_file.parent.mkdir(exist_ok=True)
+
+        # concurrent requests for the same file wait for the first one to download it, requests
+        # for other files being independent
+        with self.lock(cache_file):
+            if cache_file.exists():
+                result = {
+                    "success": True,
+                    "bytes": cache_file.stat().st_size,
+                    "latency": 0.0,
+                    "throughput": 0.0,
+                    "skipped": False,
+                    "retries": 0,
+                    "throttled": 0,
+                    "error": None,
+                    "cached": True,
+                }
+            else:
+                # download to a temporary file, so that interrupted downloads are never cached
+                temp_file = cache_file.with_name(".{}.part".format(cache_file.name))
+                result = dict(download_function(url, temp_file), cached=False)
+                if not result["success"] or not temp_file.exists():
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(temp_file)
+                    return result
+                os.replace(temp_file, cache_file)
+
+            # mark as recently used
+            os.utime(self.get_lock_file(cache_file))
+
+            # link cache file into output directory, replacing any previous file, renaming being
+            # a no-op if the output file is already a link to the cache file
+            if not (output_file.exists() and os.path.samefile(cache_file, output_file)):
+                temp_file = output_file.with_name(".{}.link".format(output_file.name))
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(temp_file)
+                try:
+                    os.link(cache_file, temp_file)
+                except OSError:
+                    shutil.copyfile(cache_file, temp_file)
+                os.replace(temp_file, output_file)
+
+            # record copy, so that it is evicted along with the cache file, copies removed since
+            # being left out
+            links = dict(self.read_links(cache_file))
+            links[output_file.resolve()] = os.stat(output_file)
+            write_atomically(
+                self.get_links_file(cache_file),
+                "".join(
+                    "{} {} {}\n".format(stat.st_dev, stat.st_ino, path)
+                    for path, stat in links.items()
+                ),
+            )
+
+        if result["cached"]:
+            result["latency"] = time.perf_counter() - start_time
+
+        return result
+
+    def evict(self, keep=()):
+        """Remove least recently used files and their copies until they fit in the size budget.
+
+        Files locked by a running download, and files also linked from places not recorded by the
+        cache, whose removal would free no space, are left in place.
+
+        Parameters
+        ----------
+        keep : [Path, ...]
+            cache files not to remove, such as the ones of the run being processed
+
+        Returns
+        -------
+        removed : int
+            number of bytes freed
+        """
+
+        if self.max_bytes is None:
+            return 0
+        keep = set(keep)
+
+        # list cached files, by last use, with the space used by their copies
+        entries = []
+        for cache_file in self.path.glob("??/*" + CACHE_SUFFIX):
+            with contextlib.suppress(FileNotFoundError):
+                stat = cache_file.stat()
+                size = stat.st_size + sum(
+                    s.st_size for _, s in self.read_links(cache_file) if s.st_ino != stat.st_ino
+                )
+                try:
+                    last_use = self.get_lock_file(cache_file).stat().st_mtime
+                except FileNotFoundError:
+                    last_use = 0.0
+                entries.append((last_use, size, cache_file))
+        entries.sort()
+
+        total_size = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, cache_file in entries:
+            if total_size - removed <= self.max_bytes:
+                break
+            if cache_file in keep:
+                continue
+            with self.lock(cache_file, blocking=False) as is_locked:
+                if is_locked:
+                    removed += self._remove(cache_file)
+
+        return removed
+
+    def _remove(self, cache_file):
+        """Remove cache file and its copies, to be called with the cache file locked.
+
+        Returns
+        -------
+        removed : int
+            number of bytes freed, 0 if the cache file is also linked from places not recorded
+        """
+
+        try:
+            stat = cache_file.stat()
+        except FileNotFoundError:
+            return 0
+
+        # hard links not recorded would keep the data on disk
+        links = self.read_links(cache_file)
+        if stat.st_nlink > 1 + sum(s.st_ino == stat.st_ino for _, s in links):
+            return 0
+
+        removed = stat.st_size
+        for path, link_stat in links:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+                if link_stat.st_ino != stat.st_ino:
+                    removed += link_stat.st_size
+            # remove run directories left empty
+            with contextlib.suppress(OSError):
+                os.rmdir(path.parent)
+        os.remove(cache_file)
+
+        # remove links and lock files too, so that they do not pile up
+        for path in [self.get_links_file(cache_file), self.get_lock_file(cache_file)]:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+        return removed
@@ -3,12 +3,55 @@ GFS data downloading module for Duventchezmoi.
 """
 
 # standard library
+import concurrent.futures
+import contextlib
 import datetime
+import functools
+import http.client
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
 import urllib.request
 from pathlib import Path
 
+# current project
+from duventchezmoi.state import read_state
+from duventchezmoi.state import write_state
 
-def create_gfs_url(run_date, extent, forecast_hours):
+CHUNK_SIZE = 64 * 1024  # size of chunks streamed to disk, in bytes
+GFS_MAX_FORECAST_HOURS = 384  # forecast horizon of GFS runs, 16 days
+GFS_HOURLY_FORECAST_HOURS = 120  # GFS outputs are hourly up to this forecast hour
+GFS_OUTPUT_INTERVAL = 3  # interval between GFS outputs after GFS_HOURLY_FORECAST_HOURS, in hours
+GFS_CYCLES_INTERVAL = 6  # GFS runs every 6 hours, at 00, 06, 12 and 18 UTC
+GFS_BASE_URL = "https://nomads.ncep.noaa.gov"
+GFS_REQUEST_RATE = 2.0  # NOMADS blocks clients exceeding about 120 requests per minute
+REQUEST_TIMEOUT = 60.0  # socket timeout of requests, in seconds
+MAX_RETRIES = 5  # number of times a forecast hour is requested again after a transient failure
+BACKOFF_BASE = 1.0  # delay before the first retry, doubled at each retry, in seconds
+BACKOFF_MAX = 120.0  # maximum delay between retries, in seconds
+THROTTLING_STATUSES = (403, 429)  # statuses returned by NOMADS to rate limited clients
+
+
+class ThrottledError(Exception):
+    """Raised when the server rate limits requests.
+
+    Parameters
+    ----------
+    message : str
+    retry_after : float or None
+        delay requested by the server before the next request, in seconds
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def create_gfs_url(run_date, extent, forecast_hours, step="00", base_url=GFS_BASE_URL):
     """Generates GFS data request.
 
     Parameters
@@ -16,10 +59,13 @@ def create_gfs_url(run_date, extent, forecast_hours):
     run_date : str (format YYYYmmdd)
     extent : [float, float, float, float] (W, N, E, S)
     forecast_hours : int
+    step : str
+        run cycle, either 00, 06, 12 or 18
+    base_url : str
+        NOMADS server, such as a mirror or a local stand-in server
     """
 
     # preparing parameters
-    step = "00"
     grid = "0.25".replace(".", "p")
     forecast_hours = "{}".format(forecast_hours).zfill(3)
     levels = ["planetary_boundary_layer"]
@@ -30,7 +76,7 @@ def create_gfs_url(run_date, extent, forecast_hours):
     bottom_lat = extent[3]
 
     # creating url
-    url = "https://nomads.ncep.noaa.gov"
+    url = base_url
     url += "/cgi-bin/filter_gfs_{0}.pl?file=gfs.t{1}z.pgrb2.{2}.f{3}".format(
         grid, step, grid, forecast_hours
     )
@@ -49,62 +95,806 @@ def create_gfs_url(run_date, extent, forecast_hours):
     return url
 
 
-def download_from_url(input_url, output_file, verbose=False):
+def create_gfs_index_url(run_date, forecast_hours, step="00", base_url=GFS_BASE_URL):
+    """Generates URL of the inventory file of a GFS product, cheap to probe.
+
+    Parameters
+    ----------
+    run_date : str (format YYYYmmdd)
+    forecast_hours : int
+    step : str
+        run cycle, either 00, 06, 12 or 18
+    base_url : str
+        NOMADS server
+    """
+
+    grid = "0.25".replace(".", "p")
+    forecast_hours = "{}".format(forecast_hours).zfill(3)
+
+    url = base_url
+    url += "/pub/data/nccf/com/gfs/prod/gfs.{0}/{1}/atmos".format(run_date, step)
+    url += "/gfs.t{0}z.pgrb2.{1}.f{2}.idx".format(step, grid, forecast_hours)
+
+    return url
+
+
+def create_forecast_hours(horizon=GFS_MAX_FORECAST_HOURS, step=1):
+    """Generate forecast hours to download, following the output cadence of GFS.
+
+    GFS outputs are hourly up to GFS_HOURLY_FORECAST_HOURS, and every GFS_OUTPUT_INTERVAL hours
+    after that, up to GFS_MAX_FORECAST_HOURS.
+
+    Parameters
+    ----------
+    horizon : int
+        last forecast hour, at most GFS_MAX_FORECAST_HOURS
+    step : int
+        interval between forecast hours, in hours, rounded up to a multiple of
+        GFS_OUTPUT_INTERVAL after GFS_HOURLY_FORECAST_HOURS
+
+    Returns
+    -------
+    forecast_hours : [int, ...]
+    """
+
+    horizon = min(horizon, GFS_MAX_FORECAST_HOURS)
+    step = max(1, step)
+    late_step = -(-step // GFS_OUTPUT_INTERVAL) * GFS_OUTPUT_INTERVAL
+
+    forecast_hours = list(range(0, min(horizon, GFS_HOURLY_FORECAST_HOURS) + 1, step))
+    forecast_hours += range(GFS_HOURLY_FORECAST_HOURS + late_step, horizon + 1, late_step)
+
+    return forecast_hours
+
+
+class ConnectionPool:
+    """Pool of persistent HTTP(S) connections, reused across requests to the same host.
+
+    Parameters
+    ----------
+    maxsize : int
+        maximum number of idle connections kept per host
+    timeout : float or None
+        socket timeout in seconds
+
+    Attributes
+    ----------
+    retries : int
+        number of requests sent again after an idle connection was closed by the server
+    """
+
+    def __init__(self, maxsize=1, timeout=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.retries = 0
+        self._idle_connections = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _new_connection(self, scheme, netloc):
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def _acquire(self, scheme, netloc):
+        with self._lock:
+            idle_connections = self._idle_connections.get((scheme, netloc), [])
+            if idle_connections:
+                return idle_connections.pop(), True
+        return self._new_connection(scheme, netloc), False
+
+    def _release(self, scheme, netloc, connection):
+        with self._lock:
+            idle_connections = self._idle_connections.setdefault((scheme, netloc), [])
+            if len(idle_connections) < self.maxsize:
+                idle_connections.append(connection)
+                return
+        connection.close()
+
+    @contextlib.contextmanager
+    def urlopen(self, url, method="GET"):
+        """Send a request on a pooled connection, and yield the response.
+
+        The connection is returned to the pool when leaving the context, once the response body
+        has been fully read.
+
+        Parameters
+        ----------
+        url : str
+        method : str
+        """
+
+        parts = urllib.parse.urlsplit(url)
+        target = urllib.parse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
+
+        connection, is_reused = self._acquire(parts.scheme, parts.netloc)
+        try:
+            connection.request(method, target)
+            response = connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            if not is_reused:
+                raise
+
+            # idle connection closed by the server, retry on a new one
+            with self._lock:
+                self.retries += 1
+            connection = self._new_connection(parts.scheme, parts.netloc)
+            connection.request(method, target)
+            response = connection.getresponse()
+
+        try:
+            if response.status >= 400:
+                raise urllib.error.HTTPError(
+                    url, response.status, response.reason, response.headers, None
+                )
+            yield response
+            response.read()  # drain the body so that the connection can be reused
+        except BaseException:
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(parts.scheme, parts.netloc, connection)
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            for idle_connections in self._idle_connections.values():
+                for connection in idle_connections:
+                    connection.close()
+            self._idle_connections = {}
+
+
+class TokenBucket:
+    """Rate limiter shared by concurrent requests.
+
+    Tokens are added at a fixed rate, up to the bucket capacity, and each request takes one token,
+    waiting if none is available. All requests can also be paused, when the server asks clients to
+    slow down.
+
+    Parameters
+    ----------
+    rate : float or None
+        number of requests per second, unlimited if None or 0
+    capacity : int
+        maximum number of requests sent in a burst
+    """
+
+    def __init__(self, rate=None, capacity=1):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._last_time = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a request can be sent."""
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                delay = self._paused_until - now
+                if delay <= 0 and not self.rate:
+                    return
+                if delay <= 0:
+                    self._tokens = min(
+                        self.capacity, self._tokens + (now - self._last_time) * self.rate
+                    )
+                    self._last_time = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+    def pause(self, delay):
+        """Pause all requests for given delay.
+
+        Parameters
+        ----------
+        delay : float
+            in seconds
+        """
+
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._tokens = 0.0
+            self._last_time = self._paused_until
+
+
+def compute_backoff(attempt, base=BACKOFF_BASE, maximum=BACKOFF_MAX):
+    """Compute delay before retrying a request, with exponential backoff and full jitter.
+
+    Parameters
+    ----------
+    attempt : int
+        number of failed attempts so far, from 0
+    base : float
+        in seconds
+    maximum : float
+        in seconds
+
+    Returns
+    -------
+    float
+        in seconds, random between 0 and the exponential backoff
+    """
+
+    return random.uniform(0.0, min(maximum, base * 2**attempt))
+
+
+def get_retry_after(error):
+    """Get delay requested in the Retry-After header of an HTTP error response.
+
+    Parameters
+    ----------
+    error : urllib.error.HTTPError
+
+    Returns
+    -------
+    float or None
+        in seconds, None if not given as a number of seconds
+    """
+
+    try:
+        return float(error.headers.get("Retry-After"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def download_from_url(
+    input_url, output_file, verbose=False, pool=None, chunk_size=CHUNK_SIZE, timeout=REQUEST_TIMEOUT
+):
     """Download from given url, and store responde in given output file.
 
+    The response is streamed to disk in chunks of fixed size. Errors, including timeouts while
+    reading the response, are raised and leave no partial file.
+
     Parameters
     ----------
     input_url : str
     output_file : Path
     verbose : boolean
+    pool : ConnectionPool or None
+        if None, a new connection is opened for this request
+    chunk_size : int
+        in bytes
+    timeout : float or None
+        socket timeout in seconds, when no pool is given, the pool timeout being used otherwise
     """
 
     if verbose:
         print("Downloading: {}".format(input_url))
 
-    response = urllib.request.urlopen(input_url)
+    if pool is None:
+        response_context = urllib.request.urlopen(input_url, timeout=timeout)
+    else:
+        response_context = pool.urlopen(input_url)
+
+    with response_context as response:
+
+        # write to a temporary file, renamed only once complete
+        fd, temp_file = tempfile.mkstemp(
+            dir=output_file.parent, prefix=".{}.".format(output_file.name), suffix=".part"
+        )
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = response.read(chunk_size)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    size += len(chunk)
+            if size > 0:
+                os.replace(temp_file, output_file)
+            else:
+                os.remove(temp_file)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+
+    return size > 0
+
+
+def is_valid_grib2(grib2_file):
+    """Check that given file is a complete GRIB2 file holding U and V wind components.
+
+    Parameters
+    ----------
+    grib2_file : Path
 
+    Returns
+    -------
+    boolean
+    """
+
+    # third party
+    import pygrib
+
+    if not grib2_file.is_file() or grib2_file.stat().st_size < 8:
+        return False
+
+    # cheap check of GRIB start and end markers
+    with open(grib2_file, "rb") as f:
+        if f.read(4) != b"GRIB":
+            return False
+        f.seek(-4, os.SEEK_END)
+        if f.read(4) != b"7777":
+            return False
+
+    # check that both wind components can be decoded
     try:
-        html = response.read()
+        with pygrib.open(str(grib2_file)) as grbs:
+            names = {grb.name for grb in grbs}
     except Exception:
-        exit("Error while downloading file")
+        return False
+
+    return {"U component of wind", "V component of wind"} <= names
+
+
+def is_run_available(
+    run,
+    forecast_hours=GFS_MAX_FORECAST_HOURS,
+    pool=None,
+    base_url=GFS_BASE_URL,
+    timeout=REQUEST_TIMEOUT,
+):
+    """Check if given GFS run is published up to given forecast hours, with a HEAD request.
+
+    Parameters
+    ----------
+    run : (str, str)
+        run date (format YYYYmmdd) and cycle (either 00, 06, 12 or 18)
+    forecast_hours : int
+    pool : ConnectionPool or None
+    base_url : str
+        NOMADS server
+    timeout : float or None
+        socket timeout in seconds, when no pool is given, the pool timeout being used otherwise
+
+    Returns
+    -------
+    boolean
+    """
+
+    url = create_gfs_index_url(run[0], forecast_hours, run[1], base_url=base_url)
 
-    if len(html) > 0:
-        f = open(output_file, "wb")
-        f.write(html)
-        return True
+    if pool is None:
+        response_context = urllib.request.urlopen(
+            urllib.request.Request(url, method="HEAD"), timeout=timeout
+        )
     else:
+        response_context = pool.urlopen(url, method="HEAD")
+
+    try:
+        with response_context as response:
+            return response.status == 200
+    except urllib.error.HTTPError:
         return False
 
 
-def download_gfs(extent, data_path):
-    """Download today's GFS forecast for given coordinates.
+def find_latest_run(
+    forecast_hours=GFS_MAX_FORECAST_HOURS,
+    now=None,
+    after=None,
+    lookback_cycles=4,
+    pool=None,
+    base_url=GFS_BASE_URL,
+    timeout=REQUEST_TIMEOUT,
+):
+    """Find latest GFS run published up to given forecast hours.
+
+    Cycles are probed from the most recent one, going back in time.
+
+    Parameters
+    ----------
+    forecast_hours : int
+    now : datetime object or None
+        in UTC, if None the current time is used
+    after : (str, str) or None
+        run already processed, older runs are not probed
+    lookback_cycles : int
+        number of cycles probed
+    pool : ConnectionPool or None
+    base_url : str
+        NOMADS server
+    timeout : float or None
+        socket timeout in seconds, when no pool is given, the pool timeout being used otherwise
+
+    Returns
+    -------
+    run : (str, str) or None
+        run date (format YYYYmmdd) and cycle, None if no newer run is available
+    """
+
+    if now is None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+    latest_cycle_date = now.replace(
+        hour=now.hour // GFS_CYCLES_INTERVAL * GFS_CYCLES_INTERVAL,
+        minute=0,
+        second=0,
+        microsecond=0,
+    )
+
+    for i in range(lookback_cycles):
+        cycle_date = latest_cycle_date - datetime.timedelta(hours=i * GFS_CYCLES_INTERVAL)
+        run = (cycle_date.strftime("%Y%m%d"), cycle_date.strftime("%H"))
+        if after is not None and run <= tuple(after):
+            return None
+        if is_run_available(run, forecast_hours, pool=pool, base_url=base_url, timeout=timeout):
+            return run
+
+    return None
+
+
+def get_run_name(run):
+    """Get name of given run, used for its download directory.
+
+    Parameters
+    ----------
+    run : (str, str)
+        run date (format YYYYmmdd) and cycle
+
+    Returns
+    -------
+    str
+        YYYYmmdd for 00 runs, YYYYmmdd_HH otherwise
+    """
+
+    if run[1] == "00":
+        return run[0]
+    return "{}_{}".format(*run)
+
+
+def read_last_run(state_file, names):
+    """Read last run processed for all given names, such as monitoring sites.
+
+    Parameters
+    ----------
+    state_file : Path
+    names : [str, ...]
+
+    Returns
+    -------
+    run : (str, str) or None
+        oldest of the last runs processed for given names, None if one was never processed
+    """
+
+    last_runs = read_state(state_file, "last_run", {})
+    if any(name not in last_runs for name in names):
+        return None
+
+    return min(tuple(last_runs[name]) for name in names)
+
+
+def write_last_run(state_file, run, names):
+    """Record run processed for given names in state file.
+
+    Parameters
+    ----------
+    state_file : Path
+    run : (str, str)
+    names : [str, ...]
+    """
+
+    last_runs = read_state(state_file, "last_run", {})
+    for name in names:
+        last_runs[name] = list(run)
+    write_state(state_file, "last_run", last_runs)
+
+
+def check_grib2_header(output_file):
+    """Check that a downloaded file holds GRIB2 data.
+
+    NOMADS answers rate limited clients with HTML pages, sometimes with a 200 status. Such files
+    are removed.
+
+    Parameters
+    ----------
+    output_file : Path
+
+    Raises
+    ------
+    ThrottledError
+        if the file does not start with the GRIB marker
+    """
+
+    with open(output_file, "rb") as f:
+        header = f.read(4)
+
+    if header != b"GRIB":
+        output_file.unlink()
+        raise ThrottledError("Received {!r}... instead of GRIB2 data".format(header))
+
+
+def download_forecast_hour(
+    input_url,
+    output_file,
+    verbose=False,
+    pool=None,
+    bucket=None,
+    max_retries=MAX_RETRIES,
+    timeout=REQUEST_TIMEOUT,
+):
+    """Download a single forecast hour and record its outcome.
+
+    Transient failures (timeouts, connection errors, server errors and throttling) are retried
+    with jittered exponential backoff. When the server throttles requests, all requests sharing
+    the token bucket are paused.
+
+    Parameters
+    ----------
+    input_url : str
+    output_file : Path
+    verbose : boolean
+    pool : ConnectionPool or None
+    bucket : TokenBucket or None
+        rate limiter shared by concurrent downloads
+    max_retries : int
+    timeout : float or None
+        in seconds
+
+    Returns
+    -------
+    result : dict
+        {"success": bool, "bytes": int, "latency": float (seconds),
+        "throughput": float (bytes/s), "skipped": bool, "cached": bool, "retries": int,
+        "throttled": int, "error": str or None}
+    """
+
+    start_time = time.perf_counter()
+    retries = throttled = 0
+    success = False
+    error = None
+
+    for attempt in range(max_retries + 1):
+
+        if bucket is not None:
+            bucket.acquire()
+
+        # download, and find delay before retrying on failure
+        is_throttled = False
+        try:
+            success = bool(
+                download_from_url(
+                    input_url, output_file, verbose=verbose, pool=pool, timeout=timeout
+                )
+            )
+            if success and output_file.exists():
+                check_grib2_header(output_file)
+            error = None
+            break
+        except ThrottledError as e:
+            error, is_throttled = e, True
+            delay = max(e.retry_after or 0.0, compute_backoff(attempt))
+        except urllib.error.HTTPError as e:
+            error = e
+            if e.code in THROTTLING_STATUSES:
+                is_throttled = True
+                delay = max(get_retry_after(e) or 0.0, compute_backoff(attempt))
+            elif e.code >= 500:
+                delay = compute_backoff(attempt)
+            else:
+                break  # other client errors are not transient
+        except (OSError, http.client.HTTPException) as e:
+            error = e
+            delay = compute_backoff(attempt)
+        except Exception as e:
+            error = e
+            break
+
+        success = False
+        throttled += is_throttled
+        if attempt == max_retries:
+            break
+
+        # slow down all downloads if throttled
+        if is_throttled and bucket is not None:
+            bucket.pause(delay)
+        retries += 1
+        time.sleep(delay)
+
+    latency = time.perf_counter() - start_time
+
+    # size of the downloaded file
+    size = output_file.stat().st_size if success and output_file.exists() else 0
+
+    return {
+        "success": success,
+        "bytes": size,
+        "latency": latency,
+        "throughput": size / latency if latency > 0 else 0.0,
+        "skipped": False,
+        "cached": False,
+        "retries": retries,
+        "throttled": throttled,
+        "error": None if error is None else str(error),
+    }
+
+
+def download_gfs(
+    extent,
+    data_path,
+    max_workers=1,
+    incremental=False,
+    pool=None,
+    callback=None,
+    run=None,
+    base_url=GFS_BASE_URL,
+    metrics=None,
+    request_rate=None,
+    max_retries=MAX_RETRIES,
+    timeout=REQUEST_TIMEOUT,
+    forecast_hours=None,
+    cache=None,
+):
+    """Download GFS forecast for given coordinates.
 
     Parameters
     ----------
     extent : [float, float, float, float]
         W, N, E, S, at 0.25 deg precision
     data_path : Path
+    max_workers : int
+        number of forecast hours downloaded concurrently
+    incremental : boolean
+        if True, skip forecast hours already downloaded as valid GRIB2 files
+    pool : ConnectionPool or None
+        connections reused across forecast hours, if None a pool is created for this run
+    callback : callable or None
+        called in the calling thread as soon as each forecast hour is available, with the
+        forecast hours, the output file and the download result as arguments, while remaining
+        forecast hours are still downloading, its duration being left out of the download stage
+    run : (str, str) or None
+        run date (format YYYYmmdd) and cycle, if None today's 00 run is downloaded
+    base_url : str
+        NOMADS server, such as a mirror or a local stand-in server
+    metrics : Metrics or None
+        if given, download duration, bytes, files, latencies and retries are recorded
+    request_rate : float or None
+        maximum number of requests per second, unlimited if None or 0, see GFS_REQUEST_RATE
+    max_retries : int
+        number of times a forecast hour is requested again after a transient failure, failed
+        forecast hours being reported in results without interrupting other ones
+    timeout : float or None
+        socket timeout of requests, in seconds, when no pool is given
+    forecast_hours : [int, ...] or None
+        forecast hours to download, if None the whole forecast is downloaded, see
+        create_forecast_hours
+    cache : DownloadCache or None
+        if given, forecast hours are fetched from this cache shared across runs, and downloaded
+        into it if missing, least recently used files of other runs being evicted once all are
+        downloaded, along with their copies in run directories
+
+    Returns
+    -------
+    results : {int: dict, ...}
+        download result for each forecast hour, see download_forecast_hour
     """
 
-    # get run date
-    run_date_str = datetime.datetime.now().strftime("%Y%m%d")
+    # get run date and forecast hours
+    if forecast_hours is None:
+        forecast_hours = create_forecast_hours()
+    if run is None:
+        run = (datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d"), "00")
+    run_date_str, step = run
     run_date_obj = datetime.datetime.strptime(run_date_str, "%Y%m%d")
+    run_date_obj += datetime.timedelta(hours=int(step))
+
+    # time spent in the callback, such as decoding, is recorded by its own stages
+    start_time = time.perf_counter()
+    callback_seconds = 0.0
+
+    def run_callback(hours, output_file, result):
+        nonlocal callback_seconds
+        if callback is not None:
+            callback_start_time = time.perf_counter()
+            callback(hours, output_file, result)
+            callback_seconds += time.perf_counter() - callback_start_time
+
+    # download forecast hours concurrently, over persistent connections
+    results = {}
+    with contextlib.ExitStack() as stack:
+
+        if metrics is not None:
+            stack.callback(
+                lambda: metrics.record_stage(
+                    "download", time.perf_counter() - start_time - callback_seconds
+                )
+            )
+        if pool is None:
+            pool = stack.enter_context(ConnectionPool(maxsize=max(1, max_workers), timeout=timeout))
+        pool_retries = pool.retries
+        bucket = TokenBucket(request_rate, capacity=max_workers)
+        executor = stack.enter_context(
+            concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers))
+        )
+
+        futures = {}
+        cache_files = []
+        for hours in forecast_hours:
+
+            # create output filename
+            forecast_date = run_date_obj + datetime.timedelta(hours=hours)
+            output_file = "{}.grib2".format(forecast_date.strftime("%Y%m%d_%H%M"))
+
+            # create URL
+            url = create_gfs_url(run_date_str, extent, hours, step, base_url=base_url)
+            if cache is not None:
+                cache_files.append(cache.get_file(url))
+
+            # skip forecast hours already downloaded, corrupt files are fetched again
+            if incremental and is_valid_grib2(data_path / output_file):
+                size = (data_path / output_file).stat().st_size
+                results[hours] = {
+                    "success": True,
+                    "bytes": size,
+                    "latency": 0.0,
+                    "throughput": 0.0,
+                    "skipped": True,
+                    "cached": False,
+                    "retries": 0,
+                    "throttled": 0,
+                    "error": None,
+                }
+                run_callback(hours, data_path / output_file, results[hours])
+                continue
 
-    # GFS performs 16 days forecast
-    GFS_max_forecast_hours = 120  # 384 for some reason cannot download full forecast
+            # submit download, through the cache if any
+            download = functools.partial(
+                download_forecast_hour,
+                verbose=True,
+                pool=pool,
+                bucket=bucket,
+                max_retries=max_retries,
+                timeout=timeout,
+            )
+            if cache is None:
+                future = executor.submit(download, url, data_path / output_file)
+            else:
+                future = executor.submit(cache.fetch, url, data_path / output_file, download)
+            futures[future] = (hours, data_path / output_file)
 
-    for forecast_hours in range(GFS_max_forecast_hours + 1):
+        # gather results as soon as they are available
+        for future in concurrent.futures.as_completed(futures):
+            hours, output_file = futures[future]
+            results[hours] = future.result()
+            run_callback(hours, output_file, results[hours])
 
-        # create output filename
-        forecast_date = run_date_obj + datetime.timedelta(hours=forecast_hours)
-        output_file = "{}.grib2".format(forecast_date.strftime("%Y%m%d_%H%S"))
+        # record metrics of all forecast hours
+        if metrics is not None:
+            downloaded = [
+                r for r in results.values() if r["success"] and not (r["skipped"] or r["cached"])
+            ]
+            metrics.increment("downloaded_files", len(downloaded))
+            metrics.increment("downloaded_bytes", sum(r["bytes"] for r in downloaded))
+            metrics.increment("skipped_files", sum(r["skipped"] for r in results.values()))
+            metrics.increment("cached_files", sum(r["cached"] for r in results.values()))
+            metrics.increment("failed_files", sum(not r["success"] for r in results.values()))
+            metrics.increment(
+                "download_retries",
+                pool.retries - pool_retries + sum(r["retries"] for r in results.values()),
+            )
+            metrics.increment("throttled_requests", sum(r["throttled"] for r in results.values()))
+            for result in downloaded:
+                metrics.observe("download_latency_seconds", result["latency"])
 
-        # create URL
-        url = create_gfs_url(run_date_str, extent, forecast_hours)
+    # keep the shared cache within its size budget, files of this run being kept
+    if cache is not None:
+        cache.evict(keep=cache_files)
 
-        # download file
-        download_from_url(url, data_path / output_file, verbose=True)
+    return dict(sorted(results.items()))
 
 
 if __name__ == "__main__":
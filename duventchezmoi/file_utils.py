@@ -0,0 +1,49 @@
+"""
+File utilities for Duventchezmoi.
+"""
+
+# standard library
+import contextlib
+import os
+import tempfile
+
+
+@contextlib.contextmanager
+def open_atomically(output_file, mode="w"):
+    """Open a temporary file, renamed to given file only once completely written.
+
+    Readers, such as the textfile collector or concurrent runs, never see a partial file, and the
+    temporary file is removed if writing fails.
+
+    Parameters
+    ----------
+    output_file : Path
+    mode : str
+        either "w" or "wb"
+
+    Yields
+    ------
+    file object
+    """
+
+    fd, temp_file = tempfile.mkstemp(dir=output_file.parent, suffix=".part")
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(temp_file, output_file)
+    except BaseException:
+        os.remove(temp_file)
+        raise
+
+
+def write_atomically(output_file, text):
+    """Write text to given file, see open_atomically.
+
+    Parameters
+    ----------
+    output_file : Path
+    text : str
+    """
+
+    with open_atomically(output_file) as f:
+        f.write(text)
@@ -0,0 +1,137 @@
+"""
+Forecast series module for Duventchezmoi.
+"""
+
+# third party
+import numpy as np
+
+# current project
+from duventchezmoi.download_gfs import GFS_OUTPUT_INTERVAL
+
+
+def parse_dates(names):
+    """Parse dates of GRIB2 file names, or of dates as stored in the archive index.
+
+    Parameters
+    ----------
+    names : [str, ...]
+        as YYYYmmdd_HHMM
+
+    Returns
+    -------
+    np.ndarray
+        datetime64[m]
+    """
+
+    return np.array(
+        ["{}-{}-{}T{}:{}".format(n[:4], n[4:6], n[6:8], n[9:11], n[11:13]) for n in names],
+        dtype="datetime64[m]",
+    )
+
+
+def compute_time_weights(dates, centered=True):
+    """Compute the time each value of a series stands for.
+
+    Intervals between values are limited to the GFS output interval, so that gaps in the series
+    are not filled by their neighbours.
+
+    Parameters
+    ----------
+    dates : np.ndarray
+        datetime64, sorted
+    centered : boolean
+        if True, each value stands for half the interval to each of its neighbours, otherwise for
+        the interval until the next value, the last value standing for the same time as the
+        previous one
+
+    Returns
+    -------
+    np.ndarray
+        in hours
+    """
+
+    intervals = np.minimum(np.diff(dates) / np.timedelta64(1, "h"), GFS_OUTPUT_INTERVAL)
+    if centered:
+        return (np.append(intervals, 0.0) + np.insert(intervals, 0, 0.0)) / 2
+    return np.append(intervals, intervals[-1] if len(intervals) > 0 else 1.0)
+
+
+class ForecastSeries:
+    """Wind speed forecast series, held in arrays sorted by date.
+
+    Parameters
+    ----------
+    dates : np.ndarray or [datetime object, ...]
+        converted to datetime64[m]
+    values : np.ndarray or [float, ...]
+        wind speed, converted to float32
+    threshold : float or None
+        alerts are values above threshold, if not given
+    alerts : np.ndarray or None
+        boolean, True at alert dates, if None computed from threshold when first needed, there are
+        no alerts without threshold
+    """
+
+    __slots__ = ("dates", "values", "threshold", "_alerts")
+
+    def __init__(self, dates, values, threshold=None, alerts=None):
+
+        dates = np.asarray(dates, dtype="datetime64[m]")
+        values = np.asarray(values, dtype=np.float32)
+        if alerts is not None:
+            alerts = np.asarray(alerts, dtype=bool)
+        if len(dates) != len(values) or (alerts is not None and len(alerts) != len(values)):
+            raise ValueError("Dates, values and alerts of a forecast series must have same length")
+
+        # sort by date, series being usually sorted already
+        if np.any(dates[1:] < dates[:-1]):
+            order = np.argsort(dates, kind="stable")
+            dates, values = dates[order], values[order]
+            if alerts is not None:
+                alerts = alerts[order]
+
+        self.dates = dates
+        self.values = values
+        self.threshold = threshold
+        self._alerts = alerts
+
+    @classmethod
+    def from_records(cls, data, threshold=None):
+        """Create series from a list of rows.
+
+        Parameters
+        ----------
+        data : [dict, ...]
+            contains for each row: {"date_obj": datetime object, "wind_speed": float,
+            "alert": bool}
+        threshold : float or None
+
+        Returns
+        -------
+        ForecastSeries
+        """
+
+        return cls(
+            [row["date_obj"] for row in data],
+            [row["wind_speed"] for row in data],
+            threshold,
+            np.array([row["alert"] for row in data], dtype=bool),
+        )
+
+    @property
+    def alerts(self):
+        """np.ndarray: boolean, True at alert dates."""
+        if self._alerts is None:
+            if self.threshold is None:
+                self._alerts = np.zeros(len(self.values), dtype=bool)
+            else:
+                self._alerts = self.values > self.threshold
+        return self._alerts
+
+    def __len__(self):
+        return len(self.values)
+
+    def __repr__(self):
+        return "ForecastSeries({} values from {} to {})".format(
+            len(self), self.dates[0] if len(self) else None, self.dates[-1] if len(self) else None
+        )
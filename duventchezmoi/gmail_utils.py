@@ -4,7 +4,15 @@
 # standard library
 import argparse
 import base64
+import functools
+import gzip
+import io
+import shutil
+import tempfile
+import time
+import uuid
 from email import encoders
+from email.generator import BytesGenerator
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
@@ -16,8 +24,12 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload
 
 SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]
+BATCH_SIZE = 50  # maximum number of messages per batch request
+MAX_ATTACHMENT_SIZE = 10000000  # larger attachments are sent with a resumable upload, in bytes
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # size of uploaded chunks, multiple of 256 KB
 
 
 def total_size(files_list):
@@ -66,6 +78,89 @@ def authenticate_google_oauth2(credentials_file, token_file):
     return credentials
 
 
+@functools.lru_cache(maxsize=1)
+def get_gmail_service(credentials):
+    """Build Gmail API service, reused as long as the same credentials are given.
+
+    Parameters
+    ----------
+    credentials : Credentials
+
+    Returns
+    -------
+    googleapiclient.discovery.Resource
+    """
+    return build("gmail", "v1", credentials=credentials, cache_discovery=False)
+
+
+def create_attachment_part(attachment):
+    """Create MIME part of an attachment, encoded in base64.
+
+    Parameters
+    ----------
+    attachment : Path
+
+    Returns
+    -------
+    MIMEBase
+    """
+
+    part = MIMEBase("application", "octet-stream")
+    part.set_payload(attachment.read_bytes())  # reading report file in attachment
+    encoders.encode_base64(part)  # encoding attachment in Base64, replacing raw bytes
+    part.add_header("Content-Disposition", "piece; filename= {}".format(attachment.name))
+    return part
+
+
+def create_message(subject, contents, recipients, cc=[], bcc=[], attachments=[]):
+    """Create email message, encoded for Gmail API.
+
+    Parameters
+    ----------
+    subject : str
+    contents : str
+    recipients : [str, ...]
+    cc : [str, ...]
+    bcc : [str, ...]
+    attachments [Path, ...]
+        list of files to attach
+
+    Returns
+    -------
+    dict
+        {"raw": str}, message encoded in base64
+    """
+
+    # create message
+    message = MIMEMultipart()
+
+    # adding subject, recipients, CC, and BCC
+    message["Subject"] = subject
+    message["To"] = ",".join(recipients)
+    message["CC"] = ",".join(cc)
+    message["BCC"] = ",".join(bcc)
+
+    # add attachments
+    attachment_size = total_size(attachments)
+    if attachment_size > MAX_ATTACHMENT_SIZE:  # case of oversize attachment, see send_large_mail
+        contents += "\nOversized attachment."
+    else:
+        for attachment in attachments:
+            message.attach(create_attachment_part(attachment))
+
+    # add contents
+    message.attach(MIMEText(contents.encode("utf-8"), "plain", "utf-8"))
+
+    # serialize message to a buffer, encoded without copying it to an intermediate bytes object,
+    # the message being the only reference to attachment payloads, released before encoding
+    with io.BytesIO() as buffer:
+        BytesGenerator(buffer).flatten(message)
+        del message
+        encoded_message = base64.urlsafe_b64encode(buffer.getbuffer()).decode("ascii")
+
+    return {"raw": encoded_message}
+
+
 def send_mail(
     subject, contents, credentials, sender, recipients, cc=[], bcc=[], attachments=[], logger=None
 ):
@@ -85,51 +180,237 @@ def send_mail(
     logger : logging.Logger or None
     """
 
+    # large attachments are sent with a resumable upload
+    if total_size(attachments) > MAX_ATTACHMENT_SIZE:
+        send_large_mail(
+            subject, contents, credentials, sender, recipients, cc, bcc, attachments, logger=logger
+        )
+        return
+
     try:
 
         # create message
-        message = MIMEMultipart()
-
-        # adding subject, recipients, CC, and BCC
-        message["Subject"] = subject
-        message["To"] = ",".join(recipients)
-        message["CC"] = ",".join(cc)
-        message["BCC"] = ",".join(bcc)
-
-        # add attachments
-        attachment_size = total_size(attachments)
-        if attachment_size > 10000000:  # case of oversize attachment
-            contents += "\nOversized attachment."
-        else:
-            for attachment in attachments:
-                piece = open(attachment, "rb")  # opening report file
-                part = MIMEBase("application", "octet-stream")  # encoding attachment in Base64
-                part.set_payload((piece).read())  # reading report file in attachment
-                encoders.encode_base64(part)  # encoding attachment in Base64
-                part.add_header(
-                    "Content-Disposition", "piece; filename= {}".format(attachment.name)
-                )
-                message.attach(part)
-
-        # add contents
-        message.attach(MIMEText(contents.encode("utf-8"), "plain", "utf-8"))
-
-        # encode message
-        encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
+        message = create_message(subject, contents, recipients, cc, bcc, attachments)
 
         # send message
-        create_message = {"raw": encoded_message}
-        gmail_service = build("gmail", "v1", credentials=credentials, cache_discovery=False)
-        gmail_service.users().messages().send(userId="me", body=create_message).execute()
+        gmail_service = get_gmail_service(credentials)
+        gmail_service.users().messages().send(userId="me", body=message).execute()
+
+        if logger is not None:
+            logger.info("Sent email with subject '{}' to {}".format(subject, recipients + cc + bcc))
+
+    except HttpError as error:
+
+        if logger is not None:
+            logger.error(f"An error occurred when sending email: {error}")
+
+
+def send_mails(messages, credentials, logger=None):
+    """Send several emails using Gmail API, grouped in batch requests.
+
+    Parameters
+    ----------
+    messages : [dict, ...]
+        as returned by create_message
+    credentials : Credentials
+    logger : logging.Logger or None
+
+    Returns
+    -------
+    results : [dict, ...]
+        for each message:
+        {"success": bool, "latency": float (seconds), "error": str or None}
+    """
+
+    gmail_service = get_gmail_service(credentials)
+    results = [None] * len(messages)
+
+    for batch_start in range(0, len(messages), BATCH_SIZE):
+
+        start_time = time.perf_counter()
+
+        def callback(request_id, response, exception):
+
+            # record result of each message, as soon as its response is parsed
+            i = int(request_id)
+            results[i] = {
+                "success": exception is None,
+                "latency": time.perf_counter() - start_time,
+                "error": None if exception is None else str(exception),
+            }
+
+            if logger is not None:
+                if exception is None:
+                    logger.info("Sent email {} of batch".format(i))
+                else:
+                    logger.error("An error occurred when sending email {}: {}".format(i, exception))
+
+        # group messages in a single HTTP request
+        batch = gmail_service.new_batch_http_request(callback=callback)
+        for i in range(batch_start, min(batch_start + BATCH_SIZE, len(messages))):
+            batch.add(
+                gmail_service.users().messages().send(userId="me", body=messages[i]),
+                request_id=str(i),
+            )
+
+        try:
+            batch.execute()
+        except HttpError as error:
+
+            # whole batch failed
+            for i in range(batch_start, min(batch_start + BATCH_SIZE, len(messages))):
+                if results[i] is None:
+                    results[i] = {
+                        "success": False,
+                        "latency": time.perf_counter() - start_time,
+                        "error": str(error),
+                    }
+
+            if logger is not None:
+                logger.error(f"An error occurred when sending emails: {error}")
+
+    return results
+
+
+def compress_file(input_file, output_dir):
+    """Compress given file with gzip, streaming it from disk.
+
+    Parameters
+    ----------
+    input_file : Path
+    output_dir : Path
+
+    Returns
+    -------
+    output_file : Path
+    """
+
+    output_file = Path(output_dir) / (input_file.name + ".gz")
+    with open(input_file, "rb") as f_in, gzip.open(output_file, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out, UPLOAD_CHUNK_SIZE)
+
+    return output_file
+
+
+def write_message(output_file, subject, contents, recipients, cc=[], bcc=[], attachments=[]):
+    """Write email message to file, attachments being encoded in base64 while streamed from disk.
+
+    Parameters
+    ----------
+    output_file : Path
+    subject : str
+    contents : str
+    recipients : [str, ...]
+    cc : [str, ...]
+    bcc : [str, ...]
+    attachments [Path, ...]
+        list of files to attach
+    """
+
+    # create message, with a placeholder instead of the contents of each attachment
+    message = MIMEMultipart()
+    message["Subject"] = subject
+    message["To"] = ",".join(recipients)
+    message["CC"] = ",".join(cc)
+    message["BCC"] = ",".join(bcc)
+    placeholders = []
+    for attachment in attachments:
+        placeholders.append("attachment-{}".format(uuid.uuid4().hex).encode("ascii"))
+        part = MIMEBase("application", "octet-stream")
+        part.set_payload(placeholders[-1].decode("ascii"))
+        part["Content-Transfer-Encoding"] = "base64"
+        part.add_header("Content-Disposition", "piece; filename= {}".format(attachment.name))
+        message.attach(part)
+    message.attach(MIMEText(contents.encode("utf-8"), "plain", "utf-8"))
+
+    # serialize message, streaming attachments in place of placeholders
+    skeleton = message.as_bytes()
+    with open(output_file, "wb") as f:
+        for placeholder, attachment in zip(placeholders, attachments):
+            head, skeleton = skeleton.split(placeholder, 1)
+            f.write(head)
+            with open(attachment, "rb") as f_attachment:
+                base64.encode(f_attachment, f)
+        f.write(skeleton)
+
+
+def send_large_mail(
+    subject,
+    contents,
+    credentials,
+    sender,
+    recipients,
+    cc=[],
+    bcc=[],
+    attachments=[],
+    compress=False,
+    logger=None,
+):
+    """Send email with large attachments using Gmail API resumable upload.
+
+    The message is written to a temporary file and uploaded in chunks, so that attachments are
+    never fully loaded in memory.
+
+    Parameters
+    ----------
+    subject : str
+    contents : str
+    credentials : Credentials
+    sender : str
+    recipients : [str, ...]
+    cc : [str, ...]
+    bcc : [str, ...]
+    attachments [Path, ...]
+        list of files to attach
+    compress : boolean
+        if True, attachments are compressed with gzip before being sent
+    logger : logging.Logger or None
+
+    Returns
+    -------
+    result : dict
+        {"success": bool, "latency": float (seconds), "error": str or None}
+    """
+
+    start_time = time.perf_counter()
+
+    try:
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+
+            # compress attachments
+            if compress:
+                attachments = [compress_file(attachment, temp_dir) for attachment in attachments]
+
+            # write message to file
+            message_file = Path(temp_dir) / "message.eml"
+            write_message(message_file, subject, contents, recipients, cc, bcc, attachments)
+
+            # upload message in chunks
+            media = MediaFileUpload(
+                str(message_file),
+                mimetype="message/rfc822",
+                chunksize=UPLOAD_CHUNK_SIZE,
+                resumable=True,
+            )
+            gmail_service = get_gmail_service(credentials)
+            request = gmail_service.users().messages().send(userId="me", body={}, media_body=media)
+            response = None
+            while response is None:
+                _, response = request.next_chunk()
 
         if logger is not None:
             logger.info("Sent email with subject '{}' to {}".format(subject, recipients + cc + bcc))
 
+        return {"success": True, "latency": time.perf_counter() - start_time, "error": None}
+
     except HttpError as error:
 
         if logger is not None:
             logger.error(f"An error occurred when sending email: {error}")
 
+        return {"success": False, "latency": time.perf_counter() - start_time, "error": str(error)}
+
 
 if __name__ == "__main__":
 
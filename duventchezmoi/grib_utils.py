@@ -0,0 +1,205 @@
+"""
+GRIB2 decoding module for Duventchezmoi.
+"""
+
+# standard library
+import concurrent.futures
+import datetime
+import math
+
+# third party
+import numpy as np
+
+WIND_COMPONENTS = ("U component of wind", "V component of wind")
+
+
+def find_wind_messages(grbs):
+    """Find message numbers of U and V wind components in an open GRIB2 file.
+
+    Parameters
+    ----------
+    grbs : pygrib.open
+
+    Returns
+    -------
+    message_numbers : (int, int)
+    """
+
+    message_numbers = {}
+    grbs.seek(0)
+    for grb in grbs:
+        if grb.name in WIND_COMPONENTS and grb.name not in message_numbers:
+            message_numbers[grb.name] = grb.messagenumber
+
+    return tuple(message_numbers[name] for name in WIND_COMPONENTS)
+
+
+def read_wind_components(grib2_file, message_numbers=None):
+    """Read U and V wind components from a GRIB2 file.
+
+    Parameters
+    ----------
+    grib2_file : Path
+    message_numbers : (int, int) or None
+        message numbers of U and V components, found by scanning the file if None or if they do
+        not match the file contents
+
+    Returns
+    -------
+    u : np.ndarray
+    v : np.ndarray
+    message_numbers : (int, int)
+    grb : pygrib.gribmessage
+        U component message, to access grid metadata
+    """
+
+    # third party
+    import pygrib
+
+    with pygrib.open(str(grib2_file)) as grbs:
+
+        # try cached message numbers first
+        grb_pair = None
+        if message_numbers is not None:
+            try:
+                grb_pair = [grbs.message(number) for number in message_numbers]
+            except (OSError, ValueError, RuntimeError):
+                grb_pair = None
+            if grb_pair is not None and tuple(g.name for g in grb_pair) != WIND_COMPONENTS:
+                grb_pair = None
+
+        # scan file otherwise
+        if grb_pair is None:
+            message_numbers = find_wind_messages(grbs)
+            grb_pair = [grbs.message(number) for number in message_numbers]
+
+        u_grb, v_grb = grb_pair
+        u, v = u_grb.values, v_grb.values
+
+    return u, v, message_numbers, u_grb
+
+
+def load_wind_cube(grib2_files):
+    """Decode hourly GRIB2 files into stacked wind components.
+
+    Message numbers found in the first file are reused for the following ones.
+
+    Parameters
+    ----------
+    grib2_files : [Path, ...]
+        named after forecast date, as YYYYmmdd_HHMM.grib2
+
+    Returns
+    -------
+    dates : [datetime object, ...]
+    u : np.ndarray
+        shape (time, lat, lon)
+    v : np.ndarray
+        shape (time, lat, lon)
+    lats : np.ndarray or None
+        grid latitudes, 1D, None if no files given
+    lons : np.ndarray or None
+        grid longitudes, 1D, None if no files given
+    """
+
+    grib2_files = list(grib2_files)
+    dates = [datetime.datetime.strptime(f.stem, "%Y%m%d_%H%M") for f in grib2_files]
+
+    if len(grib2_files) == 0:
+        return dates, np.empty((0, 0, 0)), np.empty((0, 0, 0)), None, None
+
+    message_numbers = None
+    u_cube = v_cube = lats = lons = None
+    for i, grib2_file in enumerate(grib2_files):
+
+        u, v, message_numbers, grb = read_wind_components(grib2_file, message_numbers)
+
+        # allocate cube and read grid from first file
+        if u_cube is None:
+            u_cube = np.empty((len(grib2_files),) + u.shape, dtype=u.dtype)
+            v_cube = np.empty((len(grib2_files),) + v.shape, dtype=v.dtype)
+            grid_lats, grid_lons = grb.latlons()
+            lats, lons = grid_lats[:, 0], grid_lons[0, :]
+
+        u_cube[i] = u
+        v_cube[i] = v
+
+    return dates, u_cube, v_cube, lats, lons
+
+
+def compute_wind_speed(u, v, units):
+    """Compute wind speed from U and V velocities.
+
+    Parameters
+    ----------
+    u : np.ndarray
+    v : np.ndarray
+        in m/s
+    units : str
+        either m/s or km/h
+
+    Returns
+    -------
+    np.ndarray
+    """
+
+    return convert_units(np.hypot(u, v), units)
+
+
+def convert_units(wind_speed, units):
+    """Convert wind speed from m/s to given units.
+
+    Parameters
+    ----------
+    wind_speed : np.ndarray or float
+        in m/s
+    units : str
+        either m/s or km/h
+
+    Returns
+    -------
+    np.ndarray or float
+    """
+
+    if units.lower() == "km/h":
+        return wind_speed * 3.6
+
+    return wind_speed
+
+
+def map_files(function, grib2_files, workers=1, chunksize=0):
+    """Apply function to chunks of files, spread across a process pool.
+
+    Parameters
+    ----------
+    function : callable
+        picklable, takes a list of files and returns an array with one row per file
+    grib2_files : [Path, ...]
+    workers : int
+        number of processes, files are processed in the current process if 1
+    chunksize : int
+        number of files per chunk, if 0 files are split in 4 chunks per worker
+
+    Returns
+    -------
+    np.ndarray
+        rows of all chunks, in the order of given files
+    """
+
+    grib2_files = list(grib2_files)
+    if workers <= 1 or len(grib2_files) <= 1:
+        return np.asarray(function(grib2_files))
+
+    # split files into chunks
+    if chunksize <= 0:
+        chunksize = math.ceil(len(grib2_files) / (workers * 4))
+    chunks = []
+    for start in range(0, len(grib2_files), chunksize):
+        end = start + chunksize
+        chunks.append(grib2_files[start:end])
+
+    # process chunks in parallel, results are returned in submission order
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(function, chunks))
+
+    return np.concatenate([np.asarray(result) for result in results])
@@ -3,24 +3,70 @@ Duventchezmoi main script.
 """
 
 # standard library
+import argparse
 import configparser
 import datetime
-import math
+import functools
+import logging
 import shutil
-import sys
 from pathlib import Path
 
 # third party
-import matplotlib.dates as mdates
-import matplotlib.lines as mlines
-import matplotlib.pyplot as plt
 import numpy as np
-import pygrib
 
 # current project
+from duventchezmoi.alert_state import PEAK_HOURS
+from duventchezmoi.alert_state import PEAK_TOLERANCE
+from duventchezmoi.alert_state import compare_fingerprints
+from duventchezmoi.alert_state import compute_fingerprint
+from duventchezmoi.alert_state import is_notified
+from duventchezmoi.alert_state import read_alert_state
+from duventchezmoi.alert_state import write_alert_state
+from duventchezmoi.archive_index import INDEX_FILENAME
+from duventchezmoi.archive_index import get_wind_speed
+from duventchezmoi.archive_index import site_key
+from duventchezmoi.archive_store import compact_archive
+from duventchezmoi.archive_store import get_store_file
+from duventchezmoi.archive_store import read_store
+from duventchezmoi.download_cache import DownloadCache
+from duventchezmoi.download_gfs import GFS_BASE_URL
+from duventchezmoi.download_gfs import GFS_MAX_FORECAST_HOURS
+from duventchezmoi.download_gfs import GFS_REQUEST_RATE
+from duventchezmoi.download_gfs import MAX_RETRIES
+from duventchezmoi.download_gfs import REQUEST_TIMEOUT
+from duventchezmoi.download_gfs import create_forecast_hours
 from duventchezmoi.download_gfs import download_gfs
-from duventchezmoi.gmail_utils import authenticate_google_oauth2
-from duventchezmoi.gmail_utils import send_mail
+from duventchezmoi.download_gfs import find_latest_run
+from duventchezmoi.download_gfs import get_run_name
+from duventchezmoi.download_gfs import read_last_run
+from duventchezmoi.download_gfs import write_last_run
+from duventchezmoi.forecast_series import ForecastSeries
+from duventchezmoi.forecast_series import compute_time_weights
+from duventchezmoi.forecast_series import parse_dates
+from duventchezmoi.grib_utils import compute_wind_speed
+from duventchezmoi.grib_utils import convert_units
+from duventchezmoi.grib_utils import load_wind_cube
+from duventchezmoi.grib_utils import map_files
+from duventchezmoi.grib_utils import read_wind_components
+from duventchezmoi.metrics import Metrics
+from duventchezmoi.rules import SITE_RULE
+from duventchezmoi.rules import compile_rules
+from duventchezmoi.rules import describe_rule
+from duventchezmoi.rules import evaluate_rules
+from duventchezmoi.rules import read_rules
+from duventchezmoi.sites import compute_extent
+from duventchezmoi.sites import extract_site_values
+from duventchezmoi.sites import read_sites
+from duventchezmoi.sites import read_statistic
+
+STATE_FILENAME = "state.json"
+METRICS_FILENAME = "metrics.json"
+CACHE_SIZE = 1000.0  # default size budget of the download cache, in MB
+AGGREGATION_DAYS = 31  # reports of longer series are aggregated by day
+
+logger = logging.getLogger(__name__)
+
+_credentials = None  # Gmail API credentials, kept between runs of a long-running process
 
 
 def send_report(
@@ -45,109 +91,376 @@ def send_report(
     units : str
     """
 
-    subject = "Wind speed alert from Duventchezmoi"
+    send_reports(
+        [
+            {
+                "recipients": recipients,
+                "report_file": report_file,
+                "lat": lat,
+                "lon": lon,
+                "threshold": threshold,
+            }
+        ],
+        sender,
+        units,
+    )
+
+
+def format_horizon(hours):
+    """Format forecast horizon, in days when it is a whole number of days.
+
+    Parameters
+    ----------
+    hours : int
+
+    Returns
+    -------
+    str
+    """
+
+    if hours % 24 == 0 and hours > 0:
+        days = hours // 24
+        return "{} day{}".format(days, "s" if days > 1 else "")
+    return "{} hour{}".format(hours, "s" if hours > 1 else "")
+
+
+def send_reports(reports, sender, units, compress=False, horizon=GFS_MAX_FORECAST_HOURS):
+    """Send several reports via email, in a single batch request.
+
+    Reports too large to fit in a batch request are sent separately, with a resumable upload.
+
+    Parameters
+    ----------
+    reports : [dict, ...]
+        contains for each report:
+        {"recipients": [str, ...], "report_file": Path or None, "lat": float, "lon": float,
+        "threshold": float}, and optionally "rule": str, the description of the alert rule,
+        reports without file announcing that a previously reported alert is no longer forecast
+    sender : str
+    units : str
+    compress : boolean
+        if True, reports sent with a resumable upload are compressed with gzip
+    horizon : int
+        last forecast hour of the reports
+
+    Returns
+    -------
+    results : [dict, ...]
+        sending result of each report, see gmail_utils.send_mails
+    """
+
+    # current project
+    from duventchezmoi.gmail_utils import MAX_ATTACHMENT_SIZE
+    from duventchezmoi.gmail_utils import create_message
+    from duventchezmoi.gmail_utils import send_large_mail
+    from duventchezmoi.gmail_utils import send_mails
+
+    results = [None] * len(reports)
+    messages = []
+    batched_indices = []
+    for i, report in enumerate(reports):
+
+        is_all_clear = report["report_file"] is None
+        if is_all_clear:
+            subject = "Wind speed all-clear from Duventchezmoi"
+        else:
+            subject = "Wind speed alert from Duventchezmoi"
+
+        contents = ""
+        contents += "Hi,\n\n"
+        if is_all_clear:
+            contents += "An alert is no longer triggered for the following monitoring "
+            contents += "configuration:\n"
+        else:
+            contents += "An alert was triggered for the following monitoring configuration:\n"
+        contents += "Latitude, longitude (decimal degrees): {:5.2f}, {:5.2f}\n".format(
+            report["lat"], report["lon"]
+        )
+        contents += "Threshold ({}): {:5.2f}\n".format(units, report["threshold"])
+        if report.get("rule"):
+            contents += "Alert rule: {}\n".format(report["rule"])
+        contents += "\n"
+        contents += "Wind speed forecast from the GFS model in the next {} ".format(
+            format_horizon(horizon)
+        )
+        if is_all_clear:
+            contents += "no longer shows values triggering the alert previously reported "
+            contents += "over the monitoring coordinates.\n\n"
+        else:
+            contents += "showed values higher than the given threshold "
+            contents += "over the monitoring coordinates.\n"
+            contents += "See the report in attachment for more details.\n\n"
+        contents += "This is an automatic email sent by the Duventchezmoi application."
+        attachments = [] if is_all_clear else [report["report_file"]]
+
+        # send large reports separately
+        if not is_all_clear and report["report_file"].stat().st_size > MAX_ATTACHMENT_SIZE:
+            results[i] = send_large_mail(
+                subject,
+                contents,
+                get_credentials(),
+                sender,
+                report["recipients"],
+                attachments=attachments,
+                compress=compress,
+                logger=logger,
+            )
+            continue
+
+        messages.append(
+            create_message(subject, contents, report["recipients"], attachments=attachments)
+        )
+        batched_indices.append(i)
+
+    # send other reports in batch
+    if len(messages) > 0:
+        for i, result in zip(batched_indices, send_mails(messages, get_credentials(), logger)):
+            results[i] = result
+
+    return results
+
+
+def send_early_alert(
+    recipients,
+    sender,
+    lat,
+    lon,
+    threshold,
+    units,
+    date_obj,
+    wind_speed,
+):
+    """Send early alert via email, before the full forecast is processed.
+
+    Parameters
+    ----------
+    recipients : [str, ...]
+    sender : str
+    lat : float
+    lon : float
+    threshold : float
+    units : str
+    date_obj : datetime object
+        forecast date surpassing threshold
+    wind_speed : float
+    """
+
+    subject = "Early wind speed alert from Duventchezmoi"
 
     contents = ""
     contents += "Hi,\n\n"
-    contents += "An alert was triggered for the following monitoring configuration:\n"
+    contents += "An early alert was triggered for the following monitoring configuration:\n"
     contents += "Latitude, longitude (decimal degrees): {:5.2f}, {:5.2f}\n".format(lat, lon)
     contents += "Threshold ({}): {:5.2f}\n\n".format(units, threshold)
-    contents += "Wind speed forecast from the GFS model in the next 16 days "
-    contents += "showed values higher than the given threshold over the monitoring coordinates.\n"
-    contents += "See the report in attachment for more details.\n\n"
+    contents += "Wind speed forecast from the GFS model reaches {:5.2f} {} on {}.\n".format(
+        wind_speed, units, date_obj.strftime("%Y-%m-%d %H:%M")
+    )
+    contents += "The full report will follow once the whole forecast is processed.\n\n"
     contents += "This is an automatic email sent by the Duventchezmoi application."
 
-    project_path = Path(__file__).resolve().parents[1]
-    credentials = authenticate_google_oauth2(
-        project_path / "config" / "gmail_credentials.json",
-        project_path / "config" / "gmail_token.json",
-    )
+    # current project
+    from duventchezmoi.gmail_utils import send_mail
 
-    send_mail(
-        subject,
-        contents,
-        credentials,
-        sender,
-        recipients,
-        attachments=[report_file],
+    send_mail(subject, contents, get_credentials(), sender, recipients)
+
+
+def get_credentials():
+    """Get Gmail API credentials stored in project config directory.
+
+    Credentials are kept in memory, and only read again from disk once expired.
+
+    Returns
+    -------
+    credentials : Credentials
+    """
+
+    # current project
+    from duventchezmoi.gmail_utils import authenticate_google_oauth2
+
+    global _credentials
+
+    if _credentials is None or not _credentials.valid:
+        project_path = Path(__file__).resolve().parents[1]
+        _credentials = authenticate_google_oauth2(
+            project_path / "config" / "gmail_credentials.json",
+            project_path / "config" / "gmail_token.json",
+        )
+
+    return _credentials
+
+
+def aggregate_daily(dates, values, alerts):
+    """Aggregate values by day.
+
+    Values are weighted by the time they stand for, half the interval to their neighbours, up to
+    the GFS output interval, so that days mixing hourly and 3-hourly forecasts are not biased
+    toward hourly values. Days without values are kept as NaN, so that plots are not interpolated
+    over missing days.
+
+    Parameters
+    ----------
+    dates : np.ndarray
+        datetime64, sorted
+    values : np.ndarray
+    alerts : np.ndarray
+        boolean
+
+    Returns
+    -------
+    days : np.ndarray
+        datetime64[D], every day from the first to the last date
+    daily_min : np.ndarray
+    daily_max : np.ndarray
+    daily_mean : np.ndarray
+    daily_alert : np.ndarray
+        boolean
+    """
+
+    # group values by day
+    days, starts, indices = np.unique(
+        dates.astype("datetime64[D]"), return_index=True, return_inverse=True
     )
+    counts = np.diff(np.append(starts, len(values)))
+
+    # weights of values, falling back to plain means for isolated values
+    weights = compute_time_weights(dates)
+    weight_sums = np.add.reduceat(weights, starts)
+    weights = np.where(weight_sums[indices] > 0, weights, 1.0)
+    weight_sums = np.where(weight_sums > 0, weight_sums, counts)
+
+    # aggregate values of each day, placed on the whole range of days
+    all_days = np.arange(days[0], days[-1] + np.timedelta64(1, "D"))
+    positions = (days - days[0]).astype(int)
+    daily_min, daily_max, daily_mean = np.full((3, len(all_days)), np.nan)
+    daily_alert = np.zeros(len(all_days), dtype=bool)
+    daily_min[positions] = np.minimum.reduceat(values, starts)
+    daily_max[positions] = np.maximum.reduceat(values, starts)
+    daily_mean[positions] = np.add.reduceat(values * weights, starts) / weight_sums
+    daily_alert[positions] = np.logical_or.reduceat(alerts, starts)
 
+    return all_days, daily_min, daily_max, daily_mean, daily_alert
 
-def write_report(data, threshold, units, file_name=None):
+
+def write_report(series, threshold, units, file_name=None, aggregate=None):
     """Write alert report displaying wind speed values.
 
+    Long series are aggregated by day, displaying the daily range and mean, and the days with
+    values above threshold, so that rendering time and file size do not grow with the series.
+
     Parameters
     ----------
-    data : [dict, ...]
-        contains for each row:
+    series : ForecastSeries or [dict, ...]
+        or list of rows, containing for each row:
         {"date_str": str, "date_obj": datetime object, "wind_speed": float, "alert": bool}
     threshold : float
     units : str
     file_name : Path or None
         if None, the plot will be displayed and not saved to a file
+        output format is given by file extension, either pdf, png or svg
+    aggregate : boolean or None
+        if None, series spanning more than AGGREGATION_DAYS are aggregated by day
     """
 
-    # preparing data
-    dates = [row["date_obj"] for row in data]
-    values = [row["wind_speed"] for row in data]
-    points_color = []
-    for row in data:
-        if row["alert"]:
-            points_color.append("red")
-        else:
-            points_color.append("black")
-
-    # creating figure
-    plt.figure(figsize=[8.8, 4.8])
-    plt.scatter(dates, values, c=points_color, marker="+")  # plotting values
-    plt.plot(
-        dates,
-        [threshold for i in data],
-        c="black",
-        linewidth=0.5,
-    )  # plotting threshold
-
-    # format dates axis
-    plt.gca().xaxis.set_ticks([d for d in dates if d.hour == 0])
-    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m-%d"))
+    # third party
+    import matplotlib.dates as mdates
+    import matplotlib.lines as mlines
+    import matplotlib.patches as mpatches
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    # preparing data, sorted by date
+    if not isinstance(series, ForecastSeries):
+        series = ForecastSeries.from_records(series, threshold)
+    dates, values, alerts = series.dates, series.values.astype(float), series.alerts
+    if aggregate is None:
+        aggregate = len(dates) > 0 and dates[-1] - dates[0] > np.timedelta64(AGGREGATION_DAYS, "D")
+
+    # creating figure, with the non-interactive Agg backend when saving to a file
+    if file_name is None:
+
+        # third party
+        import matplotlib.pyplot as plt
+
+        fig = plt.figure(figsize=[8.8, 4.8])
+    else:
+        fig = Figure(figsize=[8.8, 4.8])
+        FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    if aggregate:
+
+        # aggregate values by day
+        days, daily_min, daily_max, daily_mean, daily_alert = aggregate_daily(dates, values, alerts)
+        days = (days + np.timedelta64(12, "h")).astype("datetime64[m]").astype(object)
+
+        # plotting daily range, mean, and maximum of days above threshold
+        ax.fill_between(days, daily_min, daily_max, color="lightgray", linewidth=0)
+        ax.plot(days, daily_mean, c="black", linewidth=0.8)
+        ax.plot(days[daily_alert], daily_max[daily_alert], "+", c="red")
+        handles = [
+            mpatches.Patch(color="lightgray", label="Daily GFS forecast range"),
+            mlines.Line2D([], [], color="black", linewidth=0.8, label="Daily GFS forecast mean"),
+            mlines.Line2D(
+                [],
+                [],
+                color="red",
+                marker="+",
+                linestyle="None",
+                label="Daily maximum above threshold",
+            ),
+        ]
+
+    else:
+
+        # plotting values
+        dates = dates.astype(object)
+        ax.plot(dates[~alerts], values[~alerts], "+", c="black")
+        ax.plot(dates[alerts], values[alerts], "+", c="red")
+        handles = [
+            mlines.Line2D(
+                [],
+                [],
+                color="black",
+                marker="+",
+                linestyle="None",
+                label="GFS forecast below threshold",
+            ),
+            mlines.Line2D(
+                [],
+                [],
+                color="red",
+                marker="+",
+                linestyle="None",
+                label="GFS forecast above threshold",
+            ),
+        ]
+
+    # plotting threshold
+    ax.axhline(threshold, c="black", linewidth=0.5)
+    handles.append(mlines.Line2D([], [], color="black", linewidth=0.5, label="Threshold"))
+
+    # format dates axis, with a number of ticks independent of the time span
+    locator = mdates.AutoDateLocator(maxticks=10)
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
 
     # adding labels
-    plt.xlabel("Dates")
-    plt.ylabel("Wind speed ({})".format(units))
-    plt.title("Mean surface wind speed forecast from GFS")
+    ax.set_xlabel("Dates")
+    ax.set_ylabel("Wind speed ({})".format(units))
+    ax.set_title("Mean surface wind speed forecast from GFS")
 
     # add legend
-    black_legend = mlines.Line2D(
-        [],
-        [],
-        color="black",
-        marker="+",
-        linestyle="None",
-        label="GFS forecast below threshold",
-    )
-    red_legend = mlines.Line2D(
-        [],
-        [],
-        color="red",
-        marker="+",
-        linestyle="None",
-        label="GFS forecast above threshold",
-    )
-    threshold_legend = mlines.Line2D([], [], color="black", linewidth=0.5, label="Threshold")
-    plt.legend(
-        handles=[black_legend, red_legend, threshold_legend],
-        loc="upper left",
-        bbox_to_anchor=(1.0, 1.0),
-    )
+    ax.legend(handles=handles, loc="upper left", bbox_to_anchor=(1.0, 1.0))
 
     # handle layout
-    plt.tight_layout()
+    fig.tight_layout()
 
     # saving file
     if file_name is None:
         plt.show()
     else:
-        plt.savefig(file_name, format="pdf")
+        file_format = Path(file_name).suffix.lstrip(".").lower() or "pdf"
+        fig.savefig(file_name, format=file_format)
 
 
 def compute_mean_wind_speed(grib2_file, units):
@@ -164,116 +477,431 @@ def compute_mean_wind_speed(grib2_file, units):
     float
     """
 
-    # open grib2 file
-    grbs = pygrib.open(str(grib2_file))
+    u, v, _, _ = read_wind_components(grib2_file)
+
+    # compute areal mean
+    return np.mean(compute_wind_speed(u, v, units))
 
-    # fetch datasets
-    u_grb = grbs.select(name="U component of wind")[0]
-    v_grb = grbs.select(name="V component of wind")[0]
 
-    # compute wind speed from U and V velocities
-    wind_speed = np.sqrt(u_grb.values**2 + v_grb.values**2)
+def compute_sites_wind_speed(grib2_file, sites, units, statistic=None):
+    """Compute wind speed over each monitoring site from GFS products.
+
+    Parameters
+    ----------
+    grib2_file : Path
+    sites : [dict, ...]
+    units : str
+        either m/s or km/h
+    statistic : dict or None
+        see sites.read_statistic, mean over the grid cell if None
+
+    Returns
+    -------
+    np.ndarray
+        statistic of wind speed over the grid cell containing each site
+    """
+
+    _, sites_wind_speed = compute_sites_wind_speed_series([grib2_file], sites, units, statistic)
+
+    return sites_wind_speed[0]
 
-    # compute areal mean
-    mean_wind_speed = np.mean(wind_speed)
 
-    # units conversion
-    if units.lower() == "km/h":
-        mean_wind_speed *= 3.6
+def compute_sites_wind_speed_series(grib2_files, sites, units, statistic=None):
+    """Compute wind speed series over each monitoring site from hourly GFS products.
 
-    return mean_wind_speed
+    All files are decoded into a single cube, and wind speed is computed for all dates and sites
+    at once.
+
+    Parameters
+    ----------
+    grib2_files : [Path, ...]
+    sites : [dict, ...]
+    units : str
+        either m/s or km/h
+    statistic : dict or None
+        see sites.read_statistic, mean over the grid cell if None
+
+    Returns
+    -------
+    dates : [datetime object, ...]
+    np.ndarray
+        statistic of wind speed over the grid cell containing each site, shape (time, site)
+    """
+
+    dates, u, v, lats, lons = load_wind_cube(grib2_files)
+    if lats is None:
+        return dates, np.empty((0, len(sites)))
+
+    wind_speed = compute_wind_speed(u, v, units)
+    return dates, extract_site_values(wind_speed, lats, lons, sites, statistic)
+
+
+def compute_sites_wind_speed_values(grib2_files, sites, units, statistic=None):
+    """Compute wind speed values over each monitoring site from hourly GFS products.
+
+    Picklable variant of compute_sites_wind_speed_series, without dates.
+
+    Parameters
+    ----------
+    grib2_files : [Path, ...]
+    sites : [dict, ...]
+    units : str
+        either m/s or km/h
+    statistic : dict or None
+        see sites.read_statistic, mean over the grid cell if None
+
+    Returns
+    -------
+    np.ndarray
+        shape (time, site)
+    """
+    return compute_sites_wind_speed_series(grib2_files, sites, units, statistic)[1]
 
 
-def duventchezmoi(config_path):
+def get_forecast_dates(run, forecast_hours):
+    """Get forecast dates of given run.
+
+    Parameters
+    ----------
+    run : (str, str)
+        run date (format YYYYmmdd) and cycle
+    forecast_hours : [int, ...]
+
+    Returns
+    -------
+    np.ndarray
+        datetime64[m]
+    """
+
+    run_date = np.datetime64("{}-{}-{}T{}".format(run[0][:4], run[0][4:6], run[0][6:], run[1]))
+    return (run_date + np.array(forecast_hours, dtype="timedelta64[h]")).astype("datetime64[m]")
+
+
+def write_metrics(metrics, config, data_path):
+    """Write metrics of a run, as configured in the [metrics] section.
+
+    Parameters
+    ----------
+    metrics : Metrics
+    config : configparser.ConfigParser
+    data_path : Path
+        JSON summary is written there if no summary file is configured
+    """
+
+    summary_file = config.get("metrics", "summary_file", fallback="")
+    textfile = config.get("metrics", "textfile", fallback="")
+
+    data_path.mkdir(parents=True, exist_ok=True)
+    metrics.write_json(Path(summary_file) if summary_file else data_path / METRICS_FILENAME)
+    if textfile:
+        metrics.write_prometheus(Path(textfile))
+
+
+def duventchezmoi(config_path, pool=None, site_names=None):
     """Duventchezmoi main function.
 
     Parameters
     ----------
     config_path : Path
+    pool : ConnectionPool or None
+        connections reused between runs, if None connections are opened for this run
+    site_names : [str, ...] or None
+        names of the sites to evaluate, if None all sites are evaluated, the forecast is
+        downloaded over all sites in any case
     """
 
     # read config
     config = configparser.ConfigParser()
     config.read(config_path)
-    lat = float(config["main"]["lat"])
-    lon = float(config["main"]["lon"])
-    threshold = float(config["main"]["threshold"])
     data_path = Path(config["main"]["data_path"]).resolve()
-    cleaning = config["main"]["cleaning"].lower() in ["true"]
+    cleaning = config["main"]["cleaning"].lower()
     units = config["main"]["units"]
-    recipients = config["mail"]["recipients"].split(",")
     sender = config["mail"]["sender"]
-
-    # create extent on 0.25 deg grid around given coordinates
-    extent = [
-        math.floor(lon * 4) / 4,  # smallest lon (W bound)
-        math.ceil(lat * 4) / 4,  # greatest lat (N bound)
-        math.ceil(lon * 4) / 4,  # greatest lon (E bound)
-        math.floor(lat * 4) / 4,  # smallest lat (S bound)
-    ]
+    max_workers = config.getint("download", "max_workers", fallback=1)
+    incremental = config.getboolean("download", "incremental", fallback=False)
+    latest_run = config.getboolean("download", "latest_run", fallback=False)
+    base_url = config.get("download", "base_url", fallback=GFS_BASE_URL)
+    request_rate = config.getfloat("download", "request_rate", fallback=GFS_REQUEST_RATE)
+    max_retries = config.getint("download", "max_retries", fallback=MAX_RETRIES)
+    timeout = config.getfloat("download", "timeout", fallback=REQUEST_TIMEOUT)
+    cache_path = config.get("download", "cache_path", fallback="")
+    cache_size = config.getfloat("download", "cache_size", fallback=CACHE_SIZE)
+    forecast_hours = create_forecast_hours(
+        config.getint("download", "horizon", fallback=GFS_MAX_FORECAST_HOURS),
+        config.getint("download", "step", fallback=1),
+    )
+    workers = config.getint("processing", "workers", fallback=1)
+    chunksize = config.getint("processing", "chunksize", fallback=0)
+    streaming = config.getboolean("processing", "streaming", fallback=False)
+    early_alert_hours = config.getint("mail", "early_alert_hours", fallback=0)
+    compress_reports = config.getboolean("mail", "compress_reports", fallback=False)
+    track_alerts = config.getboolean("mail", "track_alerts", fallback=True)
+    peak_tolerance = config.getfloat("mail", "peak_tolerance", fallback=PEAK_TOLERANCE)
+    peak_hours = config.getfloat("mail", "peak_hours", fallback=PEAK_HOURS)
+    sites = read_sites(config)
+    statistic = read_statistic(config)
+    rules = read_rules(config)
+    metrics = Metrics()
+
+    # create extent on 0.25 deg grid covering all sites
+    extent = compute_extent(sites, statistic["margin"])
+
+    # select sites to evaluate
+    if site_names is not None:
+        sites = [site for site in sites if site["name"] in site_names]
+    keys = [site_key(site, statistic) for site in sites]
+
+    # find run to process, exiting early if no new run was published since the last one
+    state_file = data_path / STATE_FILENAME
+    if latest_run:
+        data_path.mkdir(parents=True, exist_ok=True)
+        run = find_latest_run(
+            forecast_hours=forecast_hours[-1],
+            after=read_last_run(state_file, [site["name"] for site in sites]),
+            pool=pool,
+            base_url=base_url,
+            timeout=timeout,
+        )
+        if run is None:
+            write_metrics(metrics, config, data_path)
+            return
+    else:
+        run = (datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d"), "00")
 
     # creating download directory
-    today_str = datetime.datetime.now().strftime("%Y%m%d")
-    todays_data_path = data_path / today_str
-    if not todays_data_path.exists():
-        todays_data_path.mkdir(parents=True)
-
-    # download gfs data
-    try:
-        download_gfs(extent, todays_data_path)
-    except Exception:
-        sys.exit("Error in GFS data download")
-
-    # loop through all hourly forecast gfs files
-    data = []  # initiate list to store results for each forecast
-    is_alert_triggered = False  # initiate boolean to trigger alerts
-    for f in todays_data_path.iterdir():
-
-        # compute mean wind speed
-        wind_speed = compute_mean_wind_speed(f, units)
-
-        # compare value to threshold
-        is_threshold_surpassed = wind_speed > threshold
-        if is_threshold_surpassed:  # trigger alert
-            is_alert_triggered = True
-
-        # store results in list
-        data.append(
-            {
-                "date_str": f.stem,
-                "date_obj": datetime.datetime.strptime(f.stem, "%Y%m%d_%H%M"),
-                "wind_speed": wind_speed,
-                "alert": is_threshold_surpassed,
-            }
-        )
+    run_name = get_run_name(run)
+    run_data_path = data_path / run_name
+    run_store_file = get_store_file(run_data_path)
 
-    # if alert triggered
-    if is_alert_triggered:
-
-        # write report
-        report_filename = data_path / "{}.pdf".format(today_str)
-        write_report(data, threshold, units, report_filename)
-
-        # send report via email
-        send_report(
-            recipients,
-            sender,
-            report_filename,
-            lat,
-            lon,
-            threshold,
-            units,
-        )
+    # alerts previously notified, only material changes being reported again
+    notified_alerts = read_alert_state(state_file) if track_alerts else {}
+
+    # run was already downloaded and compacted, read it from the store, unless forecast hours are
+    # missing from it, such as a store compacted from an incomplete run
+    is_store_complete = False
+    if incremental and run_store_file.exists():
+        with metrics.stage("decode"):
+            dates, u, v, lats, lons = read_store(run_store_file)
+        is_store_complete = bool(np.isin(get_forecast_dates(run, forecast_hours), dates).all())
+
+    if is_store_complete:
+
+        with metrics.stage("decode"):
+            sites_wind_speed = extract_site_values(
+                compute_wind_speed(u, v, units), lats, lons, sites, statistic
+            )
+        is_run_complete = True
 
-    # clear data path
-    if cleaning:
+    else:
+
+        if not run_data_path.exists():
+            run_data_path.mkdir(parents=True)
+
+        def decode_files(files):
+            metrics.increment("decoded_files", len(files))
+            return map_files(
+                functools.partial(
+                    compute_sites_wind_speed_values, sites=sites, units="m/s", statistic=statistic
+                ),
+                files,
+                workers,
+                chunksize,
+            )
+
+        # evaluate each forecast hour as soon as it is downloaded, storing values in the index
+        early_alerted_sites = set()
+
+        def evaluate_forecast_hour(forecast_hours, grib2_file, result):
+
+            if not result["success"]:
+                return
+
+            # compute wind speed over all sites
+            with metrics.stage("decode"):
+                sites_wind_speed = get_wind_speed(
+                    data_path / INDEX_FILENAME, [grib2_file], keys, decode_files
+                )[0]
+            sites_wind_speed = convert_units(sites_wind_speed, units)
+
+            # send early alerts for exceedances in the first forecast hours, unless already
+            # notified by a previous run
+            if forecast_hours >= early_alert_hours:
+                return
+            date_obj = datetime.datetime.strptime(grib2_file.stem, "%Y%m%d_%H%M")
+            for site, wind_speed in zip(sites, sites_wind_speed):
+                previous = notified_alerts.get("{}/{}".format(site["name"], SITE_RULE))
+                if (
+                    wind_speed > site["threshold"]
+                    and site["name"] not in early_alerted_sites  # noqa W503
+                    and not is_notified(previous, np.datetime64(date_obj))  # noqa W503
+                ):
+                    early_alerted_sites.add(site["name"])
+                    send_early_alert(
+                        site["recipients"],
+                        sender,
+                        site["lat"],
+                        site["lon"],
+                        site["threshold"],
+                        units,
+                        date_obj,
+                        wind_speed,
+                    )
+
+        # download gfs data, forecast hours failing after all retries are left out of this run
+        results = download_gfs(
+            extent,
+            run_data_path,
+            max_workers=max_workers,
+            incremental=incremental,
+            callback=evaluate_forecast_hour if streaming else None,
+            run=run,
+            pool=pool,
+            base_url=base_url,
+            metrics=metrics,
+            request_rate=request_rate,
+            max_retries=max_retries,
+            timeout=timeout,
+            forecast_hours=forecast_hours,
+            cache=DownloadCache(cache_path, int(cache_size * 1e6)) if cache_path else None,
+        )
+        failed_hours = [hours for hours, result in results.items() if not result["success"]]
+        if len(failed_hours) > 0:
+            logger.warning(
+                "Failed to download {} forecast hours of run {}: {}".format(
+                    len(failed_hours), run_name, failed_hours
+                )
+            )
+
+        # compute wind speed over all sites, decoding only files missing from the index
+        grib2_files = sorted(run_data_path.glob("*.grib2"))
+        dates = parse_dates([f.stem for f in grib2_files])
+        with metrics.stage("decode"):
+            sites_wind_speed = get_wind_speed(
+                data_path / INDEX_FILENAME, grib2_files, keys, decode_files
+            )
+        sites_wind_speed = convert_units(sites_wind_speed, units)
+        is_run_complete = len(failed_hours) == 0
+
+    # evaluate all alert rules over all sites at once
+    compiled_rules = compile_rules(rules, sites)
+    alerts = evaluate_rules(compiled_rules, dates, sites_wind_speed)
+
+    reports = []
+    fingerprints = []
+    for j, site in enumerate(sites):
+        for i, rule in enumerate(rules):
+
+            # if alert triggered or cleared
+            alert_key = "{}/{}".format(site["name"], rule["name"])
+            fingerprint = compute_fingerprint(dates, sites_wind_speed[:, j], alerts[i, :, j])
+            change = compare_fingerprints(
+                notified_alerts.get(alert_key), fingerprint, peak_tolerance, peak_hours
+            )
+
+            # forecast hours missing from an incomplete run, such as all of them during an outage,
+            # do not clear nor change notified alerts
+            if change in ("all_clear", "changed") and not is_run_complete:
+                change = None
+            if change is None:
+                metrics.increment("unchanged_alerts", int(len(fingerprint["windows"]) > 0))
+                continue
+            value = compiled_rules["values"][i, j]
+            threshold = site["threshold"] if rule["kind"] == "rising" else value
+            report = {
+                "recipients": rule["recipients"] or site["recipients"],
+                "report_file": None,
+                "lat": site["lat"],
+                "lon": site["lon"],
+                "threshold": threshold,
+                "rule": describe_rule(rule, value, units),
+            }
+            reports.append(report)
+            fingerprints.append((alert_key, fingerprint))
+            if change == "all_clear":
+                continue
+
+            # forecast series of the site, with alerts of the rule
+            series = ForecastSeries(dates, sites_wind_speed[:, j], threshold, alerts[i, :, j])
+
+            # write report, plotting the threshold of the site for rising rules
+            report_name = (
+                run_name if site["name"] == "main" else "{}_{}".format(run_name, site["name"])
+            )
+            if rule["name"] != SITE_RULE:
+                report_name += "_{}".format(rule["name"])
+            report_filename = data_path / "{}.pdf".format(report_name)
+            with metrics.stage("report"):
+                write_report(series, threshold, units, report_filename)
+            metrics.increment("report_bytes", report_filename.stat().st_size)
+            report["report_file"] = report_filename
+
+    # send all reports via email at once
+    metrics.increment("reports", len(reports))
+    if len(reports) > 0:
+        with metrics.stage("mail"):
+            results = send_reports(
+                reports, sender, units, compress=compress_reports, horizon=forecast_hours[-1]
+            )
+        metrics.increment("failed_mails", sum(not r["success"] for r in results if r is not None))
+
+        # record alerts notified, failed ones being sent again at the next run
+        if track_alerts:
+            for (alert_key, fingerprint), result in zip(fingerprints, results):
+                if result is None or not result["success"]:
+                    continue
+                if len(fingerprint["windows"]) > 0:
+                    notified_alerts[alert_key] = fingerprint
+                else:
+                    notified_alerts.pop(alert_key, None)
+            write_alert_state(state_file, notified_alerts)
+
+    # record processed run, so that it is not processed again
+    if is_run_complete:
+        write_last_run(state_file, run, [site["name"] for site in sites])
+
+    # clear data path, keeping history in compact stores if required, incomplete runs being kept
+    # so that missing forecast hours are downloaded by the next run
+    if cleaning == "compact":
+        compact_archive(data_path, remove=True, exclude=() if is_run_complete else (run_name,))
+    elif cleaning == "true":
         for d in [di for di in data_path.iterdir() if di.is_dir()]:
             shutil.rmtree(d)
 
+    write_metrics(metrics, config, data_path)
 
-if __name__ == "__main__":
+
+def main():
+    """Command line entry point."""
 
     project_path = Path(__file__).resolve().parents[1]
-    config_path = project_path / "config" / "config.ini"
 
-    duventchezmoi(config_path)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-c",
+        "--config",
+        help="config file",
+        default=project_path / "config" / "config.ini",
+        type=Path,
+    )
+    parser.add_argument(
+        "--daemon",
+        help="keep running, and process new forecasts periodically",
+        action="store_true",
+    )
+    args = parser.parse_args()
+
+    if args.daemon:
+
+        # imported here as the scheduler depends on this module
+        # current project
+        from duventchezmoi.scheduler import run_daemon
+
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+        run_daemon(args.config)
+    else:
+        duventchezmoi(args.config)
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,165 @@
+"""
+Run metrics module for Duventchezmoi.
+
+Durations of pipeline stages, counters such as bytes downloaded or files decoded, and observed
+values such as request latencies are recorded during a run, and exported as a JSON summary and as a
+Prometheus file for the node_exporter textfile collector.
+"""
+
+# standard library
+import contextlib
+import json
+import threading
+import time
+
+# current project
+from duventchezmoi.file_utils import write_atomically
+
+PROMETHEUS_PREFIX = "duventchezmoi"
+
+
+class Metrics:
+    """Thread-safe recorder of the metrics of a run."""
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.stages = {}
+        self.counters = {}
+        self.observations = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Record duration of a pipeline stage, accumulated if the stage is run several times.
+
+        Parameters
+        ----------
+        name : str
+        """
+
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - start_time)
+
+    def record_stage(self, name, seconds):
+        """Record duration of a pipeline stage measured by the caller.
+
+        Parameters
+        ----------
+        name : str
+        seconds : float
+        """
+
+        with self._lock:
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "count": 0})
+            stage["seconds"] += seconds
+            stage["count"] += 1
+
+    def increment(self, name, value=1):
+        """Increment a counter.
+
+        Parameters
+        ----------
+        name : str
+        value : int or float
+        """
+
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        """Record an observed value, such as a request latency.
+
+        Parameters
+        ----------
+        name : str
+        value : float
+        """
+
+        with self._lock:
+            observation = self.observations.setdefault(name, {"count": 0, "sum": 0.0, "max": value})
+            observation["count"] += 1
+            observation["sum"] += value
+            observation["max"] = max(observation["max"], value)
+
+    def summary(self):
+        """Get summary of all metrics.
+
+        Returns
+        -------
+        dict
+            {"start_time": float (UNIX time), "seconds": float, "stages": {str: dict, ...},
+            "counters": {str: float, ...}, "observations": {str: dict, ...}}
+        """
+
+        with self._lock:
+            return {
+                "start_time": self.start_time,
+                "seconds": time.time() - self.start_time,
+                "stages": {name: dict(stage) for name, stage in self.stages.items()},
+                "counters": dict(self.counters),
+                "observations": {
+                    name: dict(observation) for name, observation in self.observations.items()
+                },
+            }
+
+    def write_json(self, output_file):
+        """Write summary of all metrics as JSON.
+
+        Parameters
+        ----------
+        output_file : Path
+        """
+
+        write_atomically(output_file, json.dumps(self.summary(), indent=2))
+
+    def write_prometheus(self, output_file):
+        """Write all metrics in Prometheus text format, for the node_exporter textfile collector.
+
+        Metrics describe the last run, and are exported as gauges.
+
+        Parameters
+        ----------
+        output_file : Path
+            named with a .prom extension
+        """
+
+        summary = self.summary()
+
+        lines = []
+
+        def add_gauge(name, help_text, samples):
+            lines.append("# HELP {}_{} {}".format(PROMETHEUS_PREFIX, name, help_text))
+            lines.append("# TYPE {}_{} gauge".format(PROMETHEUS_PREFIX, name))
+            for labels, value in samples:
+                lines.append("{}_{}{} {}".format(PROMETHEUS_PREFIX, name, labels, float(value)))
+
+        add_gauge(
+            "last_run_timestamp_seconds",
+            "Start time of the last run.",
+            [("", summary["start_time"])],
+        )
+        add_gauge(
+            "last_run_duration_seconds", "Duration of the last run.", [("", summary["seconds"])]
+        )
+        add_gauge(
+            "stage_duration_seconds",
+            "Duration of each stage of the last run.",
+            [
+                ('{{stage="{}"}}'.format(name), s["seconds"])
+                for name, s in summary["stages"].items()
+            ],
+        )
+        for name, value in sorted(summary["counters"].items()):
+            add_gauge(name, "Value of {} in the last run.".format(name), [("", value)])
+        for name, observation in sorted(summary["observations"].items()):
+            for statistic in ["count", "sum", "max"]:
+                add_gauge(
+                    "{}_{}".format(name, statistic),
+                    "{} of {} in the last run.".format(statistic.capitalize(), name),
+                    [("", observation[statistic])],
+                )
+
+        write_atomically(output_file, "\n".join(lines) + "\n")
@@ -5,69 +5,119 @@ Script to plot duventchezmoi data archive.
 # standard library
 import argparse
 import configparser
-import datetime
+import functools
 from pathlib import Path
 
+# third party
+import numpy as np
+
 # current project
-from duventchezmoi.main import compute_mean_wind_speed
+from duventchezmoi.archive_index import INDEX_FILENAME
+from duventchezmoi.archive_index import get_wind_speed
+from duventchezmoi.archive_index import site_key
+from duventchezmoi.archive_store import STORE_SUFFIX
+from duventchezmoi.archive_store import get_store_file
+from duventchezmoi.archive_store import read_store
+from duventchezmoi.forecast_series import ForecastSeries
+from duventchezmoi.forecast_series import parse_dates
+from duventchezmoi.grib_utils import compute_wind_speed
+from duventchezmoi.grib_utils import convert_units
+from duventchezmoi.grib_utils import map_files
+from duventchezmoi.main import compute_sites_wind_speed_values
 from duventchezmoi.main import write_report
+from duventchezmoi.sites import extract_site_values
+from duventchezmoi.sites import read_sites
+from duventchezmoi.sites import read_statistic
+
 
+def plot_archive(report_filename=None, config_path=None, site_name=None):
+    """Plot duventchezmoi data archive of a monitoring site.
 
-def plot_archive(report_filename=None):
-    """Plot duventchezmoi data archive.
+    Wind speed is computed with the statistic of the config, so that values indexed by the
+    pipeline are reused.
 
     Parameters
     ----------
     report_filename : Path or None
         if None, the plot will be displayed and not saved to a file
+    config_path : Path or None
+        if None, the config file of the project is used
+    site_name : str or None
+        name of the site to plot, if None the first site of the config
     """
 
-    # get project path
-    project_path = Path(__file__).resolve().parents[1]
+    # get config path
+    if config_path is None:
+        project_path = Path(__file__).resolve().parents[1]
+        config_path = project_path / "config" / "config.ini"
 
     # read config
     config = configparser.ConfigParser()
-    config.read(project_path / "config" / "config.ini")
-    threshold = float(config["main"]["threshold"])
-    data_path = Path(config["main"]["data_path"])
+    config.read(config_path)
+    data_path = Path(config["main"]["data_path"]).resolve()
     units = config["main"]["units"]
-
-    # initiate data array
-    data = []
-
-    # loop through dates
-    for date_path in [d for d in data_path.iterdir() if d.is_dir()]:
-
-        # loop through hourly grib files
-        for grib_file_path in [f for f in date_path.iterdir() if f.name.endswith(".grib2")]:
-
-            # compute wind speed
-            wind_speed = compute_mean_wind_speed(grib_file_path, units)
-
-            # compare value to threshold
-            is_threshold_surpassed = wind_speed > threshold
-
-            # add item in data array
-            data.append(
-                {
-                    "date_str": grib_file_path.stem,
-                    "date_obj": datetime.datetime.strptime(
-                        grib_file_path.stem,
-                        "%Y%m%d_%H%M",
-                    ),
-                    "wind_speed": wind_speed,
-                    "alert": is_threshold_surpassed,
-                }
-            )
+    workers = config.getint("processing", "workers", fallback=1)
+    chunksize = config.getint("processing", "chunksize", fallback=0)
+    sites = read_sites(config)
+    statistic = read_statistic(config)
+
+    # select site to plot
+    if site_name is not None:
+        sites = [site for site in sites if site["name"] == site_name]
+        if len(sites) == 0:
+            raise ValueError("Unknown site '{}'".format(site_name))
+    site = sites[0]
+
+    # list compact stores, and hourly grib files of dates not compacted yet
+    store_files = sorted(data_path.glob("*" + STORE_SUFFIX))
+    grib_file_paths = [
+        f
+        for date_path in data_path.iterdir()
+        if date_path.is_dir() and not get_store_file(date_path).exists()
+        for f in date_path.iterdir()
+        if f.name.endswith(".grib2")
+    ]
+
+    # get wind speed from index, decoding only new or changed files
+    dates = [parse_dates([f.stem for f in grib_file_paths])]
+    wind_speeds = [
+        get_wind_speed(
+            data_path / INDEX_FILENAME,
+            grib_file_paths,
+            [site_key(site, statistic)],
+            lambda files: map_files(
+                functools.partial(
+                    compute_sites_wind_speed_values, sites=[site], units="m/s", statistic=statistic
+                ),
+                files,
+                workers,
+                chunksize,
+            ),
+        )[:, 0]
+    ]
+
+    # get wind speed from compact stores
+    for store_file in store_files:
+        store_dates, u, v, lats, lons = read_store(store_file)
+        dates.append(store_dates)
+        wind_speed = compute_wind_speed(u, v, "m/s")
+        wind_speeds.append(extract_site_values(wind_speed, lats, lons, [site], statistic)[:, 0])
+
+    # series sorted by timestamp, compared to the threshold of the site
+    series = ForecastSeries(
+        np.concatenate(dates), convert_units(np.concatenate(wind_speeds), units), site["threshold"]
+    )
 
     # write report
-    write_report(data, threshold, units, report_filename)
+    write_report(series, site["threshold"], units, report_filename)
 
 
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
     parser.add_argument("-r", "--report_filename")
+    parser.add_argument("-c", "--config", help="config file, the project one if not given")
+    parser.add_argument("-s", "--site", help="site to plot, the first one if not given")
     args = parser.parse_args()
 
-    plot_archive(args.report_filename)
+    plot_archive(args.report_filename, args.config, args.site)
@@ -0,0 +1,200 @@
+"""
+Alert rules module for Duventchezmoi.
+
+Alert rules are compiled into arrays, and evaluated at once over the wind speed forecast of all
+sites, each kind of rule costing a few array operations whatever the number of rules.
+"""
+
+# third party
+import numpy as np
+
+# current project
+from duventchezmoi.forecast_series import compute_time_weights
+
+RULE_KINDS = ("threshold", "sustained", "rising")
+SITE_RULE = "threshold"  # name of the rule comparing wind speed to the threshold of each site
+
+
+def read_rules(config):
+    """Read alert rules from config.
+
+    The threshold of each site is always evaluated, as a rule named SITE_RULE. Other rules are
+    listed in the [rules] section, one per line, as:
+    name = kind, value[, hours[, recipient recipient ...[, site site ...]]]
+    where kind is one of RULE_KINDS:
+    - threshold: wind speed above value
+    - sustained: wind speed above value for at least hours in a row
+    - rising: wind speed rising by at least value within hours
+    Recipients default to the ones of each site, and rules apply to all sites if none are given.
+
+    Parameters
+    ----------
+    config : configparser.ConfigParser
+
+    Returns
+    -------
+    rules : [dict, ...]
+        {"name": str, "kind": str, "value": float or None, "hours": float,
+        "recipients": [str, ...] or None, "sites": [str, ...] or None}, value being None for the
+        threshold of each site
+    """
+
+    rules = [
+        {
+            "name": SITE_RULE,
+            "kind": "threshold",
+            "value": None,
+            "hours": 0.0,
+            "recipients": None,
+            "sites": None,
+        }
+    ]
+    if not config.has_section("rules"):
+        return rules
+
+    for name, value in config["rules"].items():
+        fields = [field.strip() for field in value.split(",")]
+        if name == SITE_RULE:
+            raise ValueError("Rule name '{}' is reserved for site thresholds".format(name))
+        if len(fields) < 2:
+            raise ValueError("Rule '{}' must at least define kind and value".format(name))
+        if fields[0] not in RULE_KINDS:
+            raise ValueError(
+                "Unknown kind '{}' of rule '{}', expected one of {}".format(
+                    fields[0], name, ", ".join(RULE_KINDS)
+                )
+            )
+        hours = float(fields[2]) if len(fields) > 2 and fields[2] else 0.0
+        if fields[0] != "threshold" and hours <= 0:
+            raise ValueError("Rule '{}' must define a duration in hours".format(name))
+        rules.append(
+            {
+                "name": name,
+                "kind": fields[0],
+                "value": float(fields[1]),
+                "hours": hours,
+                "recipients": fields[3].split() if len(fields) > 3 and fields[3] else None,
+                "sites": fields[4].split() if len(fields) > 4 and fields[4] else None,
+            }
+        )
+
+    return rules
+
+
+def compile_rules(rules, sites):
+    """Compile alert rules into arrays, for all sites.
+
+    Parameters
+    ----------
+    rules : [dict, ...]
+        see read_rules
+    sites : [dict, ...]
+        see sites.read_sites
+
+    Returns
+    -------
+    compiled : dict
+        {"kinds": np.ndarray (rule,) of str, "values": np.ndarray (rule, site),
+        "hours": np.ndarray (rule,), "applies": np.ndarray (rule, site) of bool}
+    """
+
+    thresholds = np.array([site["threshold"] for site in sites], dtype=float)
+    names = [site["name"] for site in sites]
+
+    return {
+        "kinds": np.array([rule["kind"] for rule in rules]),
+        "values": np.array(
+            [
+                thresholds if rule["value"] is None else np.full(len(sites), rule["value"])
+                for rule in rules
+            ]
+        ).reshape(len(rules), len(sites)),
+        "hours": np.array([rule["hours"] for rule in rules], dtype=float),
+        "applies": np.array(
+            [[rule["sites"] is None or name in rule["sites"] for name in names] for rule in rules]
+        ).reshape(len(rules), len(sites)),
+    }
+
+
+def _cumulate_runs(mask, hours):
+    """Cumulate hours along axis 1 over runs of True values, restarting after each False value."""
+    cumulated = np.cumsum(hours, axis=1)
+    return cumulated - np.maximum.accumulate(np.where(mask, 0.0, cumulated), axis=1)
+
+
+def evaluate_rules(compiled, dates, values):
+    """Evaluate compiled alert rules over the wind speed forecast of all sites.
+
+    Parameters
+    ----------
+    compiled : dict
+        see compile_rules
+    dates : np.ndarray
+        datetime64, sorted
+    values : np.ndarray
+        wind speed, shape (time, site), in the units of the rules
+
+    Returns
+    -------
+    alerts : np.ndarray
+        boolean, shape (rule, time, site), True at the dates triggering each rule
+    """
+
+    kinds = compiled["kinds"]
+    alerts = np.zeros((len(kinds), len(dates), values.shape[1]), dtype=bool)
+    if len(dates) == 0:
+        return alerts
+
+    # threshold and sustained rules, wind speed above value
+    above = np.flatnonzero(kinds != "rising")
+    alerts[above] = values[np.newaxis] > compiled["values"][above, np.newaxis, :]
+
+    # sustained rules, keeping runs above value lasting at least the rule duration
+    sustained = np.flatnonzero(kinds == "sustained")
+    if len(sustained) > 0:
+        mask = alerts[sustained]
+        hours = np.where(
+            mask, compute_time_weights(dates, centered=False)[np.newaxis, :, np.newaxis], 0.0
+        )
+        forward = _cumulate_runs(mask, hours)
+        backward = _cumulate_runs(mask[:, ::-1], hours[:, ::-1])[:, ::-1]
+        run_hours = forward + backward - hours
+        alerts[sustained] = mask & (
+            run_hours >= compiled["hours"][sustained, np.newaxis, np.newaxis]
+        )
+
+    # rising rules, wind speed rising by at least value since the rule duration
+    rising = np.flatnonzero(kinds == "rising")
+    if len(rising) > 0:
+        durations = np.round(compiled["hours"][rising] * 60).astype("timedelta64[m]")
+        starts = np.searchsorted(dates, dates[np.newaxis] - durations[:, np.newaxis])
+        alerts[rising] = (
+            values[np.newaxis] - values[starts] >= compiled["values"][rising, np.newaxis, :]
+        )
+
+    return alerts & compiled["applies"][:, np.newaxis, :]
+
+
+def describe_rule(rule, threshold, units):
+    """Describe alert rule, for report emails.
+
+    Parameters
+    ----------
+    rule : dict
+        see read_rules
+    threshold : float
+        value of the rule for the reported site
+    units : str
+
+    Returns
+    -------
+    str
+    """
+
+    if rule["kind"] == "sustained":
+        return "wind speed above {:.2f} {} for {:g} hours".format(threshold, units, rule["hours"])
+    if rule["kind"] == "rising":
+        return "wind speed rising by {:.2f} {} within {:g} hours".format(
+            threshold, units, rule["hours"]
+        )
+    return "wind speed above {:.2f} {}".format(threshold, units)
@@ -0,0 +1,93 @@
+"""
+Long-running scheduler for Duventchezmoi.
+
+Instead of starting a new process for each run, the daemon keeps imported modules, Gmail
+credentials and service, and HTTP connections in memory between runs. Each site is evaluated at
+its own interval, with an optional random delay to spread requests over time.
+"""
+
+# standard library
+import configparser
+import logging
+import random
+import time
+
+# current project
+from duventchezmoi.download_gfs import REQUEST_TIMEOUT
+from duventchezmoi.download_gfs import ConnectionPool
+from duventchezmoi.main import duventchezmoi
+from duventchezmoi.sites import read_sites
+
+logger = logging.getLogger(__name__)
+
+
+def read_schedule(config):
+    """Read interval between runs of each site from config.
+
+    Intervals are given in minutes, in the [daemon] section for all sites, and optionally in the
+    [schedule] section for each site, as: name = interval.
+
+    Parameters
+    ----------
+    config : configparser.ConfigParser
+
+    Returns
+    -------
+    intervals : {str: float, ...}
+        in seconds, for each site name
+    jitter : float
+        maximum random delay added to each interval, in seconds
+    """
+
+    default_interval = config.getfloat("daemon", "interval", fallback=15.0)
+    jitter = config.getfloat("daemon", "jitter", fallback=0.0)
+
+    intervals = {}
+    for site in read_sites(config):
+        intervals[site["name"]] = 60 * config.getfloat(
+            "schedule", site["name"], fallback=default_interval
+        )
+
+    return intervals, jitter
+
+
+def run_daemon(config_path, max_cycles=None):
+    """Run Duventchezmoi periodically, evaluating each site when it is due.
+
+    Parameters
+    ----------
+    config_path : Path
+    max_cycles : int or None
+        number of cycles to run before returning, if None run forever
+    """
+
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    intervals, jitter = read_schedule(config)
+    max_workers = config.getint("download", "max_workers", fallback=1)
+    timeout = config.getfloat("download", "timeout", fallback=REQUEST_TIMEOUT)
+
+    # all sites are due at start
+    next_times = {name: time.monotonic() for name in intervals}
+
+    cycles = 0
+    with ConnectionPool(maxsize=max(1, max_workers), timeout=timeout) as pool:
+        while max_cycles is None or cycles < max_cycles:
+
+            # wait for next due site
+            time.sleep(max(0.0, min(next_times.values()) - time.monotonic()))
+            now = time.monotonic()
+            due_names = [name for name, next_time in next_times.items() if next_time <= now]
+
+            # run for due sites, errors are logged without stopping the daemon
+            logger.info("Running for sites: {}".format(", ".join(due_names)))
+            try:
+                duventchezmoi(config_path, pool=pool, site_names=due_names)
+            except (Exception, SystemExit) as error:
+                logger.error("Error during run: {}".format(error))
+
+            # schedule next runs
+            for name in due_names:
+                next_times[name] = now + intervals[name] + random.uniform(0.0, jitter)
+
+            cycles += 1
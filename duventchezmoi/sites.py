@@ -0,0 +1,332 @@
+"""
+Monitoring sites module for Duventchezmoi.
+"""
+
+# standard library
+import functools
+import math
+
+# third party
+import numpy as np
+
+GRID_RESOLUTION = 0.25  # GFS grid resolution, in decimal degrees
+STATISTICS = ("mean", "bilinear", "max", "percentile", "exceedance")
+DEFAULT_STATISTIC = {"name": "mean", "percentile": 0.0, "margin": 0}
+
+
+def read_sites(config):
+    """Read monitoring sites from config.
+
+    Sites are listed in the [sites] section, one per line, as:
+    name = lat, lon[, threshold[, recipient recipient ...]]
+    Threshold and recipients default to the [main] threshold and [mail] recipients.
+    If there is no [sites] section, a single site named "main" is read from the [main] section.
+
+    Parameters
+    ----------
+    config : configparser.ConfigParser
+
+    Returns
+    -------
+    sites : [dict, ...]
+        {"name": str, "lat": float, "lon": float, "threshold": float, "recipients": [str, ...]}
+    """
+
+    default_threshold = config.getfloat("main", "threshold", fallback=None)
+    default_recipients = config["mail"]["recipients"].split(",")
+
+    # single site configuration
+    if not config.has_section("sites"):
+        return [
+            {
+                "name": "main",
+                "lat": float(config["main"]["lat"]),
+                "lon": float(config["main"]["lon"]),
+                "threshold": default_threshold,
+                "recipients": default_recipients,
+            }
+        ]
+
+    # multiple sites configuration
+    sites = []
+    for name, value in config["sites"].items():
+        fields = [field.strip() for field in value.split(",")]
+        if len(fields) < 2:
+            raise ValueError("Site '{}' must at least define lat and lon".format(name))
+        threshold = float(fields[2]) if len(fields) > 2 and fields[2] else default_threshold
+        if threshold is None:
+            raise ValueError("No threshold given for site '{}'".format(name))
+        recipients = fields[3].split() if len(fields) > 3 and fields[3] else default_recipients
+        sites.append(
+            {
+                "name": name,
+                "lat": float(fields[0]),
+                "lon": float(fields[1]),
+                "threshold": threshold,
+                "recipients": recipients,
+            }
+        )
+
+    return sites
+
+
+def read_statistic(config):
+    """Read statistic of wind speed over each site from config.
+
+    The statistic is given in the [processing] section, as one of STATISTICS:
+    - mean: mean over the grid cell containing the site
+    - bilinear: bilinear interpolation at site coordinates
+    - max: maximum over the grid cell
+    - percentile: given percentile over the grid cell
+    - exceedance: wind speed exceeded over given fraction of the grid cell area, so that comparing
+      it to the threshold checks that the threshold is exceeded over at least this fraction, the
+      fraction being stored as the percentile 100 * (1 - fraction)
+    The grid cell can be extended by a margin of grid points on each side.
+
+    Parameters
+    ----------
+    config : configparser.ConfigParser
+
+    Returns
+    -------
+    statistic : dict
+        {"name": str, "percentile": float, "margin": int}
+    """
+
+    name = config.get("processing", "statistic", fallback="mean").lower()
+    if name not in STATISTICS:
+        raise ValueError("Unknown statistic '{}', expected one of {}".format(name, STATISTICS))
+
+    percentile = 0.0
+    if name == "percentile":
+        percentile = config.getfloat("processing", "percentile", fallback=90.0)
+    elif name == "exceedance":
+        percentile = 100.0 * (1.0 - config.getfloat("processing", "exceedance_area", fallback=0.25))
+
+    return {
+        "name": name,
+        "percentile": percentile,
+        "margin": config.getint("processing", "margin", fallback=0),
+    }
+
+
+def compute_extent(sites, margin=0):
+    """Compute extent on the GFS grid covering all given sites.
+
+    Parameters
+    ----------
+    sites : [dict, ...]
+    margin : int
+        number of grid points added on each side
+
+    Returns
+    -------
+    extent : [float, float, float, float]
+        W, N, E, S, at 0.25 deg precision
+    """
+
+    lats = [site["lat"] for site in sites]
+    lons = [site["lon"] for site in sites]
+
+    return [
+        (min(math.floor(lon / GRID_RESOLUTION) for lon in lons) - margin) * GRID_RESOLUTION,  # W
+        (max(math.ceil(lat / GRID_RESOLUTION) for lat in lats) + margin) * GRID_RESOLUTION,  # N
+        (max(math.ceil(lon / GRID_RESOLUTION) for lon in lons) + margin) * GRID_RESOLUTION,  # E
+        (min(math.floor(lat / GRID_RESOLUTION) for lat in lats) - margin) * GRID_RESOLUTION,  # S
+    ]
+
+
+def compute_cell_indices(lats, lons, sites, margin=0):
+    """Find grid indices of the points of the grid cell containing each site.
+
+    Parameters
+    ----------
+    lats : np.ndarray
+        grid latitudes, 1D
+    lons : np.ndarray
+        grid longitudes, 1D
+    sites : [dict, ...]
+    margin : int
+        number of grid points added on each side of the cell
+
+    Returns
+    -------
+    lat_indices : np.ndarray
+        shape (number of sites, number of points), (2 + 2 * margin) ** 2 points per site
+    lon_indices : np.ndarray
+        shape (number of sites, number of points)
+    """
+
+    site_lats = np.array([site["lat"] for site in sites])
+    site_lons = np.array([site["lon"] for site in sites]) % 360
+
+    # bounds of the cell containing each site, extended by margin
+    offsets = np.concatenate([np.arange(-margin, 1), np.arange(0, margin + 1)])
+    lat_bounds = np.stack(
+        [np.floor(site_lats / GRID_RESOLUTION), np.ceil(site_lats / GRID_RESOLUTION)], axis=-1
+    )
+    lon_bounds = np.stack(
+        [np.floor(site_lons / GRID_RESOLUTION), np.ceil(site_lons / GRID_RESOLUTION)], axis=-1
+    )
+    lat_bounds = (np.repeat(lat_bounds, margin + 1, axis=-1) + offsets) * GRID_RESOLUTION
+    lon_bounds = ((np.repeat(lon_bounds, margin + 1, axis=-1) + offsets) * GRID_RESOLUTION) % 360
+
+    # nearest grid indices of bounds
+    lat_indices = np.abs(lats[None, None, :] - lat_bounds[:, :, None]).argmin(axis=-1)
+    lon_indices = np.abs((lons % 360)[None, None, :] - lon_bounds[:, :, None]).argmin(axis=-1)
+
+    # combine into all points of each cell
+    n_points = lat_indices.shape[-1]
+    return np.repeat(lat_indices, n_points, axis=-1), np.tile(lon_indices, n_points)
+
+
+def compute_bilinear_weights(sites):
+    """Compute bilinear interpolation weights of the corners of the grid cell containing each site.
+
+    Parameters
+    ----------
+    sites : [dict, ...]
+
+    Returns
+    -------
+    np.ndarray
+        shape (number of sites, 4), in the order of corners given by compute_cell_indices
+    """
+
+    site_lats = np.array([site["lat"] for site in sites]) / GRID_RESOLUTION
+    site_lons = (np.array([site["lon"] for site in sites]) % 360) / GRID_RESOLUTION
+
+    # relative position of each site in its cell
+    t = site_lats - np.floor(site_lats)
+    s = site_lons - np.floor(site_lons)
+
+    return np.stack([(1 - t) * (1 - s), (1 - t) * s, t * (1 - s), t * s], axis=-1)
+
+
+@functools.lru_cache(maxsize=16)
+def _compute_site_weights(lats, lons, site_coordinates, statistic_name, margin):
+    """Cached implementation of compute_site_weights, taking hashable arguments."""
+
+    lats, lons = np.array(lats), np.array(lons)
+    sites = [{"lat": lat, "lon": lon} for lat, lon in site_coordinates]
+
+    # flat indices of the points of the cell containing each site, bilinear interpolation only
+    # using its corners
+    if statistic_name == "bilinear":
+        margin = 0
+    lat_indices, lon_indices = compute_cell_indices(lats, lons, sites, margin)
+    indices = np.ravel_multi_index((lat_indices, lon_indices), (len(lats), len(lons)))
+
+    # order statistics are computed over the points of each cell
+    if statistic_name not in ("mean", "bilinear"):
+        return None, indices
+
+    # linear statistics are computed with a weight matrix
+    if statistic_name == "bilinear":
+        point_weights = compute_bilinear_weights(sites)
+    else:
+        point_weights = np.full(indices.shape, 1.0 / indices.shape[-1])
+    weights = np.zeros((len(sites), len(lats) * len(lons)))
+    np.add.at(weights, (np.arange(len(sites))[:, None], indices), point_weights)
+
+    return weights, indices
+
+
+def compute_site_weights(lats, lons, sites, statistic=None):
+    """Compute weights of grid points for the statistic of each site.
+
+    Weights are cached, and computed only once for a given grid, sites and statistic.
+
+    Parameters
+    ----------
+    lats : np.ndarray
+        grid latitudes, 1D
+    lons : np.ndarray
+        grid longitudes, 1D
+    sites : [dict, ...]
+    statistic : dict or None
+        see read_statistic, mean over the grid cell if None
+
+    Returns
+    -------
+    weights : np.ndarray or None
+        for linear statistics, shape (number of sites, number of grid points), None otherwise
+    indices : np.ndarray
+        flat indices of the grid points of each site, shape (number of sites, number of points)
+    """
+
+    if statistic is None:
+        statistic = DEFAULT_STATISTIC
+
+    return _compute_site_weights(
+        tuple(np.asarray(lats).tolist()),
+        tuple(np.asarray(lons).tolist()),
+        tuple((site["lat"], site["lon"]) for site in sites),
+        statistic["name"],
+        statistic["margin"],
+    )
+
+
+def extract_site_values(values, lats, lons, sites, statistic=None):
+    """Extract statistic of values over the grid cell containing each site.
+
+    The statistic is computed for all leading dimensions, such as time, in one vectorized step.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        shape (..., number of lats, number of lons)
+    lats : np.ndarray
+        grid latitudes, 1D
+    lons : np.ndarray
+        grid longitudes, 1D
+    sites : [dict, ...]
+    statistic : dict or None
+        see read_statistic, mean over the grid cell if None
+
+    Returns
+    -------
+    np.ndarray
+        shape (..., number of sites)
+    """
+
+    if statistic is None:
+        statistic = DEFAULT_STATISTIC
+
+    weights, indices = compute_site_weights(lats, lons, sites, statistic)
+    values = values.reshape(values.shape[:-2] + (-1,))
+
+    if weights is not None:
+        return values @ weights.T
+    if statistic["name"] == "max":
+        return values[..., indices].max(axis=-1)
+
+    if statistic["name"] == "exceedance":
+        return _compute_exceedance(values[..., indices], 1.0 - statistic["percentile"] / 100.0)
+
+    return np.percentile(values[..., indices], statistic["percentile"], axis=-1)
+
+
+def _compute_exceedance(values, area):
+    """Compute wind speed exceeded over given fraction of the points of each grid cell.
+
+    This is the k-th largest value, k points being the fewest covering the fraction, so that it
+    is above a threshold exactly when at least this fraction of the points are. Percentiles
+    interpolate between points instead, and may stay below the threshold in this case.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        shape (..., number of points)
+    area : float
+        fraction of the points, between 0 and 1
+
+    Returns
+    -------
+    np.ndarray
+        shape (...)
+    """
+
+    n_points = values.shape[-1]
+    n_exceeding = min(max(math.ceil(round(area * n_points, 9)), 1), n_points)
+    return np.partition(values, n_points - n_exceeding, axis=-1)[..., n_points - n_exceeding]
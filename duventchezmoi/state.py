@@ -0,0 +1,56 @@
+"""
+State file module for Duventchezmoi.
+
+The state file records what previous runs did, such as the last run processed for each site and
+the alerts notified, as one JSON object with a section per purpose.
+"""
+
+# standard library
+import json
+
+# current project
+from duventchezmoi.file_utils import write_atomically
+
+
+def read_state(state_file, section, default=None):
+    """Read a section of the state file.
+
+    Parameters
+    ----------
+    state_file : Path
+    section : str
+    default : object
+        returned if the state file or the section does not exist
+
+    Returns
+    -------
+    object
+    """
+
+    if not state_file.exists():
+        return default
+
+    with open(state_file) as f:
+        return json.load(f).get(section, default)
+
+
+def write_state(state_file, section, value):
+    """Write a section of the state file, keeping its other sections.
+
+    The state file is replaced only once complete, so that an interrupted run never corrupts it.
+
+    Parameters
+    ----------
+    state_file : Path
+    section : str
+    value : object
+        serializable as JSON
+    """
+
+    state = {}
+    if state_file.exists():
+        with open(state_file) as f:
+            state = json.load(f)
+    state[section] = value
+
+    write_atomically(state_file, json.dumps(state))
@@ -10,4 +10,10 @@ setup(
     name="duventchezmoi",
     version="0.1",
     packages=find_packages(),
+    entry_points={
+        "console_scripts": [
+            "duventchezmoi=duventchezmoi.main:main",
+            "duventchezmoi-query=duventchezmoi.archive_query:main",
+        ]
+    },
 )
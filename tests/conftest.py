@@ -0,0 +1,65 @@
+"""Fixtures shared by the unit tests."""
+
+# standard library
+import shutil
+from pathlib import Path
+
+# third party
+import pytest
+
+
+def _fake_download_gfs(extent, data_path, callback=None, **kwargs):
+    """Copy sample file as the first forecast hours, instead of downloading them."""
+    grib2_file = Path(__file__).parent / "20240330_0000.grib2"
+    results = {}
+    for hour in range(3):
+        output_file = data_path / "20240330_{:02d}00.grib2".format(hour)
+        shutil.copy(grib2_file, output_file)
+        results[hour] = {"success": True}
+        if callback is not None:
+            callback(hour, output_file, results[hour])
+    return results
+
+
+def _fake_download_gfs_failure(extent, data_path, callback=None, **kwargs):
+    """Same as _fake_download_gfs, a last forecast hour failing after all retries."""
+    results = _fake_download_gfs(extent, data_path, callback, **kwargs)
+    results[3] = {"success": False}
+    return results
+
+
+def _write_config(temp_dir, threshold, extra=""):
+    """Write config file in given directory, returns its path."""
+    config_path = Path(temp_dir) / "config.ini"
+    config_path.write_text(
+        "[main]\n"
+        "data_path = {}\n"
+        "lat = 44.834546\n"
+        "lon = -0.566572\n"
+        "threshold = {}\n"
+        "units = km/h\n"
+        "cleaning = false\n"
+        "[mail]\n"
+        "recipients = a@example.com\n"
+        "sender = b@example.com\n"
+        "{}".format(Path(temp_dir) / "data", threshold, extra)
+    )
+    return config_path
+
+
+@pytest.fixture
+def fake_download_gfs():
+    """Stand-in for download_gfs, see _fake_download_gfs."""
+    return _fake_download_gfs
+
+
+@pytest.fixture
+def fake_download_gfs_failure():
+    """Stand-in for download_gfs with a failed forecast hour, see _fake_download_gfs_failure."""
+    return _fake_download_gfs_failure
+
+
+@pytest.fixture
+def write_config():
+    """Config writer, see _write_config."""
+    return _write_config
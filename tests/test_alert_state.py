@@ -0,0 +1,79 @@
+"""Unit tests for the 'alert_state.py' module."""
+
+# standard library
+import json
+import tempfile
+from pathlib import Path
+
+# third party
+import numpy as np
+
+# current project
+from duventchezmoi.alert_state import compare_fingerprints
+from duventchezmoi.alert_state import compute_fingerprint
+from duventchezmoi.alert_state import is_notified
+from duventchezmoi.alert_state import read_alert_state
+from duventchezmoi.alert_state import write_alert_state
+
+DATES = np.datetime64("2024-03-30T00:00") + np.arange(8).astype("timedelta64[h]")
+
+
+def fingerprint(values, threshold=40.0):
+    values = np.array(values, dtype=float)
+    return compute_fingerprint(DATES, values, values > threshold)
+
+
+def test_compute_fingerprint():
+    assert fingerprint([50, 60, 10, 10, 45, 10, 10, 10]) == {
+        "windows": [["2024-03-30T00:00", "2024-03-30T01:00"], ["2024-03-30T04:00"] * 2],
+        "peak": 60.0,
+        "peak_date": "2024-03-30T01:00",
+    }
+    assert fingerprint([10] * 8) == {"windows": [], "peak": None, "peak_date": None}
+
+
+def test_compare_fingerprints():
+    previous = fingerprint([10, 50, 60, 10, 10, 10, 10, 10])
+
+    # new alert, and no alert
+    assert compare_fingerprints(None, previous) == "new"
+    assert compare_fingerprints(None, fingerprint([10] * 8)) is None
+
+    # small changes of the same window
+    assert compare_fingerprints(previous, fingerprint([50, 50, 62, 10, 10, 10, 10, 10])) is None
+
+    # new window, peak change and peak shift
+    assert compare_fingerprints(previous, fingerprint([10, 50, 60, 10, 10, 10, 45, 10])) == "new"
+    assert (
+        compare_fingerprints(previous, fingerprint([10, 50, 70, 10, 10, 10, 10, 10])) == "changed"
+    )
+    assert (
+        compare_fingerprints(previous, fingerprint([10, 50, 60, 10, 10, 10, 10, 10]), peak_hours=0)
+        is None  # noqa W503
+    )
+    shifted = fingerprint([10, 50, 45, 45, 45, 45, 45, 60])
+    assert compare_fingerprints(previous, shifted) is None
+    assert compare_fingerprints(previous, shifted, peak_hours=3) == "changed"
+
+    # all-clear
+    assert compare_fingerprints(previous, fingerprint([10] * 8)) == "all_clear"
+
+
+def test_is_notified():
+    previous = fingerprint([10, 50, 60, 10, 10, 10, 10, 10])
+    assert is_notified(previous, DATES[2])
+    assert not is_notified(previous, DATES[3])
+    assert not is_notified(None, DATES[2])
+
+
+def test_alert_state():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        state_file = Path(temp_dir) / "state.json"
+        assert read_alert_state(state_file) == {}
+
+        # assert that alerts are recorded along with other contents of the state file
+        state_file.write_text(json.dumps({"last_run": {"main": ["20240330", "00"]}}))
+        alerts = {"main/threshold": fingerprint([10, 50, 60, 10, 10, 10, 10, 10])}
+        write_alert_state(state_file, alerts)
+        assert read_alert_state(state_file) == alerts
+        assert json.loads(state_file.read_text())["last_run"] == {"main": ["20240330", "00"]}
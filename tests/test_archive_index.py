@@ -0,0 +1,57 @@
+"""Unit tests for the 'archive_index.py' module."""
+
+# standard library
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+# third party
+import numpy as np
+
+# current project
+from duventchezmoi.archive_index import get_wind_speed
+from duventchezmoi.archive_index import site_key
+from duventchezmoi.main import compute_mean_wind_speed
+
+
+def test_get_wind_speed():
+    key = site_key({"lat": 44.834546, "lon": -0.566572})
+    grib2_file = Path(__file__).parent / "20240330_0000.grib2"
+    computed_files = []
+
+    def compute_function(files):
+        computed_files.extend(files)
+        return [[compute_mean_wind_speed(f, "m/s")] for f in files]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        index_file = Path(temp_dir) / "index.sqlite"
+        files = [Path(temp_dir) / "20240330_{:02d}00.grib2".format(hour) for hour in range(3)]
+        for f in files:
+            shutil.copy(grib2_file, f)
+
+        # first call computes all values
+        values = get_wind_speed(index_file, files, [key], compute_function)
+        assert values.shape == (3, 1)
+        np.testing.assert_allclose(values, 5.18, atol=0.01)
+        assert computed_files == files
+
+        # second call reads all values from index
+        computed_files.clear()
+        cached_values = get_wind_speed(index_file, files, [key], compute_function)
+        np.testing.assert_array_equal(values, cached_values)
+        assert computed_files == []
+
+        # changed file is computed again
+        os.utime(files[1], ns=(0, 0))
+        get_wind_speed(index_file, files, [key], compute_function)
+        assert computed_files == [files[1]]
+
+
+def test_site_key():
+    assert site_key({"lat": 44.834546, "lon": -0.566572}) == "site:44.834546,-0.566572"
+    statistic = {"name": "percentile", "percentile": 90.0, "margin": 1}
+    assert (
+        site_key({"lat": 44.834546, "lon": -0.566572}, statistic)
+        == "site:44.834546,-0.566572:percentile:90:1"  # noqa W503
+    )
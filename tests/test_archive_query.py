@@ -0,0 +1,139 @@
+"""Unit tests for the 'archive_query.py' module."""
+
+# standard library
+import contextlib
+import tempfile
+from pathlib import Path
+
+# third party
+import numpy as np
+import pytest
+
+# current project
+from duventchezmoi.archive_index import open_index
+from duventchezmoi.archive_index import site_key
+from duventchezmoi.archive_query import compute_exceedance
+from duventchezmoi.archive_query import compute_statistics
+from duventchezmoi.archive_query import find_top_windows
+from duventchezmoi.archive_query import parse_time_range
+from duventchezmoi.archive_query import query_archive
+from duventchezmoi.archive_query import read_series
+
+KEY = site_key({"lat": 44.834546, "lon": -0.566572})
+
+
+def fill_index(index_file, run_name, dates, values):
+    """Insert wind speed values of a run in the index, as computed from its files."""
+    with contextlib.closing(open_index(index_file)) as connection, connection:
+        connection.executemany(
+            "INSERT INTO wind_speed VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                ("/data/{}/{}.grib2".format(run_name, date), KEY, 0, 0, date, value)
+                for date, value in zip(dates, values)
+            ],
+        )
+
+
+def test_parse_time_range():
+    assert parse_time_range() == (None, None)
+    assert parse_time_range("2024-03", "2024-03") == (
+        np.datetime64("2024-03-01T00:00"),
+        np.datetime64("2024-04-01T00:00"),
+    )
+    assert parse_time_range("2024-03-30T06:00", "2024-03-30")[1] == np.datetime64("2024-03-31")
+
+
+def test_read_series():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        index_file = Path(temp_dir) / "index.sqlite"
+
+        # two runs forecasting the same dates, filled out of order
+        fill_index(index_file, "20240330_06", ["20240330_0600", "20240330_0700"], [3.0, 4.0])
+        fill_index(index_file, "20240330", ["20240330_0700", "20240330_0000"], [1.0, 2.0])
+
+        # assert that dates are sorted, and forecast by the latest run
+        dates, values = read_series(index_file, KEY)
+        np.testing.assert_array_equal(
+            dates, np.array(["2024-03-30T00:00", "2024-03-30T06:00", "2024-03-30T07:00"], "M8[m]")
+        )
+        np.testing.assert_array_equal(values, [2.0, 3.0, 4.0])
+
+        # time range, the stop date being excluded
+        start, stop = np.datetime64("2024-03-30T06:00"), np.datetime64("2024-03-30T07:00")
+        dates, values = read_series(index_file, KEY, start, stop)
+        np.testing.assert_array_equal(values, [3.0])
+
+        # unknown key
+        assert len(read_series(index_file, "unknown")[0]) == 0
+
+
+def test_compute_statistics():
+    dates = np.datetime64("2024-03-30T00:00") + np.array([0, 1, 2, 5], dtype="m8[h]")
+    values = np.array([10.0, 20.0, 60.0, 55.0])
+
+    statistics = compute_statistics(dates, values)
+    assert statistics["count"] == 4
+    assert statistics["hours"] == pytest.approx(5.0)
+    assert statistics["max"] == 60.0
+    assert statistics["max_date"] == "2024-03-30T02:00"
+    assert statistics["mean"] == pytest.approx((10 * 0.5 + 20 * 1 + 60 * 2 + 55 * 1.5) / 5)
+    assert compute_statistics(dates[:0], values[:0])["max"] is None
+
+    # assert that hours above threshold are weighted by the time each value stands for
+    exceedance = compute_exceedance(dates, values, 50.0)
+    assert exceedance["count"] == 2
+    assert exceedance["hours"] == pytest.approx(3.5)
+    assert exceedance["first_date"] == "2024-03-30T02:00"
+    assert compute_exceedance(dates[:0], values[:0], 50.0)["hours"] == 0.0
+
+
+def test_find_top_windows():
+    dates = np.datetime64("2024-03-30T00:00") + np.arange(12).astype("m8[h]")
+    values = np.array([0, 1, 9, 9, 0, 0, 0, 5, 6, 0, 0, 0], dtype=float)
+
+    # assert that the strongest windows are found, without overlap
+    windows = find_top_windows(dates, values, window_hours=2, top=2)
+    assert [w["start"] for w in windows] == ["2024-03-30T02:00", "2024-03-30T07:00"]
+    assert windows[0]["end"] == "2024-03-30T03:00"
+    assert windows[0]["mean"] == 9.0
+    assert windows[1]["max"] == 6.0
+    assert find_top_windows(dates, values, top=0) == []
+
+
+def test_query_archive():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_path = Path(temp_dir) / "data"
+        data_path.mkdir()
+        config_path = Path(temp_dir) / "config.ini"
+        config_path.write_text(
+            "[main]\n"
+            "data_path = {}\n"
+            "lat = 44.834546\n"
+            "lon = -0.566572\n"
+            "threshold = 50.0\n"
+            "units = km/h\n"
+            "cleaning = false\n"
+            "[mail]\n"
+            "recipients = a@example.com\n".format(data_path)
+        )
+
+        # hourly values in m/s over March and April
+        dates = np.arange("2024-03-31T20:00", "2024-04-01T04:00", dtype="datetime64[h]")
+        values = np.array([10.0, 15.0, 20.0, 5.0, 5.0, 20.0, 20.0, 20.0])
+        fill_index(
+            data_path / "index.sqlite",
+            "20240331",
+            [d.item().strftime("%Y%m%d_%H%M") for d in dates],
+            values,
+        )
+
+        # assert that March is queried in km/h, with the site threshold
+        results = query_archive(config_path, start="2024-03", end="2024-03", top=1, window_hours=2)
+        assert results["main"]["statistics"]["count"] == 4
+        assert results["main"]["statistics"]["max"] == pytest.approx(72.0)
+        assert results["main"]["exceedance"]["count"] == 2
+        assert results["main"]["windows"][0]["start"] == "2024-03-31T21:00"
+
+        # another threshold over the whole archive
+        results = query_archive(config_path, threshold=60.0)
+        assert results["main"]["exceedance"]["count"] == 4
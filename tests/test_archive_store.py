@@ -0,0 +1,68 @@
+"""Unit tests for the 'archive_store.py' module."""
+
+# standard library
+import datetime
+import shutil
+import tempfile
+from pathlib import Path
+
+# third party
+import numpy as np
+
+# current project
+from duventchezmoi.archive_store import compact_archive
+from duventchezmoi.archive_store import compact_day
+from duventchezmoi.archive_store import read_store
+from duventchezmoi.grib_utils import load_wind_cube
+
+
+def create_day_directory(date_path, hours):
+    """Copy sample file as several forecast hours in given directory."""
+    grib2_file = Path(__file__).parent / "20240330_0000.grib2"
+    date_path.mkdir()
+    for hour in range(hours):
+        shutil.copy(grib2_file, date_path / "20240330_{:02d}00.grib2".format(hour))
+
+
+def test_compact_day():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        date_path = Path(temp_dir) / "20240330"
+        create_day_directory(date_path, 5)
+        dates, u, v, lats, lons = load_wind_cube(sorted(date_path.glob("*.grib2")))
+
+        # compact in chunks of 2 hours
+        store_file = compact_day(date_path, remove=True, chunk_size=2)
+        assert store_file == Path(temp_dir) / "20240330.npz"
+        assert not date_path.exists()
+
+        # read all dates
+        store_dates, store_u, store_v, store_lats, store_lons = read_store(store_file)
+        assert store_dates.astype(datetime.datetime).tolist() == dates
+        np.testing.assert_allclose(store_u, u, rtol=1e-6)
+        np.testing.assert_allclose(store_v, v, rtol=1e-6)
+        np.testing.assert_array_equal(store_lats, lats)
+        np.testing.assert_array_equal(store_lons, lons)
+
+        # read a time range spanning two chunks
+        store_dates, store_u, _, _, _ = read_store(
+            store_file, datetime.datetime(2024, 3, 30, 1), datetime.datetime(2024, 3, 30, 2)
+        )
+        assert store_dates.astype(datetime.datetime).tolist() == dates[1:3]
+        assert store_u.shape == (2, 2, 2)
+
+        # read an empty time range
+        store_dates, store_u, _, _, _ = read_store(store_file, datetime.datetime(2025, 1, 1))
+        assert len(store_dates) == 0
+        assert store_u.shape == (0, 2, 2)
+
+
+def test_compact_archive():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_path = Path(temp_dir)
+        create_day_directory(data_path / "20240329", 2)
+        create_day_directory(data_path / "20240330", 2)
+
+        # current day is left untouched
+        store_files = compact_archive(data_path, exclude=["20240330"])
+        assert store_files == [data_path / "20240329.npz"]
+        assert (data_path / "20240329").exists()
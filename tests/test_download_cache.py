@@ -0,0 +1,132 @@
+"""Unit tests for the 'download_cache.py' module."""
+
+# standard library
+import concurrent.futures
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# current project
+from duventchezmoi.download_cache import DownloadCache
+from duventchezmoi.download_cache import cache_key
+from duventchezmoi.download_gfs import create_gfs_url
+
+EXTENT = [-0.75, 45.0, -0.50, 44.75]
+
+
+def fake_download(url, output_file):
+    time.sleep(0.05)
+    output_file.write_bytes(b"GRIB" + url.encode("utf-8") + b"7777")
+    return {"success": True, "bytes": output_file.stat().st_size, "cached": False}
+
+
+def test_cache_key():
+
+    url = create_gfs_url("20220330", EXTENT, 10)
+
+    # same request from another server, with parameters in another order or format
+    mirror_url = create_gfs_url("20220330", EXTENT, 10, base_url="http://localhost:8000")
+    assert cache_key(mirror_url) == cache_key(url)
+    reordered_url = url.replace("var_UGRD=on&var_VGRD=on", "var_VGRD=on&var_UGRD=on")
+    assert cache_key(reordered_url) == cache_key(url)
+    assert cache_key(url.replace("rightlon=-0.5", "rightlon=-0.50")) == cache_key(url)
+
+    # other forecast hour, run or extent
+    assert cache_key(create_gfs_url("20220330", EXTENT, 11)) != cache_key(url)
+    assert cache_key(create_gfs_url("20220330", EXTENT, 10, "06")) != cache_key(url)
+    assert cache_key(create_gfs_url("20220330", [-1.0, 45.0, -0.5, 44.75], 10)) != cache_key(url)
+
+
+def test_fetch():
+
+    url = create_gfs_url("20220330", EXTENT, 10)
+    calls = []
+    lock = threading.Lock()
+
+    def download(url, output_file):
+        with lock:
+            calls.append(url)
+        return fake_download(url, output_file)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir)
+        cache = DownloadCache(temp_path / "cache")
+        output_files = [temp_path / "run_{}.grib2".format(i) for i in range(4)]
+
+        # assert that concurrent requests for the same file download it once
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda f: cache.fetch(url, f, download), output_files))
+        assert len(calls) == 1
+        assert sorted(r["cached"] for r in results) == [False, True, True, True]
+        for output_file in output_files:
+            assert output_file.read_bytes() == cache.get_file(url).read_bytes()
+
+        # assert that using a cached file leaves the times of its linked copies untouched
+        os.utime(output_files[0], (1000, 1000))
+        assert cache.fetch(url, temp_path / "run_4.grib2", download)["cached"]
+        assert output_files[0].stat().st_mtime == 1000
+
+        # assert that a failed download is neither cached nor linked
+        failed_url = create_gfs_url("20220330", EXTENT, 11)
+        output_file = temp_path / "failed.grib2"
+        result = cache.fetch(failed_url, output_file, lambda url, f: {"success": False})
+        assert not result["success"]
+        assert not result["cached"]
+        assert not output_file.exists()
+        assert not cache.get_file(failed_url).exists()
+        assert not list(cache.get_file(failed_url).parent.glob(".*.part"))
+
+
+def disk_usage(path):
+    """Get size of the GRIB2 files under given path, hard links being counted once."""
+    inodes = {f.stat().st_ino: f.stat().st_size for f in path.rglob("*.grib2")}
+    return sum(inodes.values())
+
+
+def test_evict():
+
+    with tempfile.TemporaryDirectory() as temp_path:
+        temp_path = Path(temp_path)
+        cache = DownloadCache(temp_path / "cache")
+        run_path = temp_path / "run"
+        run_path.mkdir()
+
+        # fill cache, each file being used one second after the previous one
+        urls = [create_gfs_url("20220330", EXTENT, hours) for hours in range(5)]
+        for hours, url in enumerate(urls):
+            cache.fetch(url, run_path / "{}.grib2".format(hours), fake_download)
+            lock_file = cache.get_lock_file(cache.get_file(url))
+            os.utime(lock_file, (1000 + hours, 1000 + hours))
+        size = cache.get_file(urls[0]).stat().st_size
+        assert disk_usage(temp_path) == 5 * size
+
+        # using a file again keeps it in cache
+        cache.fetch(urls[0], run_path / "0.grib2", fake_download)
+        assert cache.get_file(urls[0]).stat().st_nlink == 2
+
+        # files linked from places unknown to the cache free no space, and are kept
+        os.link(cache.get_file(urls[2]), temp_path / "unknown.grib2")
+
+        # assert that least recently used files are evicted down to the budget, along with their
+        # links in run directories, so that disk space is actually freed
+        cache.max_bytes = 3 * size
+        assert cache.evict(keep=[cache.get_file(urls[4])]) == 2 * size
+        exists = [cache.get_file(url).exists() for url in urls]
+        assert exists == [True, False, True, False, True]
+        assert [(run_path / "{}.grib2".format(i)).exists() for i in range(5)] == exists
+        lock_files = [cache.get_lock_file(cache.get_file(url)) for url in urls]
+        assert [lock_file.exists() for lock_file in lock_files] == exists
+        assert disk_usage(temp_path) == 3 * size
+
+        # empty run directories are removed
+        (temp_path / "unknown.grib2").unlink()
+        cache.max_bytes = 0
+        assert cache.evict() == 3 * size
+        assert disk_usage(temp_path) == 0
+        assert not run_path.exists()
+
+        # assert that nothing is evicted without budget
+        cache.max_bytes = None
+        assert cache.evict() == 0
@@ -2,7 +2,10 @@
 
 # standard library
 import datetime
+import http.server
 import tempfile
+import threading
+import time
 from pathlib import Path
 from unittest.mock import patch
 
@@ -10,9 +13,20 @@ from unittest.mock import patch
 import pytest
 
 # current project
+from duventchezmoi.download_cache import DownloadCache
+from duventchezmoi.download_gfs import ConnectionPool
+from duventchezmoi.download_gfs import TokenBucket
+from duventchezmoi.download_gfs import compute_backoff
+from duventchezmoi.download_gfs import create_forecast_hours
 from duventchezmoi.download_gfs import create_gfs_url
+from duventchezmoi.download_gfs import download_forecast_hour
 from duventchezmoi.download_gfs import download_from_url
 from duventchezmoi.download_gfs import download_gfs
+from duventchezmoi.download_gfs import find_latest_run
+from duventchezmoi.download_gfs import get_run_name
+from duventchezmoi.download_gfs import is_run_available
+from duventchezmoi.download_gfs import is_valid_grib2
+from duventchezmoi.metrics import Metrics
 
 
 def test_create_gfs_url():
@@ -26,13 +40,18 @@ def test_create_gfs_url():
     expected_url = "https://nomads.ncep.noaa.gov/cgi-bin/filter_gfs_0p25.pl?file=gfs.t00z.pgrb2.0p25.f010&lev_planetary_boundary_layer=on&var_UGRD=on&var_VGRD=on&subregion=&leftlon=-0.75&rightlon=-0.5&toplat=45.0&bottomlat=44.75&dir=%2Fgfs.20220330%2F00%2Fatmos"
     assert create_gfs_url(run_date, extent, forecast_hours) == expected_url
 
+    # assert that another server can be requested
+    url = create_gfs_url(run_date, extent, forecast_hours, base_url="http://127.0.0.1:8000")
+    assert url == expected_url.replace("https://nomads.ncep.noaa.gov", "http://127.0.0.1:8000")
+
 
 @pytest.mark.parametrize("response_size, expected_result", [(100, True), (0, False)])
 @patch("duventchezmoi.download_gfs.urllib.request.urlopen")
 def test_download_from_url(mock_urlopen, response_size, expected_result):
 
-    # mock the result of reading the downloaded file
-    mock_urlopen.return_value.read.return_value = b"X" * response_size
+    # mock the result of reading the downloaded file, streamed in chunks
+    mock_response = mock_urlopen.return_value.__enter__.return_value
+    mock_response.read.side_effect = [b"X" * response_size, b""]
 
     with tempfile.TemporaryDirectory() as temp_dir:
         output_path = Path(temp_dir) / "duventchezmoi_test_download.grib2"
@@ -62,6 +81,342 @@ def test_download_gfs(mock_download_from_url, mock_datetime):
         data_path = Path(temp_dir)
         extent = [-0.75, 45.0, -0.50, 44.75]  # mock data
 
-        # assert that download_from_url is called 121 times, without actually calling it
+        # assert that download_from_url is called 209 times, without actually calling it:
+        # hourly up to 120 hours, then 3-hourly up to 384 hours
         download_gfs(extent, data_path)
-        assert mock_download_from_url.call_count == 121
+        assert mock_download_from_url.call_count == 209
+
+
+@patch("duventchezmoi.download_gfs.datetime")
+@patch("duventchezmoi.download_gfs.download_from_url")
+def test_download_gfs_results(mock_download_from_url, mock_datetime):
+
+    # mock the run date, and a download failing for one forecast hour
+    mock_datetime.now.return_value.strftime.return_value = "20220330"
+    mock_datetime.strptime.return_value = datetime.datetime(2022, 3, 30)
+    mock_download_from_url.side_effect = lambda url, *args, **kwargs: "f005" not in url
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_path = Path(temp_dir)
+        extent = [-0.75, 45.0, -0.50, 44.75]  # mock data
+
+        # assert that a result is returned for each forecast hour, in order
+        results = download_gfs(extent, data_path, max_workers=4)
+        assert list(results.keys()) == create_forecast_hours()
+        assert not results[5]["success"]
+        assert all(results[h]["success"] for h in results if h != 5)
+        assert all(results[h]["latency"] >= 0 for h in results)
+
+
+def test_is_valid_grib2():
+
+    grib2_file = Path(__file__).parent / "20240330_0000.grib2"
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+
+        # complete file
+        assert is_valid_grib2(grib2_file)
+
+        # missing file
+        assert not is_valid_grib2(Path(temp_dir) / "missing.grib2")
+
+        # truncated file
+        truncated_file = Path(temp_dir) / "truncated.grib2"
+        truncated_file.write_bytes(grib2_file.read_bytes()[:200])
+        assert not is_valid_grib2(truncated_file)
+
+        # html error page instead of grib2 data
+        html_file = Path(temp_dir) / "error.grib2"
+        html_file.write_bytes(b"<html><body>error</body></html>")
+        assert not is_valid_grib2(html_file)
+
+
+@patch("duventchezmoi.download_gfs.datetime")
+@patch("duventchezmoi.download_gfs.download_from_url")
+def test_download_gfs_incremental(mock_download_from_url, mock_datetime):
+
+    # mock the run date to generate download url and output filename
+    mock_datetime.datetime.now.return_value.strftime.return_value = "20220330"
+    mock_datetime.datetime.strptime.return_value = datetime.datetime(2022, 3, 30)
+    mock_datetime.timedelta = datetime.timedelta
+
+    grib2_file = Path(__file__).parent / "20240330_0000.grib2"
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_path = Path(temp_dir)
+        extent = [-0.75, 45.0, -0.50, 44.75]  # mock data
+
+        # one valid file and one corrupt file left by a previous run
+        (data_path / "20220330_0000.grib2").write_bytes(grib2_file.read_bytes())
+        (data_path / "20220330_0100.grib2").write_bytes(grib2_file.read_bytes()[:200])
+
+        # assert that only the valid file is skipped
+        results = download_gfs(extent, data_path, incremental=True)
+        assert mock_download_from_url.call_count == 208
+        assert results[0]["skipped"]
+        assert not results[1]["skipped"]
+
+
+def test_download_from_url_pool():
+
+    payload = b"GRIB" + b"X" * 1000 + b"7777"
+    client_addresses = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep connections alive
+
+        def do_GET(self):
+            client_addresses.append(self.client_address)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:{}/file".format(server.server_address[1])
+
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir, ConnectionPool() as pool:
+
+            # download the same file several times, streamed in small chunks
+            for i in range(3):
+                output_path = Path(temp_dir) / "{}.grib2".format(i)
+                assert download_from_url(url, output_path, pool=pool, chunk_size=100)
+                assert output_path.read_bytes() == payload
+
+            # check that a single connection was used for all requests
+            assert len(client_addresses) == 3
+            assert len(set(client_addresses)) == 1
+
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@patch("duventchezmoi.download_gfs.datetime")
+@patch("duventchezmoi.download_gfs.download_from_url")
+def test_download_gfs_callback(mock_download_from_url, mock_datetime):
+
+    # mock the run date to generate download url and output filename
+    mock_datetime.datetime.now.return_value.strftime.return_value = "20220330"
+    mock_datetime.datetime.strptime.return_value = datetime.datetime(2022, 3, 30)
+    mock_datetime.timedelta = datetime.timedelta
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_path = Path(temp_dir)
+        extent = [-0.75, 45.0, -0.50, 44.75]  # mock data
+
+        # assert that the callback is called once for each forecast hour
+        calls = []
+        download_gfs(extent, data_path, max_workers=4, callback=lambda *args: calls.append(args))
+        assert sorted(call[0] for call in calls) == create_forecast_hours()
+        assert (0, data_path / "20220330_0000.grib2") in [call[:2] for call in calls]
+
+        # assert that time spent in the callback is not recorded as download time
+        metrics = Metrics()
+        download_gfs(
+            extent,
+            data_path,
+            forecast_hours=[0, 1, 2, 3],
+            callback=lambda *args: time.sleep(0.1),
+            metrics=metrics,
+        )
+        assert metrics.stages["download"]["seconds"] < 0.2
+
+
+@patch("duventchezmoi.download_gfs.is_run_available")
+def test_find_latest_run(mock_is_run_available):
+
+    # only runs up to 2024-03-30 06 UTC are published
+    mock_is_run_available.side_effect = lambda run, *args, **kwargs: run <= ("20240330", "06")
+    now = datetime.datetime(2024, 3, 30, 14, 30, tzinfo=datetime.timezone.utc)
+
+    # latest cycle (12) is not published yet, previous one is
+    assert find_latest_run(now=now) == ("20240330", "06")
+
+    # no new run since the last processed one
+    assert find_latest_run(now=now, after=("20240330", "06")) is None
+    assert mock_is_run_available.call_count == 3
+
+
+@patch("urllib.request.urlopen")
+def test_is_run_available_timeout(mock_urlopen):
+    mock_urlopen.return_value.__enter__.return_value.status = 200
+    assert is_run_available(("20240330", "06"), timeout=5.0)
+    assert mock_urlopen.call_args.args[0].get_method() == "HEAD"
+    assert mock_urlopen.call_args.kwargs["timeout"] == 5.0
+
+
+def test_create_forecast_hours():
+
+    # full forecast, following GFS output cadence
+    forecast_hours = create_forecast_hours()
+    assert len(forecast_hours) == 209
+    assert forecast_hours[:3] == [0, 1, 2]
+    assert forecast_hours[119:123] == [119, 120, 123, 126]
+    assert forecast_hours[-1] == 384
+
+    # shorter horizon, lower density
+    assert create_forecast_hours(horizon=48, step=6) == [0, 6, 12, 18, 24, 30, 36, 42, 48]
+    assert create_forecast_hours(horizon=132, step=2)[-6:] == [118, 120, 123, 126, 129, 132]
+    assert create_forecast_hours(horizon=132, step=4)[-4:] == [116, 120, 126, 132]
+
+
+def test_get_run_name():
+    assert get_run_name(("20240330", "00")) == "20240330"
+    assert get_run_name(("20240330", "18")) == "20240330_18"
+
+
+def serve_responses(responses):
+    """Start a local server answering GET requests with given (status, headers, body) in order,
+    the last one being repeated, returns the server and the list of requested paths."""
+
+    paths = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            status, headers, body = responses[min(len(paths), len(responses) - 1)]
+            paths.append(self.path)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, paths
+
+
+@pytest.mark.parametrize("use_pool", [False, True])
+@patch("duventchezmoi.download_gfs.compute_backoff", return_value=0.0)
+def test_download_forecast_hour_retries(mock_compute_backoff, use_pool):
+
+    # server error, throttling status, HTML page instead of GRIB2 data, then GRIB2 data
+    payload = b"GRIB" + b"X" * 1000 + b"7777"
+    server, paths = serve_responses(
+        [
+            (503, {}, b""),
+            (429, {"Retry-After": "0"}, b""),
+            (200, {"Content-Type": "text/html"}, b"<html>Over rate limit</html>"),
+            (200, {}, payload),
+        ]
+    )
+    url = "http://127.0.0.1:{}/file".format(server.server_address[1])
+
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir, ConnectionPool() as pool:
+            output_file = Path(temp_dir) / "20240330_0000.grib2"
+            result = download_forecast_hour(
+                url, output_file, pool=pool if use_pool else None, bucket=TokenBucket()
+            )
+
+            # forecast hour is eventually downloaded
+            assert result["success"]
+            assert result["retries"] == 3
+            assert result["throttled"] == 2
+            assert output_file.read_bytes() == payload
+            assert len(paths) == 4
+
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@patch("duventchezmoi.download_gfs.compute_backoff", return_value=0.0)
+def test_download_forecast_hour_failure(mock_compute_backoff):
+
+    server, paths = serve_responses([(404, {}, b"")])
+    url = "http://127.0.0.1:{}/file".format(server.server_address[1])
+
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_file = Path(temp_dir) / "20240330_0000.grib2"
+
+            # missing data is not requested again, and failure is reported without raising
+            result = download_forecast_hour(url, output_file, max_retries=3)
+            assert not result["success"]
+            assert result["retries"] == 0
+            assert "404" in result["error"]
+            assert not output_file.exists()
+            assert len(paths) == 1
+
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_token_bucket():
+
+    # requests beyond capacity are spread at given rate
+    bucket = TokenBucket(rate=50.0, capacity=2)
+    start_time = time.monotonic()
+    for _ in range(7):
+        bucket.acquire()
+    assert time.monotonic() - start_time >= 0.09
+
+    # requests are held while paused
+    bucket.pause(0.1)
+    start_time = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start_time >= 0.09
+
+    # unlimited bucket does not wait
+    bucket = TokenBucket()
+    start_time = time.monotonic()
+    for _ in range(1000):
+        bucket.acquire()
+    assert time.monotonic() - start_time < 0.1
+
+
+def test_compute_backoff():
+    for attempt in range(10):
+        assert 0.0 <= compute_backoff(attempt, base=1.0, maximum=30.0) <= min(30.0, 2**attempt)
+
+
+@patch("duventchezmoi.download_gfs.download_from_url")
+def test_download_gfs_cache(mock_download_from_url):
+
+    payload = (Path(__file__).parent / "20240330_0000.grib2").read_bytes()
+
+    def download_from_url(input_url, output_file, **kwargs):
+        output_file.write_bytes(payload)
+        return True
+
+    mock_download_from_url.side_effect = download_from_url
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir)
+        cache = DownloadCache(temp_path / "cache")
+        extent = [-0.75, 45.0, -0.50, 44.75]  # mock data
+        metrics = Metrics()
+
+        # assert that a second config over the same extent reuses downloaded files
+        for config_name in ["first", "second"]:
+            data_path = temp_path / config_name
+            data_path.mkdir()
+            results = download_gfs(
+                extent,
+                data_path,
+                max_workers=2,
+                run=("20220330", "00"),
+                forecast_hours=[0, 1, 2],
+                cache=cache,
+                metrics=metrics if config_name == "second" else None,
+            )
+            assert mock_download_from_url.call_count == 3
+            assert all(r["success"] for r in results.values())
+            assert (data_path / "20220330_0200.grib2").read_bytes() == payload
+        assert all(r["cached"] for r in results.values())
+        assert metrics.counters["cached_files"] == 3
+        assert metrics.counters["downloaded_files"] == 0
@@ -0,0 +1,27 @@
+"""Unit tests for the 'file_utils.py' module."""
+
+# standard library
+import tempfile
+from pathlib import Path
+
+# third party
+import pytest
+
+# current project
+from duventchezmoi.file_utils import open_atomically
+from duventchezmoi.file_utils import write_atomically
+
+
+def test_write_atomically():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_file = Path(temp_dir) / "state.json"
+        write_atomically(output_file, "{}")
+        assert output_file.read_text() == "{}"
+
+        # assert that a failed write keeps the previous file, and leaves no temporary file
+        with pytest.raises(RuntimeError):
+            with open_atomically(output_file, "wb") as f:
+                f.write(b"partial")
+                raise RuntimeError("interrupted")
+        assert output_file.read_text() == "{}"
+        assert [f.name for f in Path(temp_dir).iterdir()] == ["state.json"]
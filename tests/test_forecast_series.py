@@ -0,0 +1,80 @@
+"""Unit tests for the 'forecast_series.py' module."""
+
+# standard library
+import datetime
+import tempfile
+from pathlib import Path
+
+# third party
+import numpy as np
+import pytest
+
+# current project
+from duventchezmoi.forecast_series import ForecastSeries
+from duventchezmoi.forecast_series import compute_time_weights
+from duventchezmoi.forecast_series import parse_dates
+from duventchezmoi.main import write_report
+
+
+def test_parse_dates():
+    np.testing.assert_array_equal(
+        parse_dates(["20240330_0000", "20240331_1800"]),
+        np.array(["2024-03-30T00:00", "2024-03-31T18:00"], dtype="datetime64[m]"),
+    )
+    assert parse_dates([]).dtype == np.dtype("datetime64[m]")
+
+
+def test_forecast_series():
+    dates = parse_dates(["20240330_0200", "20240330_0000", "20240330_0100"])
+
+    # assert that values are sorted by date, as compact arrays
+    series = ForecastSeries(dates, [30.0, 50.0, 40.0], threshold=35.0)
+    assert len(series) == 3
+    assert series.values.dtype == np.float32
+    np.testing.assert_array_equal(series.values, [50.0, 40.0, 30.0])
+    np.testing.assert_array_equal(series.alerts, [True, True, False])
+
+    # given alerts are sorted along with values
+    series = ForecastSeries(dates, [30.0, 50.0, 40.0], alerts=[True, False, False])
+    np.testing.assert_array_equal(series.alerts, [False, False, True])
+
+    # no alerts without threshold
+    assert not ForecastSeries(dates, [30.0, 50.0, 40.0]).alerts.any()
+
+    with pytest.raises(ValueError):
+        ForecastSeries(dates, [30.0, 50.0])
+
+
+def test_forecast_series_report():
+    start = datetime.datetime(2024, 3, 30)
+    data = [
+        {
+            "date_str": (start + datetime.timedelta(hours=i)).strftime("%Y%m%d_%H%M"),
+            "date_obj": start + datetime.timedelta(hours=i),
+            "wind_speed": float(i),
+            "alert": i > 2,
+        }
+        for i in range(5)
+    ]
+
+    # series created from rows
+    series = ForecastSeries.from_records(data[::-1], 2.0)
+    np.testing.assert_array_equal(series.values, np.arange(5))
+    np.testing.assert_array_equal(series.alerts, [False, False, False, True, True])
+
+    # series are passed straight to write_report
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_file = Path(temp_dir) / "report.pdf"
+        write_report(series, 2.0, "km/h", output_file)
+        assert output_file.exists()
+
+
+def test_compute_time_weights():
+
+    # hourly then 3-hourly values, with a gap of 12 hours
+    dates = np.array(
+        ["2024-03-30T00", "2024-03-30T01", "2024-03-30T04", "2024-03-30T16"], dtype="datetime64[m]"
+    )
+    np.testing.assert_allclose(compute_time_weights(dates), [0.5, 2.0, 3.0, 1.5])
+    np.testing.assert_allclose(compute_time_weights(dates, centered=False), [1.0, 3.0, 3.0, 3.0])
+    np.testing.assert_allclose(compute_time_weights(dates[:1], centered=False), [1.0])
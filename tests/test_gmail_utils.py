@@ -0,0 +1,144 @@
+"""Unit tests for the 'gmail_utils.py' module."""
+
+# standard library
+import base64
+import email
+import gc
+import gzip
+import tempfile
+from email.mime.base import MIMEBase
+from pathlib import Path
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+# current project
+from duventchezmoi.gmail_utils import compress_file
+from duventchezmoi.gmail_utils import create_message
+from duventchezmoi.gmail_utils import send_mail
+from duventchezmoi.gmail_utils import send_mails
+from duventchezmoi.gmail_utils import write_message
+
+
+def test_create_message():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        report_file = Path(temp_dir) / "report.pdf"
+        report_file.write_bytes(b"%PDF" + bytes(range(256)) * 10)
+
+        message = create_message(
+            "Subject", "Contents", ["a@example.com"], attachments=[report_file]
+        )
+
+        # decode message and check its parts
+        decoded = email.message_from_bytes(base64.urlsafe_b64decode(message["raw"]))
+        assert decoded["Subject"] == "Subject"
+        assert decoded["To"] == "a@example.com"
+        attachment, text = decoded.get_payload()
+        assert attachment.get_payload(decode=True) == report_file.read_bytes()
+        assert text.get_payload(decode=True) == b"Contents"
+
+
+def test_create_message_releases_attachments():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        report_file = Path(temp_dir) / "report.pdf"
+        report_file.write_bytes(b"%PDF" + bytes(range(256)) * 10)
+
+        # assert that no MIME part holds the attachment payload while the message is encoded
+        parts_alive = []
+
+        def urlsafe_b64encode(data):
+            gc.collect()
+            parts_alive.append(sum(isinstance(o, MIMEBase) for o in gc.get_objects()))
+            return base64.b64encode(data, altchars=b"-_")
+
+        with patch("duventchezmoi.gmail_utils.base64.urlsafe_b64encode", urlsafe_b64encode):
+            create_message("Subject", "Contents", ["a@example.com"], attachments=[report_file])
+        assert parts_alive == [0]
+
+
+class FakeBatch:
+    """Batch request calling back each request in order, the second one failing."""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.request_ids = []
+
+    def add(self, request, request_id):
+        self.request_ids.append(request_id)
+
+    def execute(self):
+        for request_id in self.request_ids:
+            exception = Exception("Invalid recipient") if request_id == "1" else None
+            self.callback(request_id, {}, exception)
+
+
+@patch("duventchezmoi.gmail_utils.get_gmail_service")
+def test_send_mails(mock_get_gmail_service):
+    batches = []
+
+    def new_batch_http_request(callback):
+        batches.append(FakeBatch(callback))
+        return batches[-1]
+
+    gmail_service = MagicMock()
+    gmail_service.new_batch_http_request.side_effect = new_batch_http_request
+    mock_get_gmail_service.return_value = gmail_service
+
+    messages = [{"raw": "message"} for _ in range(3)]
+    results = send_mails(messages, credentials=None)
+
+    # all messages are sent in a single batch, with a result for each of them
+    assert len(batches) == 1
+    assert [result["success"] for result in results] == [True, False, True]
+    assert results[1]["error"] == "Invalid recipient"
+    assert all(result["latency"] >= 0 for result in results)
+
+
+def test_write_message():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        report_file = Path(temp_dir) / "report.pdf"
+        report_file.write_bytes(bytes(range(256)) * 1000)
+        message_file = Path(temp_dir) / "message.eml"
+
+        write_message(message_file, "Subject", "Contents", ["a@example.com"], [], [], [report_file])
+
+        # decode message and check that the streamed attachment is intact
+        decoded = email.message_from_bytes(message_file.read_bytes())
+        assert decoded["Subject"] == "Subject"
+        attachment, text = decoded.get_payload()
+        assert attachment.get_filename() == "report.pdf"
+        assert attachment.get_payload(decode=True) == report_file.read_bytes()
+        assert text.get_payload(decode=True) == b"Contents"
+
+
+def test_compress_file():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        report_file = Path(temp_dir) / "report.pdf"
+        report_file.write_bytes(b"X" * 100000)
+        output_file = compress_file(report_file, temp_dir)
+        assert output_file.name == "report.pdf.gz"
+        assert gzip.decompress(output_file.read_bytes()) == report_file.read_bytes()
+
+
+@patch("duventchezmoi.gmail_utils.MAX_ATTACHMENT_SIZE", 1000)
+@patch("duventchezmoi.gmail_utils.get_gmail_service")
+def test_send_mail_large(mock_get_gmail_service):
+    gmail_service = mock_get_gmail_service.return_value
+    request = gmail_service.users.return_value.messages.return_value.send.return_value
+    request.next_chunk.side_effect = [(None, None), (None, {"id": "sent"})]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        report_file = Path(temp_dir) / "report.pdf"
+        report_file.write_bytes(b"X" * 5000)
+        send_mail(
+            "Subject",
+            "Contents",
+            None,
+            "b@example.com",
+            ["a@example.com"],
+            attachments=[report_file],
+        )
+
+    # oversized attachment is uploaded in chunks instead of being dropped
+    send_kwargs = gmail_service.users.return_value.messages.return_value.send.call_args.kwargs
+    assert send_kwargs["media_body"].resumable()
+    assert request.next_chunk.call_count == 2
@@ -0,0 +1,84 @@
+"""Unit tests for the 'grib_utils.py' module."""
+
+# standard library
+import datetime
+import functools
+import shutil
+import tempfile
+from pathlib import Path
+
+# third party
+import numpy as np
+
+# current project
+from duventchezmoi.grib_utils import compute_wind_speed
+from duventchezmoi.grib_utils import load_wind_cube
+from duventchezmoi.grib_utils import map_files
+from duventchezmoi.grib_utils import read_wind_components
+from duventchezmoi.main import compute_sites_wind_speed_values
+
+
+def test_read_wind_components():
+    grib2_file = Path(__file__).parent / "20240330_0000.grib2"
+
+    # scan file for message numbers
+    u, v, message_numbers, _ = read_wind_components(grib2_file)
+    assert message_numbers == (1, 2)
+    assert u.shape == v.shape == (2, 2)
+
+    # wrong cached message numbers are ignored
+    u_cached, v_cached, message_numbers, _ = read_wind_components(grib2_file, (2, 1))
+    assert message_numbers == (1, 2)
+    np.testing.assert_array_equal(u, u_cached)
+    np.testing.assert_array_equal(v, v_cached)
+
+
+def test_load_wind_cube():
+    grib2_file = Path(__file__).parent / "20240330_0000.grib2"
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+
+        # copy sample file as several forecast hours
+        files = []
+        for hour in range(3):
+            files.append(Path(temp_dir) / "20240330_{:02d}00.grib2".format(hour))
+            shutil.copy(grib2_file, files[-1])
+
+        dates, u, v, lats, lons = load_wind_cube(files)
+
+    assert dates == [datetime.datetime(2024, 3, 30, hour) for hour in range(3)]
+    assert u.shape == v.shape == (3, 2, 2)
+    np.testing.assert_array_equal(lats, [44.75, 45.0])
+    np.testing.assert_array_equal(lons, [359.25, 359.5])
+
+    # empty list of files
+    dates, u, v, lats, lons = load_wind_cube([])
+    assert dates == [] and lats is None
+
+
+def test_compute_wind_speed():
+    u = np.array([3.0, 0.0])
+    v = np.array([4.0, 1.0])
+    np.testing.assert_allclose(compute_wind_speed(u, v, "m/s"), [5.0, 1.0])
+    np.testing.assert_allclose(compute_wind_speed(u, v, "km/h"), [18.0, 3.6])
+
+
+def test_map_files():
+    grib2_file = Path(__file__).parent / "20240330_0000.grib2"
+    sites = [{"lat": 44.834546, "lon": -0.566572}, {"lat": 44.658, "lon": -1.168}]
+    function = functools.partial(compute_sites_wind_speed_values, sites=sites, units="m/s")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+
+        # copy sample file as several forecast hours
+        files = []
+        for hour in range(5):
+            files.append(Path(temp_dir) / "20240330_{:02d}00.grib2".format(hour))
+            shutil.copy(grib2_file, files[-1])
+
+        # results of the process pool match the sequential results, in the same order
+        sequential_values = map_files(function, files)
+        parallel_values = map_files(function, files, workers=2, chunksize=2)
+
+    assert sequential_values.shape == (5, 2)
+    np.testing.assert_array_equal(sequential_values, parallel_values)
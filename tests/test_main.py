@@ -2,15 +2,23 @@
 
 # standard library
 import datetime
+import json
+import subprocess
+import sys
 import tempfile
 from pathlib import Path
+from unittest.mock import patch
 
 # third party
 import numpy as np
 import pytest
 
 # current project
+from duventchezmoi.main import aggregate_daily
 from duventchezmoi.main import compute_mean_wind_speed
+from duventchezmoi.main import duventchezmoi
+from duventchezmoi.main import format_horizon
+from duventchezmoi.main import get_forecast_dates
 from duventchezmoi.main import write_report
 
 
@@ -40,3 +48,283 @@ def test_write_report():
         output_file = Path(temp_dir) / "duventchezmoi_test_report.pdf"
         write_report(mock_data, 40.0, "km/h", output_file)
         assert output_file.exists()
+
+
+def send_reports_success(reports, *args, **kwargs):
+    """Stand-in for send_reports, all reports being sent."""
+    return [{"success": True} for _ in reports]
+
+
+@pytest.mark.parametrize("threshold, expected_alert", [(10.0, True), (30.0, False)])
+@patch("duventchezmoi.main.send_reports")
+@patch("duventchezmoi.main.download_gfs")
+def test_duventchezmoi(
+    mock_download_gfs,
+    mock_send_report,
+    threshold,
+    expected_alert,
+    fake_download_gfs,
+    write_config,
+):
+    mock_download_gfs.side_effect = fake_download_gfs
+    with tempfile.TemporaryDirectory() as temp_dir:
+        extra = "[metrics]\ntextfile = {}\n".format(Path(temp_dir) / "duventchezmoi.prom")
+        duventchezmoi(write_config(temp_dir, threshold, extra))
+        assert mock_send_report.called == expected_alert
+
+        # run metrics are written
+        with open(Path(temp_dir) / "data" / "metrics.json") as f:
+            summary = json.load(f)
+        assert summary["counters"]["reports"] == int(expected_alert)
+        assert "decode" in summary["stages"]
+        assert (Path(temp_dir) / "duventchezmoi.prom").exists()
+
+
+@patch("duventchezmoi.main.send_reports")
+@patch("duventchezmoi.main.download_gfs")
+def test_duventchezmoi_rules(mock_download_gfs, mock_send_report, fake_download_gfs, write_config):
+    mock_download_gfs.side_effect = fake_download_gfs
+    with tempfile.TemporaryDirectory() as temp_dir:
+        extra = "[rules]\nlong = sustained, 15, 3, c@example.com\nshort = sustained, 15, 4\n"
+        duventchezmoi(write_config(temp_dir, 30.0, extra))
+
+        # only the rule sustained over the 3 forecast hours is reported, to its recipients
+        reports = mock_send_report.call_args.args[0]
+        assert len(reports) == 1
+        assert reports[0]["report_file"].name.endswith("_long.pdf")
+        assert reports[0]["recipients"] == ["c@example.com"]
+        assert reports[0]["rule"] == "wind speed above 15.00 km/h for 3 hours"
+
+
+@patch("duventchezmoi.main.send_reports")
+@patch("duventchezmoi.main.download_gfs")
+def test_duventchezmoi_alert_state(
+    mock_download_gfs, mock_send_report, fake_download_gfs, write_config
+):
+    mock_download_gfs.side_effect = fake_download_gfs
+    mock_send_report.side_effect = send_reports_success
+    with tempfile.TemporaryDirectory() as temp_dir:
+
+        # alert is reported once, while unchanged
+        duventchezmoi(write_config(temp_dir, 10.0))
+        assert mock_send_report.call_count == 1
+        duventchezmoi(write_config(temp_dir, 10.0))
+        assert mock_send_report.call_count == 1
+
+        # all-clear is sent without report once the alert is no longer forecast
+        duventchezmoi(write_config(temp_dir, 30.0))
+        assert mock_send_report.call_count == 2
+        assert mock_send_report.call_args.args[0][0]["report_file"] is None
+        duventchezmoi(write_config(temp_dir, 30.0))
+        assert mock_send_report.call_count == 2
+
+
+@patch("duventchezmoi.main.send_reports")
+@patch("duventchezmoi.main.download_gfs")
+@patch("duventchezmoi.main.find_latest_run")
+def test_duventchezmoi_alert_state_outage(
+    mock_find_latest_run, mock_download_gfs, mock_send_report, fake_download_gfs, write_config
+):
+    mock_send_report.side_effect = send_reports_success
+
+    # all forecast hours fail to download
+    def fake_download_gfs_outage(extent, data_path, **kwargs):
+        return {hour: {"success": False} for hour in range(3)}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config_path = write_config(temp_dir, 10.0, "[download]\nlatest_run = true\n")
+
+        # alert is reported
+        mock_find_latest_run.return_value = ("20240330", "00")
+        mock_download_gfs.side_effect = fake_download_gfs
+        duventchezmoi(config_path)
+        assert mock_send_report.call_count == 1
+
+        # an outage sends no all-clear
+        mock_find_latest_run.return_value = ("20240330", "06")
+        mock_download_gfs.side_effect = fake_download_gfs_outage
+        duventchezmoi(config_path)
+        assert mock_send_report.call_count == 1
+
+        # and the unchanged alert is not reported again once data is back
+        mock_find_latest_run.return_value = ("20240330", "12")
+        mock_download_gfs.side_effect = fake_download_gfs
+        duventchezmoi(config_path)
+        assert mock_send_report.call_count == 1
+
+
+@patch("duventchezmoi.main.send_early_alert")
+@patch("duventchezmoi.main.send_reports")
+@patch("duventchezmoi.main.download_gfs")
+def test_duventchezmoi_early_alert(
+    mock_download_gfs, mock_send_report, mock_send_early_alert, fake_download_gfs, write_config
+):
+    mock_download_gfs.side_effect = fake_download_gfs
+    mock_send_report.side_effect = send_reports_success
+    with tempfile.TemporaryDirectory() as temp_dir:
+        extra = "early_alert_hours = 2\n[processing]\nstreaming = true\n"
+        duventchezmoi(write_config(temp_dir, 10.0, extra))
+
+        # early alert is sent once, before the full report
+        assert mock_send_early_alert.call_count == 1
+        assert mock_send_report.call_count == 1
+
+        # and is not sent again by the next runs while the alert is unchanged
+        duventchezmoi(write_config(temp_dir, 10.0, extra))
+        assert mock_send_early_alert.call_count == 1
+        assert mock_send_report.call_count == 1
+
+
+@patch("duventchezmoi.main.send_reports")
+@patch("duventchezmoi.main.download_gfs")
+@patch("duventchezmoi.main.find_latest_run")
+def test_duventchezmoi_latest_run(
+    mock_find_latest_run, mock_download_gfs, mock_send_report, fake_download_gfs, write_config
+):
+    mock_download_gfs.side_effect = fake_download_gfs
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config_path = write_config(temp_dir, 10.0, "[download]\nlatest_run = true\n")
+
+        # new run is processed, and recorded as the last processed run
+        mock_find_latest_run.return_value = ("20240330", "06")
+        duventchezmoi(config_path)
+        assert mock_download_gfs.call_args.kwargs["run"] == ("20240330", "06")
+        assert (Path(temp_dir) / "data" / "20240330_06").exists()
+
+        # nothing is done if no new run is available
+        mock_find_latest_run.return_value = None
+        duventchezmoi(config_path)
+        assert mock_find_latest_run.call_args.kwargs["after"] == ("20240330", "06")
+        assert mock_download_gfs.call_count == 1
+
+
+@patch("duventchezmoi.main.send_reports")
+@patch("duventchezmoi.main.download_gfs")
+@patch("duventchezmoi.main.find_latest_run", return_value=("20240330", "00"))
+def test_duventchezmoi_failed_hours(
+    mock_find_latest_run,
+    mock_download_gfs,
+    mock_send_report,
+    fake_download_gfs_failure,
+    write_config,
+):
+
+    # one forecast hour fails after all retries
+    mock_download_gfs.side_effect = fake_download_gfs_failure
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config_path = write_config(temp_dir, 10.0, "[download]\nlatest_run = true\n")
+
+        # downloaded forecast hours are still processed, but the run is not recorded as processed
+        duventchezmoi(config_path)
+        assert mock_send_report.call_count == 1
+        duventchezmoi(config_path)
+        assert mock_find_latest_run.call_args.kwargs["after"] is None
+
+
+@patch("duventchezmoi.main.send_reports")
+@patch("duventchezmoi.main.download_gfs")
+@patch("duventchezmoi.main.find_latest_run", return_value=("20240330", "00"))
+def test_duventchezmoi_failed_hours_compact(
+    mock_find_latest_run,
+    mock_download_gfs,
+    mock_send_report,
+    fake_download_gfs_failure,
+    write_config,
+):
+
+    # one forecast hour fails after all retries
+    mock_download_gfs.side_effect = fake_download_gfs_failure
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config_path = write_config(
+            temp_dir, 10.0, "[download]\nlatest_run = true\nincremental = true\n"
+        )
+        config_path.write_text(
+            config_path.read_text().replace("cleaning = false", "cleaning = compact")
+        )
+
+        # incomplete run is not compacted, and its missing forecast hours are requested again
+        duventchezmoi(config_path)
+        assert (Path(temp_dir) / "data" / "20240330").is_dir()
+        assert not (Path(temp_dir) / "data" / "20240330.npz").exists()
+        duventchezmoi(config_path)
+        assert mock_download_gfs.call_count == 2
+        assert mock_find_latest_run.call_args.kwargs["after"] is None
+
+
+def test_get_forecast_dates():
+    np.testing.assert_array_equal(
+        get_forecast_dates(("20240330", "06"), [0, 1, 120, 123]),
+        np.array(
+            ["2024-03-30T06:00", "2024-03-30T07:00", "2024-04-04T06:00", "2024-04-04T09:00"],
+            dtype="datetime64[m]",
+        ),
+    )
+
+
+def test_lazy_imports():
+
+    # plotting, GRIB2 and Gmail modules are not imported with the main module
+    script = "import sys, duventchezmoi.main; print(sorted(sys.modules))"
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=Path(__file__).resolve().parents[1],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    for module in ["matplotlib", "pygrib", "googleapiclient"]:
+        assert "'{}'".format(module) not in output
+
+
+@pytest.mark.parametrize("file_format", ["pdf", "png", "svg"])
+def test_write_report_aggregated(file_format):
+
+    # two years of hourly values
+    start = datetime.datetime(2022, 1, 1)
+    values = np.random.default_rng(0).uniform(0, 60, 2 * 365 * 24)
+    mock_data = [
+        {
+            "date_str": "",
+            "date_obj": start + datetime.timedelta(hours=i),
+            "wind_speed": value,
+            "alert": value > 50.0,
+        }
+        for i, value in enumerate(values)
+    ]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_file = Path(temp_dir) / "duventchezmoi_test_report.{}".format(file_format)
+        write_report(mock_data, 50.0, "km/h", output_file)
+        assert output_file.exists()
+        assert output_file.stat().st_size < 1000000
+
+
+def test_aggregate_daily():
+
+    # hourly values up to noon, 3-hourly values after, then a day without values
+    hours = list(range(13)) + [15, 18, 21, 48]
+    dates = np.datetime64("2024-03-30T00:00") + np.array(hours) * np.timedelta64(1, "h")
+    values = np.array([0.0] * 13 + [10.0, 10.0, 10.0, 5.0])
+    alerts = values > 8.0
+
+    days, daily_min, daily_max, daily_mean, daily_alert = aggregate_daily(dates, values, alerts)
+    assert days.tolist() == [datetime.date(2024, 3, d) for d in (30, 31)] + [
+        datetime.date(2024, 4, 1)
+    ]
+    assert daily_min[0] == 0.0 and daily_max[0] == 10.0
+    assert daily_alert.tolist() == [True, False, False]
+
+    # 3-hourly values weigh as much as the hourly values they replace
+    assert np.isclose(daily_mean[0], 10.0 * 9.0 / 22.5)
+
+    # missing day is left empty
+    assert np.isnan(daily_mean[1])
+    assert daily_mean[2] == 5.0
+
+
+def test_format_horizon():
+    assert format_horizon(384) == "16 days"
+    assert format_horizon(24) == "1 day"
+    assert format_horizon(100) == "100 hours"
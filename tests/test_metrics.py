@@ -0,0 +1,60 @@
+"""Unit tests for the 'metrics.py' module."""
+
+# standard library
+import json
+import tempfile
+from pathlib import Path
+
+# current project
+from duventchezmoi.metrics import Metrics
+
+
+def test_metrics():
+
+    metrics = Metrics()
+    for _ in range(2):
+        with metrics.stage("download"):
+            pass
+    metrics.increment("downloaded_bytes", 100)
+    metrics.increment("downloaded_bytes", 50)
+    metrics.observe("download_latency_seconds", 0.5)
+    metrics.observe("download_latency_seconds", 1.5)
+
+    summary = metrics.summary()
+    assert summary["stages"]["download"]["count"] == 2
+    assert summary["counters"] == {"downloaded_bytes": 150}
+    assert summary["observations"]["download_latency_seconds"] == {
+        "count": 2,
+        "sum": 2.0,
+        "max": 1.5,
+    }
+
+
+def test_write_metrics():
+
+    metrics = Metrics()
+    with metrics.stage("download"):
+        metrics.increment("downloaded_files", 3)
+    metrics.observe("download_latency_seconds", 0.5)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+
+        # JSON summary
+        metrics.write_json(Path(temp_dir) / "metrics.json")
+        with open(Path(temp_dir) / "metrics.json") as f:
+            assert json.load(f)["counters"]["downloaded_files"] == 3
+
+        # Prometheus textfile, only the final file is left in the directory
+        metrics.write_prometheus(Path(temp_dir) / "duventchezmoi.prom")
+        lines = (Path(temp_dir) / "duventchezmoi.prom").read_text().splitlines()
+        assert "# TYPE duventchezmoi_downloaded_files gauge" in lines
+        assert "duventchezmoi_downloaded_files 3.0" in lines
+        assert "duventchezmoi_download_latency_seconds_max 0.5" in lines
+        assert any(
+            line.startswith('duventchezmoi_stage_duration_seconds{stage="download"}')
+            for line in lines
+        )
+        assert sorted(p.name for p in Path(temp_dir).iterdir()) == [
+            "duventchezmoi.prom",
+            "metrics.json",
+        ]
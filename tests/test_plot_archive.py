@@ -0,0 +1,34 @@
+"""Unit tests for the 'plot_archive.py' module."""
+
+# standard library
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+# current project
+from duventchezmoi.main import duventchezmoi
+from duventchezmoi.plot_archive import plot_archive
+
+
+@patch("duventchezmoi.main.send_reports")
+@patch("duventchezmoi.main.download_gfs")
+def test_plot_archive(
+    mock_download_gfs, mock_send_report, monkeypatch, fake_download_gfs, write_config
+):
+    mock_download_gfs.side_effect = fake_download_gfs
+    with tempfile.TemporaryDirectory() as temp_dir:
+
+        # data path relative to the working directory
+        monkeypatch.chdir(temp_dir)
+        config_path = write_config(temp_dir, 10.0, "[processing]\nstatistic = max\n")
+        config_path.write_text(
+            config_path.read_text().replace(str(Path(temp_dir) / "data"), "data")
+        )
+        duventchezmoi(config_path)
+
+        # assert that values indexed by the pipeline for the site and statistic are reused
+        report_file = Path(temp_dir) / "archive.pdf"
+        with patch("duventchezmoi.plot_archive.map_files") as mock_map_files:
+            plot_archive(report_file, config_path)
+        assert not mock_map_files.called
+        assert report_file.exists()
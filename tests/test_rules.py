@@ -0,0 +1,116 @@
+"""Unit tests for the 'rules.py' module."""
+
+# standard library
+import configparser
+
+# third party
+import numpy as np
+import pytest
+
+# current project
+from duventchezmoi.rules import SITE_RULE
+from duventchezmoi.rules import compile_rules
+from duventchezmoi.rules import describe_rule
+from duventchezmoi.rules import evaluate_rules
+from duventchezmoi.rules import read_rules
+
+SITES = [
+    {"name": "bordeaux", "threshold": 40.0, "recipients": ["a@example.com"]},
+    {"name": "arcachon", "threshold": 50.0, "recipients": ["b@example.com"]},
+]
+
+
+def read_config(rules):
+    config = configparser.ConfigParser()
+    config.read_string("[rules]\n" + rules)
+    return config
+
+
+def test_read_rules():
+
+    # site thresholds are always evaluated
+    rules = read_rules(configparser.ConfigParser())
+    assert [rule["name"] for rule in rules] == [SITE_RULE]
+
+    rules = read_rules(
+        read_config(
+            "storm = threshold, 80\n"
+            "long = sustained, 40, 6, c@example.com d@example.com\n"
+            "gust = rising, 20, 3, , arcachon\n"
+        )
+    )
+    assert [rule["name"] for rule in rules] == [SITE_RULE, "storm", "long", "gust"]
+    assert rules[2] == {
+        "name": "long",
+        "kind": "sustained",
+        "value": 40.0,
+        "hours": 6.0,
+        "recipients": ["c@example.com", "d@example.com"],
+        "sites": None,
+    }
+    assert rules[3]["recipients"] is None
+    assert rules[3]["sites"] == ["arcachon"]
+
+    # invalid rules
+    with pytest.raises(ValueError):
+        read_rules(read_config("storm = unknown, 80\n"))
+    with pytest.raises(ValueError):
+        read_rules(read_config("long = sustained, 40\n"))
+    with pytest.raises(ValueError):
+        read_rules(read_config("threshold = threshold, 40\n"))
+
+
+def test_evaluate_rules():
+
+    rules = read_rules(
+        read_config(
+            "storm = threshold, 55\n"
+            "long = sustained, 30, 6\n"
+            "gust = rising, 20, 3, , arcachon\n"
+        )
+    )
+
+    # hourly forecast, then 3-hourly
+    dates = np.datetime64("2024-03-30T00:00") + np.array(
+        [0, 1, 2, 3, 4, 5, 6, 9, 12], dtype="timedelta64[h]"
+    )
+    values = np.array(
+        [
+            [35.0, 10.0],
+            [35.0, 20.0],
+            [35.0, 45.0],
+            [35.0, 60.0],
+            [35.0, 10.0],
+            [20.0, 10.0],
+            [20.0, 10.0],
+            [41.0, 31.0],
+            [20.0, 31.0],
+        ]
+    )
+
+    alerts = evaluate_rules(compile_rules(rules, SITES), dates, values)
+    assert alerts.shape == (4, 9, 2)
+
+    # site thresholds
+    np.testing.assert_array_equal(alerts[0, :, 0], values[:, 0] > 40.0)
+    np.testing.assert_array_equal(alerts[0, :, 1], values[:, 1] > 50.0)
+
+    # threshold rule
+    np.testing.assert_array_equal(alerts[1], values > 55.0)
+
+    # sustained rule, 5 hours above 30 at bordeaux, and 6 hours at arcachon with 3-hourly values
+    assert not alerts[2, :, 0].any()
+    np.testing.assert_array_equal(np.flatnonzero(alerts[2, :, 1]), [7, 8])
+
+    # rising rule, only at arcachon
+    assert not alerts[3, :, 0].any()
+    np.testing.assert_array_equal(np.flatnonzero(alerts[3, :, 1]), [2, 3, 7])
+
+    # empty forecast
+    assert evaluate_rules(compile_rules(rules, SITES), dates[:0], values[:0]).shape == (4, 0, 2)
+
+
+def test_describe_rule():
+    rules = read_rules(read_config("long = sustained, 40, 6\n"))
+    assert describe_rule(rules[0], 40.0, "km/h") == "wind speed above 40.00 km/h"
+    assert describe_rule(rules[1], 40.0, "km/h") == "wind speed above 40.00 km/h for 6 hours"
@@ -0,0 +1,65 @@
+"""Unit tests for the 'scheduler.py' module."""
+
+# standard library
+import configparser
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+# current project
+from duventchezmoi.scheduler import read_schedule
+from duventchezmoi.scheduler import run_daemon
+
+CONFIG = """
+[main]
+threshold = 40.0
+
+[mail]
+recipients = a@example.com
+
+[sites]
+bordeaux = 44.834546, -0.566572
+arcachon = 44.658, -1.168
+
+[daemon]
+interval = 15
+jitter = 0
+
+[schedule]
+arcachon = 30
+"""
+
+
+def test_read_schedule():
+    config = configparser.ConfigParser()
+    config.read_string(CONFIG)
+    intervals, jitter = read_schedule(config)
+    assert intervals == {"bordeaux": 900.0, "arcachon": 1800.0}
+    assert jitter == 0.0
+
+
+@patch("duventchezmoi.scheduler.duventchezmoi")
+@patch("duventchezmoi.scheduler.time")
+def test_run_daemon(mock_time, mock_duventchezmoi):
+
+    # simulated clock, advanced by sleeping
+    clock = [0.0]
+    mock_time.monotonic.side_effect = lambda: clock[0]
+    mock_time.sleep.side_effect = lambda seconds: clock.__setitem__(0, clock[0] + seconds)
+
+    # errors during a run do not stop the daemon
+    mock_duventchezmoi.side_effect = [None, SystemExit("Error in GFS data download"), None]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config_path = Path(temp_dir) / "config.ini"
+        config_path.write_text(CONFIG)
+        run_daemon(config_path, max_cycles=3)
+
+    # all sites at start, then bordeaux alone, then both sites
+    site_names = [call.kwargs["site_names"] for call in mock_duventchezmoi.call_args_list]
+    assert site_names == [["bordeaux", "arcachon"], ["bordeaux"], ["bordeaux", "arcachon"]]
+    assert clock[0] == 1800.0
+
+    # connection pool is shared between runs
+    pools = {id(call.kwargs["pool"]) for call in mock_duventchezmoi.call_args_list}
+    assert len(pools) == 1
@@ -0,0 +1,136 @@
+"""Unit tests for the 'sites.py' module."""
+
+# standard library
+import configparser
+from pathlib import Path
+
+# third party
+import numpy as np
+import pytest
+
+# current project
+from duventchezmoi.main import compute_mean_wind_speed
+from duventchezmoi.main import compute_sites_wind_speed
+from duventchezmoi.sites import compute_extent
+from duventchezmoi.sites import compute_site_weights
+from duventchezmoi.sites import extract_site_values
+from duventchezmoi.sites import read_sites
+from duventchezmoi.sites import read_statistic
+
+CONFIG = """
+[main]
+threshold = 40.0
+
+[mail]
+recipients = a@example.com,b@example.com
+
+[sites]
+bordeaux = 44.834546, -0.566572
+arcachon = 44.658, -1.168, 50.0, c@example.com d@example.com
+"""
+
+
+def statistic(name, percentile=0.0, margin=0):
+    """Create statistic, as read by read_statistic."""
+    return {"name": name, "percentile": percentile, "margin": margin}
+
+
+def test_read_sites():
+    config = configparser.ConfigParser()
+    config.read_string(CONFIG)
+    sites = read_sites(config)
+
+    assert [site["name"] for site in sites] == ["bordeaux", "arcachon"]
+    assert sites[0]["threshold"] == 40.0
+    assert sites[0]["recipients"] == ["a@example.com", "b@example.com"]
+    assert sites[1]["threshold"] == 50.0
+    assert sites[1]["recipients"] == ["c@example.com", "d@example.com"]
+
+
+def test_read_sites_single():
+    config = configparser.ConfigParser()
+    config.read_string(CONFIG.split("[sites]")[0])
+    config["main"]["lat"] = "44.8"
+    config["main"]["lon"] = "-0.5"
+    sites = read_sites(config)
+
+    assert len(sites) == 1
+    assert sites[0]["name"] == "main"
+
+
+def test_compute_extent():
+
+    # single site, same extent as the grid cell containing it
+    site = {"lat": 44.834546, "lon": -0.566572}
+    assert compute_extent([site]) == [-0.75, 45.0, -0.5, 44.75]
+
+    # union of several sites
+    sites = [site, {"lat": 44.658, "lon": -1.168}]
+    assert compute_extent(sites) == [-1.25, 45.0, -0.5, 44.5]
+
+    # extended by a margin of grid points
+    assert compute_extent([site], margin=1) == [-1.0, 45.25, -0.25, 44.5]
+
+
+def test_extract_site_values():
+    lats = np.array([44.5, 44.75, 45.0])
+    lons = np.array([358.75, 359.0, 359.25, 359.5])
+    values = np.arange(12, dtype=float).reshape(3, 4)
+    sites = [{"lat": 44.834546, "lon": -0.566572}, {"lat": 44.658, "lon": -1.168}]
+
+    # values stacked over time are extracted in one pass
+    result = extract_site_values(np.stack([values, 2 * values]), lats, lons, sites)
+    assert result.shape == (2, 2)
+    np.testing.assert_allclose(result[0], [np.mean([6, 7, 10, 11]), np.mean([0, 1, 4, 5])])
+    np.testing.assert_allclose(result[1], 2 * result[0])
+
+
+@pytest.mark.parametrize("units", ["km/h", "m/s"])
+def test_compute_sites_wind_speed(units):
+    grib2_file = Path(__file__).parent / "20240330_0000.grib2"
+    sites = [{"lat": 44.834546, "lon": -0.566572}]
+    values = compute_sites_wind_speed(grib2_file, sites, units)
+    assert np.isclose(values[0], compute_mean_wind_speed(grib2_file, units))
+
+
+def test_read_statistic():
+    config = configparser.ConfigParser()
+    config.read_string("[processing]\nstatistic = exceedance\nexceedance_area = 0.1\nmargin = 1\n")
+    assert read_statistic(config) == {"name": "exceedance", "percentile": 90.0, "margin": 1}
+
+    config["processing"]["statistic"] = "median"
+    with pytest.raises(ValueError):
+        read_statistic(config)
+
+
+def test_extract_site_values_statistics():
+
+    # values varying linearly with latitude and longitude
+    lats = np.arange(44.0, 46.01, 0.25)
+    lons = np.arange(358.0, 360.0, 0.25)
+    values = 10 * lats[:, None] + lons[None, :] - 800.0
+    sites = [{"lat": 44.834546, "lon": -0.566572}, {"lat": 45.1, "lon": -1.9}]
+    stacked = np.stack([values, 2 * values])
+
+    # bilinear interpolation is exact for a linear field
+    expected = [10 * site["lat"] + site["lon"] % 360 - 800.0 for site in sites]
+    result = extract_site_values(stacked, lats, lons, sites, statistic("bilinear"))
+    np.testing.assert_allclose(result, [expected, 2 * np.array(expected)])
+
+    # order statistics over the grid cell, extended by a margin
+    result = extract_site_values(values, lats, lons, sites[:1], statistic("max", margin=1))
+    np.testing.assert_allclose(result, [10 * 45.25 + 359.75 - 800.0])
+    result = extract_site_values(values, lats, lons, sites[:1], statistic("percentile", 50.0))
+    np.testing.assert_allclose(result, [10 * 44.875 + 359.375 - 800.0])
+
+    # exceedance is above the threshold when it is exceeded over at least the given area, a
+    # single point of a cell of 4 points exceeding it covering 0.25 of the cell
+    values = np.full((len(lats), len(lons)), 10.0)
+    values[4, 5] = 50.0  # 45.0N, 359.25E, in the cell of the first site
+    assert extract_site_values(values, lats, lons, sites[:1], statistic("exceedance", 75.0)) > 40.0
+    assert extract_site_values(values, lats, lons, sites[:1], statistic("exceedance", 70.0)) < 40.0
+
+    # weights are only computed once
+    assert compute_site_weights(lats, lons, sites, statistic("bilinear")) is compute_site_weights(
+        lats, lons, sites, statistic("bilinear")
+    )
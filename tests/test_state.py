@@ -0,0 +1,29 @@
+"""Unit tests for the 'state.py' module."""
+
+# standard library
+import json
+import tempfile
+from pathlib import Path
+
+# current project
+from duventchezmoi.state import read_state
+from duventchezmoi.state import write_state
+
+
+def test_state():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        state_file = Path(temp_dir) / "state.json"
+        assert read_state(state_file, "last_run") is None
+        assert read_state(state_file, "alerts", {}) == {}
+
+        # assert that sections are written independently
+        write_state(state_file, "last_run", {"main": ["20240330", "00"]})
+        write_state(state_file, "alerts", {"main/threshold": {"windows": []}})
+        assert json.loads(state_file.read_text()) == {
+            "last_run": {"main": ["20240330", "00"]},
+            "alerts": {"main/threshold": {"windows": []}},
+        }
+        assert read_state(state_file, "last_run") == {"main": ["20240330", "00"]}
+
+        # assert that no temporary file is left
+        assert [f.name for f in Path(temp_dir).iterdir()] == ["state.json"]